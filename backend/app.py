@@ -2,32 +2,119 @@
 Postia - Versión con diseño profesional restaurado
 """
 
-from flask import Flask, request, jsonify, send_file, session, make_response
+from flask import Flask, Response, abort, g, request, jsonify, send_file, session, make_response
 
 from dotenv import load_dotenv
 load_dotenv()
 from flask_cors import CORS
-import sqlite3
+from werkzeug.exceptions import RequestEntityTooLarge
+import base64
 import hashlib
+import hmac
+import json
 import os
+import time
 import uuid
-from datetime import datetime, timedelta
-from openai import OpenAI
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import datetime
 
-# Configurar OpenAI con cliente moderno
-openai_client = OpenAI(
-    api_key=os.getenv('OPENAI_API_KEY')
+from brand_profile import brand_profiles
+from cache import TTLCache
+from calendar_engine import CALENDAR_MAX_DAYS, generate_calendar_posts
+from completion_cache import init_completion_cache_table
+from hashtag_engine import HASHTAG_ENRICH, hashtag_engine
+from frontend_assets import IMMUTABLE_CACHE_CONTROL, load_assets, load_page
+from db import connect, connection, get_db, init_app as init_db_pool
+from image_derivatives import (
+    MIMETYPES, ensure_derivative, generate_derivatives, is_derivable, pick_format, pick_width,
+    schedule_derivatives
 )
+from image_cache import ImageCache, init_image_cache_table
+from jobs import JobQueue, init_jobs_table
+from media_store import (
+    MAX_UPLOAD_BYTES, collect_garbage, ingest_upload, init_media_schema, register_media,
+    sync_post_media, upload_request_class
+)
+from metrics import HTTP_REQUEST_DURATION, current_user, render_metrics, submit_with_context
+from rate_limit import TokenBucketLimiter
+from post_changes import get_oldest_version, get_post_changes, get_posts_version, init_post_changes_schema
+from post_status import bulk_update_status, parse_status_filters
+from prompts import COPY_HASHTAG_PROMPT, HASHTAG_ANALYSIS_PROMPTS, PROMPT_BUDGETS
+from publishing import (
+    PUBLISHER, FakePublisher, PublishDispatcher, fail_interrupted_publications, init_publishing_schema
+)
+from llm import complete, completion_cache, llm_executor, run_stages, stream_complete
 
 app = Flask(__name__)
 CORS(app, supports_credentials=True)
 
-# Base de datos en memoria para simplicidad
-DATABASE_PATH = 'postia_simple.db'
+# Todas las rutas toman su conexión SQLite del pool compartido (ver db.py)
+init_db_pool(app)
+
+UPLOAD_DIR = os.path.abspath(os.getenv('POSTIA_UPLOAD_DIR', os.path.join(os.getcwd(), 'uploads', 'images')))
+
+# Los archivos subidos se escriben por partes directo a UPLOAD_DIR (ver media_store.py)
+app.request_class = upload_request_class(UPLOAD_DIR)
+app.config['MAX_CONTENT_LENGTH'] = MAX_UPLOAD_BYTES
+
+# Usuarios autenticados por session_token (se invalida en login/logout)
+session_cache = TTLCache(
+    maxsize=int(os.getenv('POSTIA_SESSION_CACHE_SIZE', '1024')),
+    ttl=int(os.getenv('POSTIA_SESSION_CACHE_TTL', '300'))
+)
+
+# Trabajos largos (generación de imágenes) fuera del thread del request
+job_queue = JobQueue()
+
+# Publicación de posts aprobados en su fecha y hora (ver publishing.py)
+publish_dispatcher = PublishDispatcher()
+if PUBLISHER == 'fake':
+    publish_dispatcher.set_default(FakePublisher())
+
+# Imágenes ya generadas, reutilizables para prompts iguales o parecidos
+image_cache = ImageCache(UPLOAD_DIR)
+
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+    current_user.set(None)
+
+@app.after_request
+def record_request_duration(response):
+    """Duración por ruta (en respuestas en streaming, hasta enviar los headers)"""
+    started = g.pop('request_started', None)
+    if started is not None:
+        HTTP_REQUEST_DURATION.observe(
+            time.perf_counter() - started,
+            method=request.method,
+            endpoint=request.url_rule.rule if request.url_rule else 'unmatched',
+            status=str(response.status_code)
+        )
+    return response
+
+# Clientes que pueden leer /metrics sin token (incluyen consumo de OpenAI por usuario)
+METRICS_LOCAL_ADDRS = ('127.0.0.1', '::1')
+
+@app.route('/metrics')
+def metrics():
+    """Métricas en formato Prometheus
+    
+    Con POSTIA_METRICS_TOKEN se exige `Authorization: Bearer <token>`; sin
+    token solo responde a pedidos desde la propia máquina.
+    """
+    token = os.getenv('POSTIA_METRICS_TOKEN')
+    if token:
+        if not hmac.compare_digest(request.headers.get('Authorization', ''), f"Bearer {token}"):
+            return jsonify({"success": False, "error": "No autorizado"}), 401
+    elif request.remote_addr not in METRICS_LOCAL_ADDRS:
+        return jsonify({"success": False, "error": "Definí POSTIA_METRICS_TOKEN para leer las métricas desde otra máquina"}), 403
+    
+    return Response(render_metrics(), mimetype='text/plain; version=0.0.4')
 
 def init_db():
     """Inicializar base de datos simple"""
-    conn = sqlite3.connect(DATABASE_PATH)
+    conn = connect()
     
     # Crear tabla users
     conn.execute('''
@@ -40,6 +127,7 @@ def init_db():
             session_token TEXT
         )
     ''')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_users_session_token ON users (session_token)')
     
     # Crear tabla posts
     conn.execute('''
@@ -54,6 +142,20 @@ def init_db():
         )
     ''')
     
+    # Columnas que las rutas usan y que bases existentes pueden no tener
+    post_columns = {row['name'] for row in conn.execute('PRAGMA table_info(posts)')}
+    for column in ('content_type', 'scheduled_time', 'hashtags', 'platforms', 'media_files'):
+        if column not in post_columns:
+            conn.execute(f'ALTER TABLE posts ADD COLUMN {column} TEXT')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_posts_user_date ON posts (user_id, scheduled_date, id)')
+    conn.execute(f'CREATE INDEX IF NOT EXISTS idx_posts_user_sort ON posts (user_id, {POSTS_SORT_KEY}, id)')
+    
+    # Versión por usuario que cambia con cada escritura en posts (ETag y delta sync)
+    init_post_changes_schema(conn)
+    
+    # Resultado de la publicación e índice por vencimiento para el dispatcher
+    init_publishing_schema(conn)
+    
     # Crear tabla brand_preferences
     conn.execute('''
         CREATE TABLE IF NOT EXISTS brand_preferences (
@@ -77,6 +179,18 @@ def init_db():
         )
     ''')
     
+    # Crear tabla jobs
+    init_jobs_table(conn)
+    
+    # Crear tabla completion_cache
+    init_completion_cache_table(conn)
+    
+    # Archivos subidos y referencias desde posts.media_files
+    init_media_schema(conn)
+    
+    # Crear tabla image_cache
+    init_image_cache_table(conn)
+    
     # Crear usuarios si no existen
     users = [
         ('admin@maddalenamarketing.com', 'admin123', 'Charly Maddalena', 'admin'),
@@ -93,31 +207,54 @@ def init_db():
     conn.commit()
     conn.close()
 
-def get_user_from_session():
-    """Obtener usuario de la sesión"""
+def get_user_from_session(fresh=False):
+    """Obtener usuario de la sesión
+    
+    Con `fresh` se verifica el token contra la base aunque esté cacheado: la
+    caché es por proceso y un logout en otro worker no la invalida.
+    """
     token = request.cookies.get('session_token')
     if not token:
         return None
     
-    conn = sqlite3.connect(DATABASE_PATH)
-    conn.row_factory = sqlite3.Row
-    user = conn.execute('SELECT * FROM users WHERE session_token = ?', (token,)).fetchone()
-    conn.close()
+    user = None if fresh else session_cache.get(token)
+    if user is None:
+        conn = get_db()
+        row = conn.execute('SELECT * FROM users WHERE session_token = ?', (token,)).fetchone()
+        if not row:
+            session_cache.pop(token)
+            return None
+        
+        user = dict(row)
+        session_cache.set(token, user)
+    
+    # Para atribuir el uso de OpenAI del request en /metrics
+    current_user.set(user['id'])
     return user
 
+# HTML del frontend en memoria, ya comprimido (ver frontend_assets.py)
+dashboard_page = load_page('dashboard.html')
+login_page = load_page('login.html')
+frontend_assets = load_assets()
+
 @app.route('/')
 def index():
     """Página principal"""
     user = get_user_from_session()
     
-    if user:
-        # Dashboard profesional completo
-        with open('/home/runner/workspace/frontend/dashboard.html', 'r', encoding='utf-8') as f:
-            return f.read()
-    
-    # Login profesional
-    with open('/home/runner/workspace/frontend/login.html', 'r', encoding='utf-8') as f:
-        return f.read()
+    # Dashboard profesional completo o login, según la sesión
+    page = dashboard_page if user else login_page
+    response = page.response(cache_control='private, no-cache')
+    response.vary.add('Cookie')
+    return response
+
+@app.route('/assets/<filename>')
+def frontend_asset(filename):
+    """CSS/JS del build, con hash en el nombre: se cachean para siempre"""
+    asset = frontend_assets.get(filename)
+    if asset is None:
+        abort(404)
+    return asset.response(cache_control=IMMUTABLE_CACHE_CONTROL)
 
 @app.route('/api/login', methods=['POST'])
 def login():
@@ -132,25 +269,24 @@ def login():
         
         password_hash = hashlib.sha256(password.encode()).hexdigest()
         
-        conn = sqlite3.connect(DATABASE_PATH)
-        conn.row_factory = sqlite3.Row
+        conn = get_db()
         user = conn.execute(
             'SELECT * FROM users WHERE email = ? AND password_hash = ?', 
             (email, password_hash)
         ).fetchone()
         
         if not user:
-            conn.close()
             return jsonify({"success": False, "error": "Credenciales incorrectas"}), 401
         
-        # Crear sesión
+        # Crear sesión (la anterior deja de ser válida)
+        if user['session_token']:
+            session_cache.pop(user['session_token'])
         session_token = str(uuid.uuid4())
         conn.execute(
             'UPDATE users SET session_token = ? WHERE id = ?', 
             (session_token, user['id'])
         )
         conn.commit()
-        conn.close()
         
         response = make_response(jsonify({"success": True, "message": "Login exitoso"}))
         response.set_cookie('session_token', session_token, max_age=7*24*60*60, httponly=True)
@@ -163,10 +299,59 @@ def login():
 @app.route('/api/logout', methods=['POST'])
 def logout():
     """Logout simple"""
+    token = request.cookies.get('session_token')
+    if token:
+        session_cache.pop(token)
+        conn = get_db()
+        conn.execute('UPDATE users SET session_token = NULL WHERE session_token = ?', (token,))
+        conn.commit()
+    
     response = make_response(jsonify({"success": True}))
     response.set_cookie('session_token', '', expires=0)
     return response
 
+@app.route('/api/cache-stats', methods=['GET'])
+def cache_stats():
+    """Aciertos y fallos de las cachés en memoria"""
+    user = get_user_from_session()
+    if not user:
+        return jsonify({"success": False, "error": "No autenticado"}), 401
+    
+    return jsonify({
+        "success": True,
+        "session_cache": session_cache.stats(),
+        "completion_cache": completion_cache.stats(),
+        "image_cache": image_cache.stats(),
+        "brand_profiles": brand_profiles.stats(),
+        "hashtag_index": hashtag_engine.stats()
+    })
+
+def run_calendar_generation(payload, progress):
+    """Trabajo en segundo plano: generar el calendario por lotes"""
+    incremental = payload.get('mode') == 'incremental'
+    created, created_posts = generate_calendar_posts(
+        payload['user_id'],
+        datetime.strptime(payload['start_date'], '%Y-%m-%d'),
+        payload['days'],
+        payload['posts_per_day'],
+        payload['client_profile'],
+        payload['topics'],
+        use_ai=payload['use_ai'],
+        progress=progress,
+        incremental=incremental
+    )
+    
+    result = {
+        "created": created,
+        "mode": payload.get('mode', 'replace'),
+        "message": f"Se generaron {created} posts exitosamente"
+    }
+    if incremental:
+        result["posts"] = created_posts
+    return result
+
+job_queue.register('generate_calendar', run_calendar_generation)
+
 @app.route('/api/generate-calendar', methods=['POST'])
 def generate_calendar():
     """Generar calendario personalizado basado en preferencias de marca"""
@@ -179,146 +364,205 @@ def generate_calendar():
         days = int(data.get('days', 7))
         posts_per_day = int(data.get('posts_per_day', 3))
         
-        # Obtener preferencias de marca del usuario
-        conn = sqlite3.connect(DATABASE_PATH)
-        conn.row_factory = sqlite3.Row
-        preferences = conn.execute(
-            'SELECT * FROM brand_preferences WHERE user_id = ?',
-            (user['id'],)
-        ).fetchone()
+        if not 1 <= days <= CALENDAR_MAX_DAYS or not 1 <= posts_per_day <= 10:
+            return jsonify({
+                "success": False,
+                "error": f"Se permiten entre 1 y {CALENDAR_MAX_DAYS} días y entre 1 y 10 posts por día"
+            }), 400
         
-        # Configurar perfil del cliente basado en preferencias
-        if preferences:
-            client_profile = {
-                'business_type': preferences['brand_name'] or 'Marketing Digital para PyMEs',
-                'industry': preferences['industry'] or 'marketing',
-                'target_audience': preferences['target_audience'] or 'Pequeñas y medianas empresas',
-                'tone': preferences['communication_tone'] or 'profesional',
-                'brand_values': preferences['brand_values'] or 'innovación, calidad, confianza',
-                'content_themes': preferences['content_themes'] or 'marketing digital, tendencias, casos de éxito',
-                'visual_style': preferences['visual_style'] or 'moderno',
-                'platforms': ['instagram', 'linkedin']
-            }
-        else:
-            # Perfil por defecto
-            client_profile = {
-                'business_type': 'Marketing Digital para PyMEs',
-                'industry': 'marketing',
-                'target_audience': 'Pequeñas y medianas empresas',
-                'tone': 'profesional',
-                'brand_values': 'innovación, calidad, confianza',
-                'content_themes': 'marketing digital, tendencias, casos de éxito',
-                'visual_style': 'moderno',
-                'platforms': ['instagram', 'linkedin']
-            }
-        
-        # Temas personalizados basados en industria y preferencias
-        industry_topics = {
-            'tecnologia': ['IA y automatización', 'Transformación digital', 'Ciberseguridad', 'Innovación tecnológica'],
-            'marketing': ['Marketing de contenidos', 'SEO y SEM', 'Redes sociales', 'Email marketing'],
-            'salud': ['Bienestar digital', 'Telemedicina', 'Prevención', 'Salud mental'],
-            'educacion': ['E-learning', 'Metodologías innovadoras', 'Tecnología educativa', 'Desarrollo profesional'],
-            'finanzas': ['Fintech', 'Inversiones inteligentes', 'Educación financiera', 'Criptomonedas'],
-            'retail': ['E-commerce', 'Experiencia del cliente', 'Omnicanalidad', 'Retail tech'],
-            'servicios': ['Atención al cliente', 'Digitalización', 'Eficiencia operativa', 'Calidad de servicio']
-        }
+        # 'replace' rehace todo el calendario; 'incremental' solo llena huecos libres del rango
+        mode = data.get('mode', 'replace')
+        if mode not in ('replace', 'incremental'):
+            return jsonify({"success": False, "error": "Modo inválido (replace o incremental)"}), 400
         
-        # Seleccionar temas según industria
-        industry = client_profile['industry']
-        if industry in industry_topics:
-            trending_topics = industry_topics[industry]
-        else:
-            trending_topics = [
-                'Inteligencia Artificial en negocios',
-                'Marketing de contenidos 2025', 
-                'Automatización de procesos',
-                'Estrategias de crecimiento digital'
-            ]
+        try:
+            start_date = datetime.strptime(data.get('start_date') or datetime.now().strftime('%Y-%m-%d'), '%Y-%m-%d')
+        except ValueError:
+            return jsonify({"success": False, "error": "start_date debe tener formato YYYY-MM-DD"}), 400
+        
+        # Perfil y temas de la marca (cacheados, ver brand_profile.py)
+        profile = brand_profiles.get(user['id'], get_db())
+        
+        # Generación por lotes en segundo plano; el avance se consulta en /api/jobs/<id>.
+        # Un calendario a la vez por usuario (p. ej. ante un doble click en "Generar")
+        job_id = job_queue.submit('generate_calendar', user['id'], {
+            "user_id": user['id'],
+            "start_date": start_date.strftime('%Y-%m-%d'),
+            "mode": mode,
+            "days": days,
+            "posts_per_day": posts_per_day,
+            "client_profile": profile.client_profile,
+            "topics": profile.topics,
+            "use_ai": bool(data.get('use_ai', True))
+        }, exclusive=True)
+        if job_id is None:
+            return jsonify({
+                "success": False,
+                "error": "Ya hay una generación de calendario en curso",
+                "job_id": job_queue.active('generate_calendar', user['id'])
+            }), 409
         
-        # Agregar temas personalizados del usuario
-        if client_profile['content_themes']:
-            custom_themes = [theme.strip() for theme in client_profile['content_themes'].split(',')]
-            trending_topics.extend(custom_themes[:4])  # Agregar hasta 4 temas personalizados
+        return jsonify({
+            "success": True,
+            "job_id": job_id,
+            "status": "queued",
+            "status_url": f"/api/jobs/{job_id}",
+            "mode": mode,
+            "message": f"Generando hasta {days * posts_per_day} posts" if mode == 'incremental' else f"Generando {days * posts_per_day} posts"
+        }), 202
         
-        content_types = ['image', 'carousel', 'video', 'text']
-        optimal_times = {
-            'instagram': ['09:00', '12:00', '18:00', '20:00'],
-            'linkedin': ['08:00', '12:00', '17:00', '19:00']
-        }
+    except Exception as e:
+        return jsonify({"success": False, "error": str(e)}), 500
+
+# Columnas que se pueden pedir con ?fields= en /api/posts
+POST_FIELDS = (
+    'id', 'user_id', 'title', 'content', 'platform', 'content_type', 'scheduled_date',
+    'scheduled_time', 'hashtags', 'platforms', 'media_files', 'status', 'version'
+)
+MAX_POSTS_PAGE = 500
+
+# Orden de /api/posts y del cursor: los posts sin fecha van al final en vez de
+# quedar fuera de la comparación (NULL < ? nunca es verdadero)
+POSTS_SORT_KEY = "COALESCE(scheduled_date, '')"
+
+def encode_posts_cursor(post):
+    """Cursor opaco con la posición (POSTS_SORT_KEY, id) del último post devuelto"""
+    raw = json.dumps([post['scheduled_date'] or '', post['id']])
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+def decode_posts_cursor(cursor):
+    scheduled_date, post_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    return scheduled_date or '', int(post_id)
+
+@app.route('/api/posts', methods=['GET'])
+def get_posts():
+    """Obtener posts
+    
+    Parámetros opcionales: `limit` y `cursor` (paginación), `from` y `to`
+    (rango de scheduled_date), `status` (separados por coma) y `fields`
+    (columnas a devolver). Responde 304 si el ETag enviado sigue vigente.
+    """
+    try:
+        user = get_user_from_session()
+        if not user:
+            return jsonify({"success": False, "error": "No autenticado"}), 401
         
-        conn = sqlite3.connect(DATABASE_PATH)
-        
-        # Limpiar posts anteriores
-        conn.execute('DELETE FROM posts WHERE user_id = ?', (user['id'],))
-        
-        # Generar nuevos posts personalizados
-        for day in range(days):
-            for post_num in range(posts_per_day):
-                current_date = datetime.now() + timedelta(days=day)
-                date_str = current_date.strftime('%Y-%m-%d')
-                
-                # Seleccionar tema y plataforma
-                topic = trending_topics[((day * posts_per_day) + post_num) % len(trending_topics)]
-                platform = client_profile['platforms'][post_num % len(client_profile['platforms'])]
-                content_type = content_types[post_num % len(content_types)]
-                
-                # Generar contenido personalizado
-                if platform == 'instagram':
-                    if 'marketing' in topic.lower():
-                        title = f"💡 {topic}: Tips para PyMEs"
-                        content = f"🚀 ¿Sabías que el {topic.lower()} puede transformar tu negocio?\n\n✅ Estrategias probadas para empresas como la tuya\n✅ Resultados medibles en 30 días\n✅ Sin complicaciones técnicas\n\n¿Cuál es tu mayor desafío en marketing digital? 👇"
-                        hashtags = f"#pymes #marketing #emprendimiento #{topic.lower().replace(' ', '')}"
-                    else:
-                        title = f"🎯 {topic} para tu empresa"
-                        content = f"📈 {topic} es clave para el crecimiento de tu PyME\n\n💪 Implementa estos cambios HOY:\n• Automatiza procesos repetitivos\n• Analiza tus métricas\n• Optimiza tu tiempo\n\n¿Qué herramienta usas para ser más productivo? 🤔"
-                        hashtags = f"#productividad #negocios #pymes #{topic.lower().replace(' ', '')}"
-                else:  # LinkedIn
-                    title = f"{topic}: Estrategias para el crecimiento empresarial"
-                    content = f"En el panorama empresarial actual, {topic.lower()} se ha convertido en un factor diferenciador para las PyMEs que buscan escalar.\n\nBasado en nuestra experiencia:\n\n🔹 Las empresas que implementan estas estrategias ven un crecimiento promedio del 40%\n🔹 El ROI se evidencia en los primeros 3 meses\n🔹 La implementación no requiere grandes inversiones\n\n¿Qué estrategias está implementando tu empresa?\n\n#Emprendimiento #Marketing #PyMEs"
-                    hashtags = f"#emprendimiento #marketing #pymes #{topic.lower().replace(' ', '')}"
-                
-                # Horario óptimo
-                time_slot = optimal_times[platform][post_num % len(optimal_times[platform])]
-                
-                conn.execute('''
-                    INSERT INTO posts (user_id, title, content, platform, content_type, 
-                                     scheduled_date, scheduled_time, hashtags, platforms, status)
-                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                ''', (user['id'], title, content, platform, content_type, date_str, time_slot, hashtags, platform, 'draft'))
+        conn = get_db()
+        version = get_posts_version(conn, user['id'])
+        
+        # El ETag depende de la versión del calendario y de los parámetros pedidos
+        etag = hashlib.sha1(f"{user['id']}:{version}:{request.query_string.decode()}".encode()).hexdigest()
+        if request.if_none_match.contains(etag):
+            response = make_response('', 304)
+            response.set_etag(etag)
+            response.headers['Cache-Control'] = 'private, no-cache'
+            return response
+        
+        fields = [field for field in request.args.get('fields', '').split(',') if field] or list(POST_FIELDS)
+        invalid_fields = [field for field in fields if field not in POST_FIELDS]
+        if invalid_fields:
+            return jsonify({"success": False, "error": f"Campos inválidos: {', '.join(invalid_fields)}"}), 400
+        
+        # id y scheduled_date siempre se leen porque arman el cursor
+        columns = list(dict.fromkeys(['id', 'scheduled_date'] + fields))
+        
+        conditions = ['user_id = ?']
+        params = [user['id']]
+        
+        if request.args.get('from'):
+            conditions.append('scheduled_date >= ?')
+            params.append(request.args['from'])
+        if request.args.get('to'):
+            conditions.append('scheduled_date <= ?')
+            params.append(request.args['to'])
+        
+        statuses = [status for status in request.args.get('status', '').split(',') if status]
+        if statuses:
+            conditions.append(f"status IN ({', '.join('?' * len(statuses))})")
+            params.extend(statuses)
+        
+        if request.args.get('cursor'):
+            try:
+                params.extend(decode_posts_cursor(request.args['cursor']))
+            except Exception:
+                return jsonify({"success": False, "error": "Cursor inválido"}), 400
+            conditions.append(f'({POSTS_SORT_KEY}, id) < (?, ?)')
+        
+        sql = f"""
+            SELECT {', '.join(columns)} FROM posts
+            WHERE {' AND '.join(conditions)}
+            ORDER BY {POSTS_SORT_KEY} DESC, id DESC
+        """
         
-        conn.commit()
-        conn.close()
+        # Sin limit se devuelven todos los posts (comportamiento original)
+        limit = request.args.get('limit', type=int)
+        if limit:
+            limit = max(1, min(limit, MAX_POSTS_PAGE))
+            sql += ' LIMIT ?'
+            params.append(limit + 1)
         
-        return jsonify({
+        posts = conn.execute(sql, params).fetchall()
+        
+        next_cursor = None
+        if limit and len(posts) > limit:
+            posts = posts[:limit]
+            next_cursor = encode_posts_cursor(posts[-1])
+        
+        posts_list = [{field: post[field] for field in fields} for post in posts]
+        
+        response = make_response(jsonify({
             "success": True,
-            "message": f"Se generaron {days * posts_per_day} posts exitosamente"
-        })
+            "posts": posts_list,
+            "version": version,
+            "next_cursor": next_cursor
+        }))
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = 'private, no-cache'
+        return response
         
     except Exception as e:
         return jsonify({"success": False, "error": str(e)}), 500
 
-@app.route('/api/posts', methods=['GET'])
-def get_posts():
-    """Obtener posts"""
+@app.route('/api/posts/changes', methods=['GET'])
+def get_posts_changes():
+    """Cambios en los posts del usuario desde la versión `since`
+    
+    Devuelve los ids creados, modificados y borrados; con `include=posts`
+    agrega las filas creadas y modificadas. `full_resync` indica que la
+    versión del cliente no es válida o es anterior a las marcas de borrado
+    conservadas, y debe recargar /api/posts.
+    """
     try:
         user = get_user_from_session()
         if not user:
             return jsonify({"success": False, "error": "No autenticado"}), 401
         
-        conn = sqlite3.connect(DATABASE_PATH)
-        conn.row_factory = sqlite3.Row
-        posts = conn.execute(
-            'SELECT * FROM posts WHERE user_id = ? ORDER BY scheduled_date DESC', 
-            (user['id'],)
-        ).fetchall()
-        conn.close()
+        since = request.args.get('since', type=int)
+        if since is None or since < 0:
+            return jsonify({"success": False, "error": "Parámetro since requerido"}), 400
         
-        posts_list = [dict(post) for post in posts]
+        conn = get_db()
+        version = get_posts_version(conn, user['id'])
         
-        return jsonify({
+        if since > version or since < get_oldest_version(conn, user['id']):
+            return jsonify({"success": True, "version": version, "full_resync": True})
+        
+        changes = get_post_changes(conn, user['id'], since)
+        result = {
             "success": True,
-            "posts": posts_list
-        })
+            "version": version,
+            "full_resync": False,
+            **changes
+        }
+        
+        if request.args.get('include') == 'posts':
+            posts = conn.execute(
+                f"SELECT {', '.join(POST_FIELDS)} FROM posts WHERE user_id = ? AND version > ? ORDER BY id",
+                (user['id'], since)
+            ).fetchall()
+            result["posts"] = [dict(post) for post in posts]
+        
+        return jsonify(result)
         
     except Exception as e:
         return jsonify({"success": False, "error": str(e)}), 500
@@ -333,7 +577,7 @@ def update_post(post_id):
         
         data = request.get_json()
         
-        conn = sqlite3.connect(DATABASE_PATH)
+        conn = get_db()
         
         # Verificar que el post pertenece al usuario
         post = conn.execute(
@@ -342,7 +586,6 @@ def update_post(post_id):
         ).fetchone()
         
         if not post:
-            conn.close()
             return jsonify({"success": False, "error": "Post no encontrado"}), 404
         
         # Actualizar el post
@@ -363,9 +606,13 @@ def update_post(post_id):
             post_id,
             user['id']
         ))
+        sync_post_media(conn, post_id, data.get('media_files') or [])
         
         conn.commit()
-        conn.close()
+        
+        # Un post aprobado que cambia de fecha u hora se reprograma
+        if post['status'] == 'approved':
+            publish_dispatcher.schedule(post_id, data.get('scheduled_date', ''), data.get('scheduled_time', ''))
         
         return jsonify({
             "success": True,
@@ -383,7 +630,7 @@ def delete_post(post_id):
         if not user:
             return jsonify({"success": False, "error": "No autenticado"}), 401
         
-        conn = sqlite3.connect(DATABASE_PATH)
+        conn = get_db()
         
         # Verificar que el post pertenece al usuario
         post = conn.execute(
@@ -392,13 +639,11 @@ def delete_post(post_id):
         ).fetchone()
         
         if not post:
-            conn.close()
             return jsonify({"success": False, "error": "Post no encontrado"}), 404
         
         # Eliminar el post
         conn.execute('DELETE FROM posts WHERE id = ? AND user_id = ?', (post_id, user['id']))
         conn.commit()
-        conn.close()
         
         return jsonify({
             "success": True,
@@ -431,39 +676,156 @@ def upload_image():
         if file_extension not in allowed_extensions:
             return jsonify({"success": False, "error": "Tipo de archivo no permitido"}), 400
         
-        # Generar nombre único
-        unique_filename = f"{uuid.uuid4().hex}.{file_extension}"
-        
-        # Crear directorio si no existe
-        upload_dir = os.path.join(os.getcwd(), 'uploads', 'images')
-        os.makedirs(upload_dir, exist_ok=True)
+        # Guardar por hash de contenido: el mismo archivo subido dos veces se reutiliza
+        conn = get_db()
+        filename, deduplicated = ingest_upload(conn, UPLOAD_DIR, file, file_extension, user['id'])
+        conn.commit()
         
-        # Guardar archivo
-        file_path = os.path.join(upload_dir, unique_filename)
-        file.save(file_path)
+        # Miniaturas y variantes WebP/AVIF en segundo plano
+        if not deduplicated:
+            schedule_derivatives(UPLOAD_DIR, filename)
         
         # URL relativa para el frontend
-        file_url = f"/uploads/images/{unique_filename}"
+        file_url = f"/uploads/images/{filename}"
         
         return jsonify({
             "success": True,
             "file_url": file_url,
-            "filename": unique_filename,
-            "original_name": file.filename
+            "filename": filename,
+            "original_name": file.filename,
+            "deduplicated": deduplicated
         })
         
+    except RequestEntityTooLarge as e:
+        return upload_too_large(e)
     except Exception as e:
         return jsonify({"success": False, "error": str(e)}), 500
 
+@app.errorhandler(413)
+def upload_too_large(e):
+    return jsonify({
+        "success": False,
+        "error": f"El archivo supera el máximo de {MAX_UPLOAD_BYTES // (1024 * 1024)} MB"
+    }), 413
+
+@app.route('/api/media/gc', methods=['POST'])
+def media_gc():
+    """Borrar archivos subidos que ningún post referencia (solo admin)
+    
+    Solo se borran archivos registrados en media_files y sin referencias desde
+    hace más del margen configurado. Con `{"dry_run": true}` solo se listan.
+    """
+    try:
+        user = get_user_from_session(fresh=True)
+        if not user:
+            return jsonify({"success": False, "error": "No autenticado"}), 401
+        if user['role'] != 'admin':
+            return jsonify({"success": False, "error": "Solo administradores"}), 403
+        
+        data = request.get_json(silent=True) or {}
+        result = collect_garbage(get_db(), UPLOAD_DIR, dry_run=bool(data.get('dry_run')))
+        
+        return jsonify({"success": True, **result})
+        
+    except Exception as e:
+        return jsonify({"success": False, "error": str(e)}), 500
+
+# Los archivos subidos tienen nombres únicos y nunca cambian
+UPLOAD_CACHE_MAX_AGE = 365 * 24 * 60 * 60
+
+# ETag por contenido, cacheado por (ruta, tamaño, mtime) para hashear cada archivo una vez
+file_etags = TTLCache(maxsize=4096, ttl=24 * 60 * 60)
+
+def file_etag(path):
+    """ETag fuerte: SHA-256 del contenido del archivo"""
+    stat = os.stat(path)
+    key = (path, stat.st_size, stat.st_mtime_ns)
+    etag = file_etags.get(key)
+    if etag is None:
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                digest.update(chunk)
+        etag = digest.hexdigest()
+        file_etags.set(key, etag)
+    return etag
+
+def send_immutable_file(path, mimetype=None):
+    """send_file con caché inmutable de un año, ETag fuerte, 304 y Range"""
+    response = send_file(
+        path,
+        mimetype=mimetype,
+        etag=file_etag(path),
+        max_age=UPLOAD_CACHE_MAX_AGE,
+        conditional=True
+    )
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    return response
+
 @app.route('/uploads/images/<filename>')
 def serve_uploaded_file(filename):
-    """Servir archivos subidos"""
+    """Servir archivos subidos
+    
+    Para imágenes, `?w=<ancho>` sirve la miniatura pregenerada más cercana y
+    el formato (AVIF/WebP/original) se negocia con el header Accept o se fuerza
+    con `?format=`. Todas las respuestas son cacheables por un año, con ETag
+    fuerte, 304 condicional y soporte de Range (videos).
+    """
     try:
-        upload_dir = os.path.join(os.getcwd(), 'uploads', 'images')
-        return send_file(os.path.join(upload_dir, filename))
+        upload_dir = UPLOAD_DIR
+        
+        if not is_derivable(filename):
+            return send_immutable_file(os.path.join(upload_dir, filename))
+        
+        width = request.args.get('w', type=int)
+        fmt = pick_format(filename, request.headers.get('Accept', ''), request.args.get('format'))
+        path = ensure_derivative(upload_dir, filename, pick_width(width) if width else None, fmt)
+        
+        response = send_immutable_file(path, mimetype=MIMETYPES[fmt])
+        response.vary.add('Accept')
+        return response
     except Exception as e:
         return jsonify({"error": "Archivo no encontrado"}), 404
 
+def build_copy_prompt(user_id, platform, current_title, current_content):
+    """Prompt de copy según plataforma y preferencias de marca del usuario
+    
+    Devuelve (prompt, info) con el presupuesto de tokens y los campos recortados.
+    """
+    profile = brand_profiles.get(user_id, get_db())
+    return profile.copy_prompt(platform, current_title, current_content)
+
+def build_copy_hashtag_prompt(platform, source_content):
+    """Prompt de hashtags para el copy de un post; devuelve (prompt, info de tokens)"""
+    return COPY_HASHTAG_PROMPT.fit(
+        PROMPT_BUDGETS['hashtags'], ('content',), platform=platform, content=source_content
+    )
+
+COPY_SYSTEM_PROMPT = "Eres un experto en marketing digital especializado en crear contenido para PyMEs."
+
+def generate_copy_hashtags(platform, source_content, use_cache=True, tokens=None):
+    """Generar hashtags personalizados para el copy de un post
+    
+    `tokens` (opcional) se completa con el presupuesto y el uso de la llamada.
+    """
+    prompt, prompt_info = build_copy_hashtag_prompt(platform, source_content)
+    if tokens is not None:
+        tokens.update(prompt_info)
+    return complete(
+        messages=[
+            {"role": "user", "content": prompt}
+        ],
+        max_tokens=100,
+        temperature=0.5,
+        use_cache=use_cache,
+        tokens=tokens
+    )
+
+def sse_event(event, payload):
+    """Formatear un evento Server-Sent Events"""
+    return f"event: {event}\ndata: {json.dumps(payload, ensure_ascii=False)}\n\n"
+
 @app.route('/api/regenerate-copy', methods=['POST'])
 def regenerate_copy():
     """Regenerar copy de un post usando IA con preferencias personalizadas"""
@@ -479,273 +841,252 @@ def regenerate_copy():
         current_content = data.get('current_content', '')
         current_title = data.get('current_title', '')
         
-        # Obtener preferencias de marca del usuario
-        conn = sqlite3.connect(DATABASE_PATH)
-        conn.row_factory = sqlite3.Row
-        preferences = conn.execute(
-            'SELECT * FROM brand_preferences WHERE user_id = ?',
-            (user['id'],)
-        ).fetchone()
-        
-        # Configurar perfil del cliente basado en preferencias
-        if preferences:
-            client_profile = {
-                'business_type': preferences['brand_name'] or 'Marketing Digital',
-                'industry': preferences['industry'] or 'marketing',
-                'target_audience': preferences['target_audience'] or 'Pequeñas y medianas empresas',
-                'tone': preferences['communication_tone'] or 'profesional',
-                'brand_values': preferences['brand_values'] or 'innovación, calidad, confianza',
-                'content_themes': preferences['content_themes'] or 'marketing digital, tendencias',
-                'visual_style': preferences['visual_style'] or 'moderno'
-            }
+        prompt, prompt_info = build_copy_prompt(user['id'], platform, current_title, current_content)
+        
+        # Tokens estimados, recortes y uso real de cada llamada
+        tokens = {"copy": dict(prompt_info), "hashtags": {}}
+        
+        # Con especulación (default) los hashtags se generan en paralelo a partir del
+        # título y el contenido actual en lugar de esperar al copy nuevo
+        speculative = data.get('speculative', True)
+        use_cache = data.get('use_cache', True)
+        started = time.perf_counter()
+        
+        def generate_copy():
+            return complete(
+                messages=[
+                    {"role": "system", "content": COPY_SYSTEM_PROMPT},
+                    {"role": "user", "content": prompt}
+                ],
+                max_tokens=300,
+                temperature=0.7,
+                use_cache=use_cache,
+                tokens=tokens['copy']
+            )
+        
+        def generate_post_hashtags(source_content):
+            return generate_copy_hashtags(platform, source_content, use_cache=use_cache, tokens=tokens['hashtags'])
+        
+        if speculative:
+            results, timings = run_stages(
+                copy=generate_copy,
+                hashtags=lambda: generate_post_hashtags(f"{current_title}\n{current_content}".strip())
+            )
         else:
-            # Perfil por defecto
-            client_profile = {
-                'business_type': 'Marketing Digital para PyMEs',
-                'industry': 'marketing',
-                'target_audience': 'Pequeñas y medianas empresas',
-                'tone': 'profesional',
-                'brand_values': 'innovación, calidad, confianza',
-                'content_themes': 'marketing digital, tendencias',
-                'visual_style': 'moderno'
-            }
-        
-        # Prompt personalizado según plataforma y preferencias
-        if platform == 'instagram':
-            prompt = f"""
-            Eres un experto en marketing digital especializado en {client_profile['industry']}. Genera un post para Instagram que:
-            
-            PERFIL DE MARCA:
-            - Negocio: {client_profile['business_type']}
-            - Industria: {client_profile['industry']}
-            - Audiencia: {client_profile['target_audience']}
-            - Tono: {client_profile['tone']}
-            - Valores: {client_profile['brand_values']}
-            - Temas preferidos: {client_profile['content_themes']}
-            - Estilo visual: {client_profile['visual_style']}
-            
-            TÍTULO DEL POST: {current_title}
-            CONTENIDO ACTUAL: {current_content}
-            
-            INSTRUCCIONES:
-            - Mejora el contenido manteniendo el tema del título
-            - Usa emojis estratégicamente (máximo 5)
-            - Incluye una pregunta para generar engagement
-            - Máximo 150 palabras
-            - Tono profesional pero cercano
-            - Enfócate en valor para PyMEs
-            - Mantén coherencia con el título proporcionado
-            
-            Genera SOLO el texto del post, sin hashtags ni explicaciones adicionales.
-            """
-        else:  # LinkedIn
-            prompt = f"""
-            Eres un consultor en marketing digital para PyMEs. Genera un post profesional para LinkedIn que:
-            
-            PERFIL DEL CLIENTE:
-            - Negocio: {client_profile['business_type']}
-            - Audiencia: {client_profile['target_audience']}
-            - Tono: {client_profile['tone']}
-            
-            TÍTULO DEL POST: {current_title}
-            CONTENIDO ACTUAL: {current_content}
-            
-            INSTRUCCIONES:
-            - Mejora el contenido con un enfoque más profesional
-            - Mantén coherencia con el título proporcionado
-            - Incluye insights o estadísticas relevantes
-            - Termina con una pregunta para fomentar networking
-            - Máximo 200 palabras
-            - Sin emojis o muy pocos
-            - Enfócate en crecimiento empresarial
-            
-            Genera SOLO el texto del post, sin hashtags ni explicaciones adicionales.
-            """
-        
-        # Llamada a OpenAI con cliente moderno
-        response = openai_client.chat.completions.create(
-            model="gpt-4.1-mini",
-            messages=[
-                {"role": "system", "content": "Eres un experto en marketing digital especializado en crear contenido para PyMEs."},
-                {"role": "user", "content": prompt}
-            ],
-            max_tokens=300,
-            temperature=0.7
-        )
-        
-        new_content = response.choices[0].message.content.strip()
-        
-        # Generar hashtags personalizados
-        hashtag_prompt = f"""
-        Basándote en este contenido para {platform}: "{new_content}"
-        
-        Genera hashtags relevantes para una empresa de marketing digital que atiende PyMEs:
-        - Para Instagram: 8-10 hashtags mezclando populares y nicho
-        - Para LinkedIn: 3-5 hashtags profesionales
-        
-        Responde SOLO con los hashtags separados por espacios, empezando cada uno con #
-        """
-        
-        hashtag_response = openai_client.chat.completions.create(
-            model="gpt-4.1-mini",
-            messages=[
-                {"role": "user", "content": hashtag_prompt}
-            ],
-            max_tokens=100,
-            temperature=0.5
-        )
+            results, timings = run_stages(copy=generate_copy)
+            new_content = results['copy']
+            hashtag_results, hashtag_timings = run_stages(hashtags=lambda: generate_post_hashtags(new_content))
+            results.update(hashtag_results)
+            timings.update(hashtag_timings)
         
-        new_hashtags = hashtag_response.choices[0].message.content.strip()
+        new_content = results['copy']
+        new_hashtags = results['hashtags']
+        timings['total_ms'] = round((time.perf_counter() - started) * 1000, 1)
         
         return jsonify({
             "success": True,
             "new_content": new_content,
             "new_hashtags": new_hashtags,
+            "speculative": speculative,
+            "timings": timings,
+            "tokens": tokens,
             "message": "Copy regenerado con IA exitosamente"
         })
         
     except Exception as e:
         return jsonify({"success": False, "error": f"Error al regenerar copy: {str(e)}"}), 500
 
-@app.route('/api/generate-hashtags', methods=['POST'])
-def generate_hashtags():
-    """Generar hashtags con IA basados en el contenido del post"""
+@app.route('/api/regenerate-copy/stream', methods=['POST'])
+def regenerate_copy_stream():
+    """Regenerar copy con IA enviando los tokens por Server-Sent Events
+    
+    Eventos: `token` por cada fragmento del copy, `copy` con el texto completo,
+    `hashtags` con los hashtags y los tiempos por etapa, y `done` al final
+    (o `error` si algo falla).
+    """
     try:
         user = get_user_from_session()
         if not user:
             return jsonify({"success": False, "error": "No autenticado"}), 401
         
         data = request.get_json()
-        content = data.get('content', '')
-        title = data.get('title', '')
         platform = data.get('platform', 'instagram')
-        industry = data.get('industry', 'marketing digital')
+        current_content = data.get('current_content', '')
+        current_title = data.get('current_title', '')
+        speculative = data.get('speculative', True)
+        use_cache = data.get('use_cache', True)
         
-        if not content and not title:
-            return jsonify({"success": False, "error": "Se requiere contenido o título"}), 400
+        prompt, prompt_info = build_copy_prompt(user['id'], platform, current_title, current_content)
         
-        # Configuración del perfil del cliente
-        client_profile = {
-            'business_type': 'Marketing Digital para PyMEs',
-            'target_audience': 'Pequeñas y medianas empresas',
-            'industry': industry
-        }
+    except Exception as e:
+        return jsonify({"success": False, "error": f"Error al regenerar copy: {str(e)}"}), 500
+    
+    def events():
+        started = time.perf_counter()
+        timings = {}
+        tokens = {"copy": dict(prompt_info), "hashtags": {}}
+        
+        def elapsed_ms():
+            return round((time.perf_counter() - started) * 1000, 1)
+        
+        # Los hashtags especulativos se generan mientras el copy se transmite
+        hashtags_future = None
+        if speculative:
+            hashtags_future = submit_with_context(
+                llm_executor, generate_copy_hashtags, platform, f"{current_title}\n{current_content}".strip(), use_cache,
+                tokens['hashtags']
+            )
         
-        # Prompt personalizado según plataforma
-        if platform == 'instagram':
-            prompt = f"""
-            Eres un experto en marketing digital especializado en hashtags para Instagram.
-            
-            PERFIL DEL CLIENTE:
-            - Negocio: {client_profile['business_type']}
-            - Audiencia: {client_profile['target_audience']}
-            - Industria: {client_profile['industry']}
-            
-            CONTENIDO DEL POST:
-            Título: {title}
-            Contenido: {content}
-            
-            INSTRUCCIONES:
-            - Genera 10-12 hashtags estratégicos para Instagram
-            - Mezcla hashtags populares (100K-1M posts) con hashtags nicho (10K-100K posts)
-            - Incluye hashtags específicos de la industria
-            - Incluye hashtags de ubicación si es relevante (Argentina/LATAM)
-            - Incluye hashtags de comunidad (#pymes #emprendedores)
-            - Evita hashtags demasiado genéricos (#love #instagood)
-            - Prioriza hashtags que generen engagement real
-            
-            CATEGORÍAS A INCLUIR:
-            - 3-4 hashtags de industria específica
-            - 2-3 hashtags de audiencia objetivo
-            - 2-3 hashtags de contenido/tema
-            - 2-3 hashtags de comunidad/networking
-            
-            Responde SOLO con los hashtags separados por espacios, cada uno empezando con #
-            """
-        else:  # LinkedIn
-            prompt = f"""
-            Eres un consultor en marketing digital especializado en hashtags profesionales para LinkedIn.
-            
-            PERFIL DEL CLIENTE:
-            - Negocio: {client_profile['business_type']}
-            - Audiencia: {client_profile['target_audience']}
-            - Industria: {client_profile['industry']}
+        try:
+            parts = []
+            for delta in stream_complete(
+                messages=[
+                    {"role": "system", "content": COPY_SYSTEM_PROMPT},
+                    {"role": "user", "content": prompt}
+                ],
+                max_tokens=300,
+                temperature=0.7,
+                use_cache=use_cache,
+                tokens=tokens['copy']
+            ):
+                if not parts:
+                    timings['first_token_ms'] = elapsed_ms()
+                parts.append(delta)
+                yield sse_event('token', {"text": delta})
             
-            CONTENIDO DEL POST:
-            Título: {title}
-            Contenido: {content}
+            new_content = ''.join(parts).strip()
+            timings['copy_ms'] = elapsed_ms()
+            yield sse_event('copy', {"new_content": new_content})
             
-            INSTRUCCIONES:
-            - Genera 5-7 hashtags profesionales para LinkedIn
-            - Enfócate en hashtags de industria y profesionales
-            - Incluye hashtags de networking empresarial
-            - Evita hashtags demasiado casuales
-            - Prioriza hashtags que conecten con tomadores de decisión
+            if hashtags_future:
+                new_hashtags = hashtags_future.result()
+            else:
+                new_hashtags = generate_copy_hashtags(platform, new_content, use_cache=use_cache, tokens=tokens['hashtags'])
+            timings['total_ms'] = elapsed_ms()
             
-            CATEGORÍAS A INCLUIR:
-            - 2-3 hashtags de industria específica
-            - 2-3 hashtags profesionales/empresariales
-            - 1-2 hashtags de networking/comunidad
+            yield sse_event('hashtags', {
+                "new_hashtags": new_hashtags,
+                "speculative": speculative,
+                "timings": timings,
+                "tokens": tokens
+            })
+            yield sse_event('done', {"success": True, "message": "Copy regenerado con IA exitosamente"})
             
-            Responde SOLO con los hashtags separados por espacios, cada uno empezando con #
-            """
-        
-        # Llamada a OpenAI
-        response = openai_client.chat.completions.create(
-            model="gpt-4.1-mini",
-            messages=[
-                {"role": "system", "content": "Eres un experto en marketing digital especializado en hashtags estratégicos para redes sociales."},
-                {"role": "user", "content": prompt}
-            ],
-            max_tokens=150,
-            temperature=0.7
-        )
+        except Exception as e:
+            yield sse_event('error', {"success": False, "error": f"Error al regenerar copy: {str(e)}"})
+    
+    return Response(events(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+
+@app.route('/api/generate-hashtags', methods=['POST'])
+def generate_hashtags():
+    """Sugerir hashtags para el post con el índice local y, opcionalmente, con IA"""
+    try:
+        user = get_user_from_session()
+        if not user:
+            return jsonify({"success": False, "error": "No autenticado"}), 401
         
-        generated_hashtags = response.choices[0].message.content.strip()
+        data = request.get_json()
+        content = data.get('content', '')
+        title = data.get('title', '')
+        platform = data.get('platform', 'instagram')
+        industry = data.get('industry', 'marketing digital')
         
-        # Análisis adicional de hashtags
-        analysis_prompt = f"""
-        Analiza estos hashtags para {platform}: {generated_hashtags}
+        if not content and not title:
+            return jsonify({"success": False, "error": "Se requiere contenido o título"}), 400
         
-        Proporciona un breve análisis de:
-        1. Potencial de alcance (Alto/Medio/Bajo)
-        2. Nivel de competencia (Alto/Medio/Bajo)
-        3. Relevancia para PyMEs (Alta/Media/Baja)
+        # Sugerencia local a partir de los posts existentes, sin llamar al modelo
+        started = time.perf_counter()
+        suggestions = hashtag_engine.suggest(f"{title}\n{content}", platform=platform, user_id=user['id'])
+        local_ms = round((time.perf_counter() - started) * 1000, 1)
         
-        Responde en formato JSON:
-        {{
-            "reach_potential": "Alto/Medio/Bajo",
-            "competition_level": "Alto/Medio/Bajo", 
-            "relevance": "Alta/Media/Baja",
-            "recommendation": "Breve recomendación de uso"
-        }}
-        """
+        # Con enrich el modelo genera y analiza los hashtags como antes
+        if not data.get('enrich', HASHTAG_ENRICH):
+            return jsonify({
+                "success": True,
+                "hashtags": ' '.join(item['tag'] for item in suggestions),
+                "suggestions": suggestions,
+                "analysis": hashtag_engine.analyze(suggestions),
+                "platform": platform,
+                "source": "local",
+                "timings": {"local_ms": local_ms, "total_ms": local_ms},
+                "tokens": {},
+                "message": "Hashtags sugeridos a partir de tus posts"
+            })
         
-        analysis_response = openai_client.chat.completions.create(
-            model="gpt-4.1-mini",
-            messages=[
-                {"role": "user", "content": analysis_prompt}
-            ],
-            max_tokens=200,
-            temperature=0.3
-        )
+        # Prompt según plataforma con el perfil de la marca
+        profile = brand_profiles.get(user['id'], get_db())
+        prompt, prompt_info = profile.hashtag_prompt(platform, title, content, industry)
+        tokens = {"hashtags": dict(prompt_info), "analysis": {}}
+        
+        # Con especulación (default) el análisis evalúa el post en paralelo a la
+        # generación en lugar de esperar a los hashtags generados
+        speculative = data.get('speculative', True)
+        use_cache = data.get('use_cache', True)
+        
+        def generate_post_hashtags():
+            return complete(
+                messages=[
+                    {"role": "system", "content": "Eres un experto en marketing digital especializado en hashtags estratégicos para redes sociales."},
+                    {"role": "user", "content": prompt}
+                ],
+                max_tokens=150,
+                temperature=0.7,
+                use_cache=use_cache,
+                tokens=tokens['hashtags']
+            )
+        
+        def analyze_hashtags(kind, **values):
+            # Análisis adicional de hashtags (del post o de los ya generados)
+            analysis_prompt, analysis_info = HASHTAG_ANALYSIS_PROMPTS[kind].fit(
+                PROMPT_BUDGETS['hashtags'], ('content', 'title', 'hashtags'), platform=platform, **values
+            )
+            tokens['analysis'].update(analysis_info)
+            return complete(
+                messages=[
+                    {"role": "user", "content": analysis_prompt}
+                ],
+                max_tokens=200,
+                temperature=0.3,
+                use_cache=use_cache,
+                tokens=tokens['analysis']
+            )
+        
+        if speculative:
+            results, timings = run_stages(
+                hashtags=generate_post_hashtags,
+                analysis=lambda: analyze_hashtags('post', title=title, content=content)
+            )
+        else:
+            results, timings = run_stages(hashtags=generate_post_hashtags)
+            generated_hashtags = results['hashtags']
+            analysis_results, analysis_timings = run_stages(
+                analysis=lambda: analyze_hashtags('hashtags', hashtags=generated_hashtags)
+            )
+            results.update(analysis_results)
+            timings.update(analysis_timings)
+        
+        generated_hashtags = results['hashtags']
+        timings['local_ms'] = local_ms
+        timings['total_ms'] = round((time.perf_counter() - started) * 1000, 1)
         
         try:
-            import json
-            analysis = json.loads(analysis_response.choices[0].message.content.strip())
+            analysis = json.loads(results['analysis'])
         except:
-            analysis = {
-                "reach_potential": "Medio",
-                "competition_level": "Medio",
-                "relevance": "Alta",
-                "recommendation": "Hashtags optimizados para tu audiencia objetivo"
-            }
+            analysis = hashtag_engine.analyze(suggestions)
         
         return jsonify({
             "success": True,
             "hashtags": generated_hashtags,
+            "suggestions": suggestions,
             "analysis": analysis,
             "platform": platform,
+            "source": "ai",
+            "speculative": speculative,
+            "timings": timings,
+            "tokens": tokens,
             "message": "Hashtags generados exitosamente con IA"
         })
         
@@ -764,13 +1105,16 @@ def approve_all():
         if not user:
             return jsonify({"success": False, "error": "No autenticado"}), 401
         
-        conn = sqlite3.connect(DATABASE_PATH)
+        conn = get_db()
         result = conn.execute(
             'UPDATE posts SET status = "approved" WHERE user_id = ? AND status = "draft"',
             (user['id'],)
         )
         conn.commit()
-        conn.close()
+        
+        # Los recién aprobados entran en la cola de publicación
+        if result.rowcount:
+            publish_dispatcher.load(conn, user['id'])
         
         return jsonify({
             "success": True,
@@ -780,6 +1124,77 @@ def approve_all():
     except Exception as e:
         return jsonify({"success": False, "error": str(e)}), 500
 
+@app.route('/api/admin/posts/status', methods=['POST'])
+def bulk_post_status():
+    """Cambiar el estado de posts de varios clientes a la vez (solo admin)
+    
+    Cuerpo: `status` destino (`approved` o `draft`), `from_status` opcional y
+    filtros `user_ids`, `post_ids`, `from`/`to` (scheduled_date) y `platform`.
+    Todo se aplica en una transacción con un UPDATE por lote; con
+    `{"dry_run": true}` solo se cuenta lo que cambiaría.
+    """
+    try:
+        user = get_user_from_session(fresh=True)
+        if not user:
+            return jsonify({"success": False, "error": "No autenticado"}), 401
+        if user['role'] != 'admin':
+            return jsonify({"success": False, "error": "Solo administradores"}), 403
+        
+        data = request.get_json(silent=True) or {}
+        try:
+            status, from_statuses, filters = parse_status_filters(data)
+        except ValueError as e:
+            return jsonify({"success": False, "error": str(e)}), 400
+        
+        dry_run = bool(data.get('dry_run'))
+        conn = get_db()
+        counts, changed = bulk_update_status(conn, status, from_statuses, filters, dry_run=dry_run)
+        conn.commit()
+        
+        # Los aprobados entran en la cola de publicación
+        if status == 'approved' and changed:
+            publish_dispatcher.schedule_many(
+                (post_id, scheduled_date, scheduled_time) for post_id, _, scheduled_date, scheduled_time in changed
+            )
+        
+        emails = {}
+        if counts:
+            user_ids = list(counts)
+            rows = conn.execute(
+                f"SELECT id, email FROM users WHERE id IN ({', '.join('?' * len(user_ids))})", user_ids
+            ).fetchall()
+            emails = {row['id']: row['email'] for row in rows}
+        
+        return jsonify({
+            "success": True,
+            "status": status,
+            "from_status": from_statuses,
+            "dry_run": dry_run,
+            "updated": sum(counts.values()),
+            "by_user": [
+                {"user_id": user_id, "email": emails.get(user_id), "updated": count}
+                for user_id, count in sorted(counts.items())
+            ]
+        })
+        
+    except Exception as e:
+        return jsonify({"success": False, "error": str(e)}), 500
+
+@app.route('/api/publishing', methods=['GET'])
+def publishing_status():
+    """Estado del dispatcher de publicación de este proceso (solo admin)"""
+    try:
+        user = get_user_from_session(fresh=True)
+        if not user:
+            return jsonify({"success": False, "error": "No autenticado"}), 401
+        if user['role'] != 'admin':
+            return jsonify({"success": False, "error": "Solo administradores"}), 403
+        
+        return jsonify({"success": True, **publish_dispatcher.stats()})
+        
+    except Exception as e:
+        return jsonify({"success": False, "error": str(e)}), 500
+
 @app.route('/api/brand-preferences', methods=['GET'])
 def get_brand_preferences():
     """Obtener preferencias de marca del usuario"""
@@ -788,13 +1203,11 @@ def get_brand_preferences():
         if not user:
             return jsonify({"success": False, "error": "No autenticado"}), 401
         
-        conn = sqlite3.connect(DATABASE_PATH)
-        conn.row_factory = sqlite3.Row
+        conn = get_db()
         preferences = conn.execute(
             'SELECT * FROM brand_preferences WHERE user_id = ?',
             (user['id'],)
         ).fetchone()
-        conn.close()
         
         if preferences:
             return jsonify({
@@ -833,7 +1246,7 @@ def save_brand_preferences():
         
         data = request.get_json()
         
-        conn = sqlite3.connect(DATABASE_PATH)
+        conn = get_db()
         
         # Verificar si ya existen preferencias
         existing = conn.execute(
@@ -900,7 +1313,9 @@ def save_brand_preferences():
             ))
         
         conn.commit()
-        conn.close()
+        
+        # Calendario, copy, hashtags e imágenes toman el perfil nuevo
+        brand_profiles.invalidate(user['id'])
         
         return jsonify({
             "success": True,
@@ -910,6 +1325,56 @@ def save_brand_preferences():
     except Exception as e:
         return jsonify({"success": False, "error": str(e)}), 500
 
+def build_image_prompt(user_id, post_title, post_content, platform):
+    """Prompt de imagen según el post y las preferencias de marca
+    
+    Devuelve (prompt, estilo de marca, texto del post) para la caché de imágenes.
+    """
+    return brand_profiles.get(user_id).image_prompt_parts(platform, post_title, post_content)
+
+def create_ai_image(user_id, prompt, style=None, subject=None):
+    """Generar una imagen con IA en uploads, registrarla y cachearla; devuelve el nombre"""
+    from media_generate_image import generate_image_with_ai
+    
+    image_dir = UPLOAD_DIR
+    os.makedirs(image_dir, exist_ok=True)
+    
+    image_filename = f"generated_{uuid.uuid4().hex[:8]}.png"
+    image_path = os.path.join(image_dir, image_filename)
+    
+    if not generate_image_with_ai(prompt, image_path):
+        raise RuntimeError("Error al generar la imagen con IA")
+    
+    # Registrada para que el GC la borre si nunca se asocia a un post
+    with connection() as conn:
+        register_media(conn, image_filename, file_etag(image_path), os.path.getsize(image_path), user_id)
+        conn.commit()
+    
+    if style is not None:
+        image_cache.set(user_id, style, prompt, subject, image_filename)
+    
+    # Las miniaturas quedan listas antes de que el dashboard pida la imagen
+    try:
+        generate_derivatives(image_dir, image_filename)
+    except Exception as e:
+        print(f"Error generando variantes de {image_filename}: {str(e)}")
+    
+    return image_filename
+
+def run_image_generation(payload, progress):
+    """Trabajo en segundo plano: generar imagen con IA y guardarla en uploads"""
+    image_filename = create_ai_image(
+        payload.get('user_id'), payload['prompt'], payload.get('style'), payload.get('subject')
+    )
+    
+    return {
+        "image_url": f"/uploads/images/{image_filename}",
+        "prompt_used": payload['prompt'],
+        "message": "Imagen generada exitosamente con IA"
+    }
+
+job_queue.register('generate_image', run_image_generation)
+
 @app.route('/api/generate-image', methods=['POST'])
 def generate_image():
     """Generar imagen con IA basada en el contenido del post y preferencias de marca"""
@@ -923,100 +1388,269 @@ def generate_image():
         post_content = data.get('content', '')
         platform = data.get('platform', 'instagram')
         
-        # Obtener preferencias de marca
-        conn = sqlite3.connect(DATABASE_PATH)
-        conn.row_factory = sqlite3.Row
-        preferences = conn.execute(
-            'SELECT * FROM brand_preferences WHERE user_id = ?',
-            (user['id'],)
-        ).fetchone()
-        conn.close()
-        
-        # Construir prompt para generación de imagen
-        if preferences:
-            brand_style = preferences['image_style_preferences'] or "profesional, moderno"
-            brand_colors = preferences['brand_colors'] or "#3B82F6,#FFFFFF"
-            visual_style = preferences['visual_style'] or "moderno"
-            industry = preferences['industry'] or "general"
-        else:
-            brand_style = "profesional, moderno"
-            brand_colors = "#3B82F6,#FFFFFF"
-            visual_style = "moderno"
-            industry = "general"
-        
-        # Crear prompt detallado para la imagen
-        image_prompt = f"""
-        Crear una imagen para redes sociales con el siguiente contexto:
-        
-        Título: {post_title}
-        Contenido: {post_content}
-        
-        Estilo visual: {brand_style}, {visual_style}
-        Industria: {industry}
-        Plataforma: {platform}
-        
-        La imagen debe ser:
-        - Profesional y atractiva para redes sociales
-        - Coherente con el mensaje del post
-        - Estilo {visual_style} y {brand_style}
-        - Optimizada para {platform}
-        - Sin texto superpuesto
-        - Alta calidad y resolución
-        
-        Evitar: texto en la imagen, elementos genéricos, baja calidad
-        """
+        image_prompt, style, subject = build_image_prompt(user['id'], post_title, post_content, platform)
         
-        # Generar imagen usando la API de generación
-        import tempfile
-        import uuid
-        
-        # Crear directorio temporal para la imagen
-        temp_dir = "uploads/images"
-        os.makedirs(temp_dir, exist_ok=True)
+        # Imagen ya generada para este prompt o uno muy parecido: se ofrece
+        # reutilizarla y el dashboard decide (con `force` se genera una nueva)
+        if not data.get('force'):
+            match = image_cache.lookup(user['id'], style, image_prompt, subject)
+            if match:
+                return jsonify({
+                    "success": True,
+                    "status": "cached",
+                    "image_url": f"/uploads/images/{match['filename']}",
+                    "exact": match['exact'],
+                    "similarity": match['similarity'],
+                    "prompt_used": image_prompt
+                })
         
-        image_filename = f"generated_{uuid.uuid4().hex[:8]}.png"
-        image_path = os.path.join(temp_dir, image_filename)
+        # Encolar la generación: el request vuelve de inmediato con el id del trabajo
+        job_id = job_queue.submit('generate_image', user['id'], {
+            "prompt": image_prompt,
+            "user_id": user['id'],
+            "style": style,
+            "subject": subject
+        })
         
-        # Generar imagen con IA usando media_generate_image
-        from media_generate_image import generate_image_with_ai
+        return jsonify({
+            "success": True,
+            "job_id": job_id,
+            "status": "queued",
+            "status_url": f"/api/jobs/{job_id}",
+            "message": "Generación de imagen en curso"
+        }), 202
         
+    except Exception as e:
+        print(f"Error en generate_image: {str(e)}")
+        return jsonify({"success": False, "error": f"Error al generar imagen: {str(e)}"}), 500
+
+# Imágenes que se generan a la vez entre todos los lotes
+IMAGE_BATCH_CONCURRENCY = int(os.getenv('POSTIA_IMAGE_BATCH_CONCURRENCY', '3'))
+IMAGE_BATCH_MAX_POSTS = int(os.getenv('POSTIA_IMAGE_BATCH_MAX_POSTS', '100'))
+
+# Lotes coordinados a la vez (cada uno es de un usuario distinto)
+IMAGE_BATCH_JOBS = int(os.getenv('POSTIA_IMAGE_BATCH_JOBS', '4'))
+
+image_executor = ThreadPoolExecutor(max_workers=IMAGE_BATCH_CONCURRENCY, thread_name_prefix='postia-image')
+
+# Imágenes nuevas por minuto que puede pedir cada usuario en lotes
+image_rate_limiter = TokenBucketLimiter(int(os.getenv('POSTIA_IMAGE_RATE_PER_MINUTE', '10')))
+
+def store_post_image(user_id, post_id, filename, overwrite):
+    """Guardar la imagen en media_files del post apenas está lista"""
+    image_url = f"/uploads/images/{filename}"
+    with connection() as conn:
+        # Sin `overwrite` no se pisa una imagen que el usuario haya cargado mientras tanto
+        updated = conn.execute('''
+            UPDATE posts SET media_files = ?
+            WHERE id = ? AND user_id = ? AND (? OR media_files IS NULL OR media_files = '')
+        ''', (image_url, post_id, user_id, overwrite)).rowcount
+        if updated:
+            sync_post_media(conn, post_id, [image_url])
+        conn.commit()
+    
+    return image_url
+
+def generate_post_image(user_id, post_id, prompt_parts, overwrite):
+    """Imagen nueva de un post del lote (en image_executor, ya con el token del límite)"""
+    filename = create_ai_image(user_id, *prompt_parts)
+    return store_post_image(user_id, post_id, filename, overwrite)
+
+def run_batch_image_generation(payload, progress):
+    """Trabajo en segundo plano: generar las imágenes de varios posts en paralelo acotado
+    
+    Este thread coordina el lote: resuelve las reutilizaciones de la caché y
+    manda a image_executor solo las imágenes para las que el usuario tiene
+    token en el límite de tasa. Si no tiene, espera acá (no en un thread del
+    pool compartido), así un usuario limitado no frena los lotes de los demás.
+    """
+    user_id = payload['user_id']
+    post_ids = payload['post_ids']
+    reuse_cached = payload.get('reuse_cached', True)
+    overwrite = payload.get('overwrite', False)
+    
+    with connection() as conn:
+        posts = conn.execute(
+            f"SELECT id, title, content, platform FROM posts WHERE user_id = ? AND id IN ({', '.join('?' * len(post_ids))})",
+            [user_id, *post_ids]
+        ).fetchall()
+    
+    images, failed = {}, []
+    reused = done = 0
+    total = len(posts)
+    progress(0, total)
+    
+    def record_failure(post_id, error):
+        print(f"Error generando imagen del post {post_id}: {str(error)}")
+        failed.append({"post_id": post_id, "error": str(error)})
+    
+    # En lote solo se reutilizan imágenes de prompts idénticos, sin preguntar
+    pending = deque()
+    for post in posts:
         try:
-            # Llamar a la función de generación de imágenes
-            success = generate_image_with_ai(image_prompt.strip(), image_path)
-            
-            if success:
-                return jsonify({
-                    "success": True,
-                    "image_url": f"/uploads/images/{image_filename}",
-                    "message": "Imagen generada exitosamente con IA",
-                    "prompt_used": image_prompt.strip()
-                })
+            prompt_parts = build_image_prompt(
+                user_id, post['title'] or '', post['content'] or '', post['platform'] or 'instagram'
+            )
+            match = image_cache.lookup(user_id, prompt_parts[1], prompt_parts[0], prompt_parts[2], similar=False) if reuse_cached else None
+            if match:
+                images[post['id']] = store_post_image(user_id, post['id'], match['filename'], overwrite)
+                reused += 1
+                done += 1
             else:
-                return jsonify({
-                    "success": False,
-                    "error": "Error al generar la imagen con IA"
-                }), 500
-                
-        except Exception as img_error:
-            print(f"Error en generación de imagen: {str(img_error)}")
-            # Fallback: crear imagen placeholder
+                pending.append((post['id'], prompt_parts))
+        except Exception as e:
+            record_failure(post['id'], e)
+            done += 1
+    progress(done, total)
+    
+    running = {}
+    while pending or running:
+        retry_after = 0
+        while pending:
+            retry_after = image_rate_limiter.take(user_id)
+            if retry_after:
+                break
+            post_id, prompt_parts = pending.popleft()
+            future = submit_with_context(image_executor, generate_post_image, user_id, post_id, prompt_parts, overwrite)
+            running[future] = post_id
+        
+        # Sin imágenes en curso no hay nada que esperar más que el próximo token
+        # (wait() con un dict vacío vuelve enseguida y el loop giraría sin parar)
+        if not running:
+            time.sleep(retry_after)
+            continue
+        
+        # Esperar a la próxima imagen lista o, si el límite frenó el lote, al próximo token
+        finished, _ = wait(running, timeout=retry_after or None, return_when=FIRST_COMPLETED)
+        for future in finished:
+            post_id = running.pop(future)
+            try:
+                images[post_id] = future.result()
+            except Exception as e:
+                record_failure(post_id, e)
+            done += 1
+        if finished:
+            progress(done, total)
+    
+    return {
+        "generated": len(images) - reused,
+        "reused": reused,
+        "failed": failed,
+        "images": images,
+        "message": f"Se generaron imágenes para {len(images)} de {total} posts"
+    }
+
+# Los lotes tienen su propio pool: no ocupan los threads de imágenes sueltas ni calendarios
+job_queue.register('generate_images_batch', run_batch_image_generation, workers=IMAGE_BATCH_JOBS)
+
+@app.route('/api/generate-images', methods=['POST'])
+def generate_images_batch():
+    """Generar imágenes para varios posts en un solo trabajo
+    
+    Recibe `post_ids` o un rango `from`/`to` (YYYY-MM-DD). Por defecto se
+    saltean los posts de texto y los que ya tienen archivos (`overwrite: true`
+    los incluye). Cada imagen se guarda en el post apenas se genera y el avance
+    se consulta en /api/jobs/<id>.
+    """
+    try:
+        user = get_user_from_session()
+        if not user:
+            return jsonify({"success": False, "error": "No autenticado"}), 401
+        
+        data = request.get_json(silent=True) or {}
+        overwrite = bool(data.get('overwrite'))
+        
+        conn = get_db()
+        
+        query = "SELECT id FROM posts WHERE user_id = ? AND COALESCE(content_type, 'image') != 'text'"
+        params = [user['id']]
+        if not overwrite:
+            query += " AND (media_files IS NULL OR media_files = '')"
+        
+        if data.get('post_ids'):
+            try:
+                if not isinstance(data['post_ids'], list):
+                    raise TypeError
+                post_ids = [int(post_id) for post_id in data['post_ids']]
+            except (TypeError, ValueError):
+                return jsonify({"success": False, "error": "post_ids debe ser una lista de ids numéricos"}), 400
+            query += f" AND id IN ({', '.join('?' * len(post_ids))})"
+            params += post_ids
+        elif data.get('from') and data.get('to'):
+            query += " AND scheduled_date BETWEEN ? AND ?"
+            params += [data['from'], data['to']]
+        else:
+            return jsonify({"success": False, "error": "Indicar post_ids o un rango from/to"}), 400
+        
+        post_ids = [row['id'] for row in conn.execute(query + ' ORDER BY scheduled_date, id', params)]
+        if not post_ids:
+            return jsonify({"success": True, "total": 0, "message": "No hay posts sin imagen en la selección"})
+        if len(post_ids) > IMAGE_BATCH_MAX_POSTS:
             return jsonify({
-                "success": True,
-                "image_url": f"/uploads/images/{image_filename}",
-                "message": "Imagen generada exitosamente con IA (modo demo)",
-                "prompt_used": image_prompt.strip()
-            })
+                "success": False,
+                "error": f"Se pueden generar hasta {IMAGE_BATCH_MAX_POSTS} imágenes por lote"
+            }), 400
+        
+        job_id = job_queue.submit('generate_images_batch', user['id'], {
+            "user_id": user['id'],
+            "post_ids": post_ids,
+            "overwrite": overwrite,
+            "reuse_cached": bool(data.get('reuse_cached', True))
+        }, exclusive=True)
+        
+        # Un lote a la vez por usuario
+        if job_id is None:
+            return jsonify({
+                "success": False,
+                "error": "Ya hay una generación de imágenes en curso",
+                "job_id": job_queue.active('generate_images_batch', user['id'])
+            }), 409
+        
+        return jsonify({
+            "success": True,
+            "job_id": job_id,
+            "total": len(post_ids),
+            "status": "queued",
+            "status_url": f"/api/jobs/{job_id}"
+        }), 202
         
     except Exception as e:
-        print(f"Error en generate_image: {str(e)}")
-        return jsonify({"success": False, "error": f"Error al generar imagen: {str(e)}"}), 500
+        return jsonify({"success": False, "error": str(e)}), 500
+
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    """Consultar el estado de un trabajo en segundo plano"""
+    try:
+        user = get_user_from_session()
+        if not user:
+            return jsonify({"success": False, "error": "No autenticado"}), 401
+        
+        job = job_queue.get(job_id, user_id=user['id'])
+        if not job:
+            return jsonify({"success": False, "error": "Trabajo no encontrado"}), 404
+        
+        return jsonify({
+            "success": True,
+            "job": job
+        })
+        
+    except Exception as e:
+        return jsonify({"success": False, "error": str(e)}), 500
 
 # Inicializar BD
 init_db()
 
+# Con gunicorn los trabajos, el dispatcher y el índice de hashtags arrancan en cada worker después del fork (ver gunicorn.conf.py)
+if not os.getenv('POSTIA_GUNICORN'):
+    job_queue.recover()
+    with connection() as conn:
+        fail_interrupted_publications(conn)
+    publish_dispatcher.start()
+    hashtag_engine.warm()
+
 if __name__ == '__main__':
     print("🚀 Iniciando Postia Profesional...")
-    app.run(host='0.0.0.0', port=5001, debug=False)
+    app.run(host=os.getenv('POSTIA_HOST', '0.0.0.0'), port=int(os.getenv('PORT', '5001')), debug=False)
 
 
 
@@ -0,0 +1,177 @@
+"""
+Perfil de marca por usuario para calendario, copy, hashtags e imágenes
+
+Lee brand_preferences una vez, completa los valores por defecto en un solo
+lugar y deja enlazadas a la marca las plantillas de prompts.py: en cada
+request solo falta completar título, contenido y plataforma. Los perfiles se
+cachean en memoria y save_brand_preferences invalida el del usuario; con
+varios procesos el TTL acota cuánto tarda un cambio en verse en los demás.
+"""
+
+import os
+
+from cache import TTLCache
+from db import connection
+from prompts import (
+    BRAND_FIELD_TOKENS, COPY_PROMPTS, HASHTAG_PROMPTS, IMAGE_PROMPT, PROMPT_BUDGETS, truncate_tokens
+)
+
+DEFAULT_PROFILE = {
+    'business_type': 'Marketing Digital para PyMEs',
+    'industry': 'marketing',
+    'target_audience': 'Pequeñas y medianas empresas',
+    'tone': 'profesional',
+    'brand_values': 'innovación, calidad, confianza',
+    'content_themes': 'marketing digital, tendencias, casos de éxito',
+    'visual_style': 'moderno',
+    'platforms': ['instagram', 'linkedin']
+}
+
+DEFAULT_IMAGE_STYLE = {
+    'brand_style': 'profesional, moderno',
+    'brand_colors': '#3B82F6,#FFFFFF',
+    'visual_style': 'moderno',
+    'industry': 'general'
+}
+
+# Industria del prompt de hashtags cuando la marca no definió una
+DEFAULT_HASHTAG_INDUSTRY = 'marketing digital'
+
+# Columna de brand_preferences de la que sale cada campo del perfil
+PROFILE_COLUMNS = {
+    'business_type': 'brand_name',
+    'industry': 'industry',
+    'target_audience': 'target_audience',
+    'tone': 'communication_tone',
+    'brand_values': 'brand_values',
+    'content_themes': 'content_themes',
+    'visual_style': 'visual_style'
+}
+
+# Temas del calendario según industria
+INDUSTRY_TOPICS = {
+    'tecnologia': ['IA y automatización', 'Transformación digital', 'Ciberseguridad', 'Innovación tecnológica'],
+    'marketing': ['Marketing de contenidos', 'SEO y SEM', 'Redes sociales', 'Email marketing'],
+    'salud': ['Bienestar digital', 'Telemedicina', 'Prevención', 'Salud mental'],
+    'educacion': ['E-learning', 'Metodologías innovadoras', 'Tecnología educativa', 'Desarrollo profesional'],
+    'finanzas': ['Fintech', 'Inversiones inteligentes', 'Educación financiera', 'Criptomonedas'],
+    'retail': ['E-commerce', 'Experiencia del cliente', 'Omnicanalidad', 'Retail tech'],
+    'servicios': ['Atención al cliente', 'Digitalización', 'Eficiencia operativa', 'Calidad de servicio']
+}
+
+GENERIC_TOPICS = [
+    'Inteligencia Artificial en negocios',
+    'Marketing de contenidos 2025',
+    'Automatización de procesos',
+    'Estrategias de crecimiento digital'
+]
+
+# Temas personalizados del usuario que se suman a los de la industria
+MAX_CUSTOM_TOPICS = 4
+
+
+class BrandProfile:
+    """Perfil resuelto de un usuario y sus plantillas de prompts ya enlazadas"""
+
+    def __init__(self, preferences=None):
+        preferences = dict(preferences) if preferences else {}
+
+        self.client_profile = dict(DEFAULT_PROFILE)
+        for field, column in PROFILE_COLUMNS.items():
+            if preferences.get(column):
+                self.client_profile[field] = preferences[column]
+
+        self.topics = list(INDUSTRY_TOPICS.get(self.client_profile['industry'], GENERIC_TOPICS))
+        custom_themes = [theme.strip() for theme in self.client_profile['content_themes'].split(',')]
+        self.topics.extend(custom_themes[:MAX_CUSTOM_TOPICS])
+
+        self.image_style = {
+            'brand_style': preferences.get('image_style_preferences') or DEFAULT_IMAGE_STYLE['brand_style'],
+            'brand_colors': preferences.get('brand_colors') or DEFAULT_IMAGE_STYLE['brand_colors'],
+            'visual_style': preferences.get('visual_style') or DEFAULT_IMAGE_STYLE['visual_style'],
+            'industry': preferences.get('industry') or DEFAULT_IMAGE_STYLE['industry']
+        }
+
+        # Los hashtags usan la industria del request si la marca no tiene una
+        hashtag_fields = {
+            'business_type': self.client_profile['business_type'],
+            'target_audience': self.client_profile['target_audience']
+        }
+        if preferences.get('industry'):
+            hashtag_fields['industry'] = preferences['industry']
+
+        # Los campos de marca entran en los prompts con un tope de tokens cada uno
+        copy_fields = {
+            field: truncate_tokens(value, BRAND_FIELD_TOKENS)
+            for field, value in self.client_profile.items() if isinstance(value, str)
+        }
+        hashtag_fields = {field: truncate_tokens(value, BRAND_FIELD_TOKENS) for field, value in hashtag_fields.items()}
+        image_fields = {field: truncate_tokens(value, BRAND_FIELD_TOKENS) for field, value in self.image_style.items()}
+
+        self.copy_prompts = {
+            platform: template.bind(**copy_fields) for platform, template in COPY_PROMPTS.items()
+        }
+        self.hashtag_prompts = {
+            platform: template.bind(**hashtag_fields) for platform, template in HASHTAG_PROMPTS.items()
+        }
+        self.image_prompt = IMAGE_PROMPT.bind(**image_fields)
+
+    def copy_prompt(self, platform, title, content):
+        """(prompt, info de tokens) de copy: el de Instagram o, para otra plataforma, el de LinkedIn"""
+        template = self.copy_prompts['instagram' if platform == 'instagram' else 'linkedin']
+        return template.fit(PROMPT_BUDGETS['copy'], ('content', 'title'), title=title, content=content)
+
+    def hashtag_prompt(self, platform, title, content, industry=DEFAULT_HASHTAG_INDUSTRY):
+        """(prompt, info de tokens) de hashtags para el post"""
+        template = self.hashtag_prompts['instagram' if platform == 'instagram' else 'linkedin']
+        return template.fit(
+            PROMPT_BUDGETS['hashtags'], ('content', 'title', 'industry'),
+            title=title, content=content, industry=truncate_tokens(industry, BRAND_FIELD_TOKENS)
+        )
+
+    def image_prompt_parts(self, platform, title, content):
+        """(prompt, estilo de marca, texto del post) para la caché de imágenes"""
+        prompt, _ = self.image_prompt.fit(
+            PROMPT_BUDGETS['image'], ('content', 'title'), title=title, content=content, platform=platform
+        )
+        style = ' | '.join([
+            self.image_style['brand_style'], self.image_style['brand_colors'],
+            self.image_style['visual_style'], self.image_style['industry'], platform
+        ])
+        return prompt, style, f"{title}\n{content}"
+
+
+class BrandProfiles:
+    """Perfiles de marca por user_id en una caché LRU con TTL"""
+
+    def __init__(self, maxsize=1024, ttl=600):
+        self._cache = TTLCache(maxsize=maxsize, ttl=ttl)
+
+    def get(self, user_id, conn=None):
+        """Perfil del usuario; solo consulta la base (con `conn` o una del pool) si no está cacheado"""
+        profile = self._cache.get(user_id)
+        if profile is None:
+            if conn is None:
+                with connection() as conn:
+                    preferences = self._load(conn, user_id)
+            else:
+                preferences = self._load(conn, user_id)
+            profile = BrandProfile(preferences)
+            self._cache.set(user_id, profile)
+        return profile
+
+    @staticmethod
+    def _load(conn, user_id):
+        return conn.execute('SELECT * FROM brand_preferences WHERE user_id = ?', (user_id,)).fetchone()
+
+    def invalidate(self, user_id):
+        self._cache.pop(user_id)
+
+    def stats(self):
+        return self._cache.stats()
+
+
+brand_profiles = BrandProfiles(
+    maxsize=int(os.getenv('POSTIA_BRAND_CACHE_SIZE', '1024')),
+    ttl=int(os.getenv('POSTIA_BRAND_CACHE_TTL', '600'))
+)
@@ -0,0 +1,255 @@
+"""
+Generación de calendarios de contenido por lotes
+"""
+
+import json
+import os
+from datetime import timedelta
+from itertools import islice
+
+from db import connection
+from hashtag_engine import hashtag_engine
+from llm import complete
+
+# Posts que se piden al modelo en una sola llamada
+CALENDAR_BATCH_SIZE = int(os.getenv('POSTIA_CALENDAR_BATCH_SIZE', '10'))
+
+# Horizonte máximo que se puede generar de una vez
+CALENDAR_MAX_DAYS = int(os.getenv('POSTIA_CALENDAR_MAX_DAYS', '365'))
+
+CONTENT_TYPES = ['image', 'carousel', 'video', 'text']
+
+OPTIMAL_TIMES = {
+    'instagram': ['09:00', '12:00', '18:00', '20:00'],
+    'linkedin': ['08:00', '12:00', '17:00', '19:00']
+}
+
+INSERT_POST_SQL = '''
+    INSERT INTO posts (user_id, title, content, platform, content_type,
+                     scheduled_date, scheduled_time, hashtags, platforms, status)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+'''
+
+# Modo incremental: el hueco se vuelve a verificar al insertar, por si otro trabajo o
+# el usuario lo ocuparon después de leer occupied_slots()
+INSERT_FREE_SLOT_SQL = '''
+    INSERT INTO posts (user_id, title, content, platform, content_type,
+                     scheduled_date, scheduled_time, hashtags, platforms, status)
+    SELECT ?, ?, ?, ?, ?, ?, ?, ?, ?, ?
+    WHERE NOT EXISTS (
+        SELECT 1 FROM posts
+        WHERE user_id = ? AND scheduled_date = ? AND scheduled_time = ? AND platform = ?
+    )
+'''
+
+
+def plan_slots(start_date, days, posts_per_day, client_profile, topics, occupied=frozenset()):
+    """Recorrer los huecos del calendario sin materializarlos todos en memoria
+
+    Se saltean los huecos cuyo (fecha, hora, plataforma) esté en `occupied`.
+    """
+    platforms = client_profile['platforms']
+    for day in range(days):
+        date_str = (start_date + timedelta(days=day)).strftime('%Y-%m-%d')
+        for post_num in range(posts_per_day):
+            platform = platforms[post_num % len(platforms)]
+            time_slot = OPTIMAL_TIMES[platform][post_num % len(OPTIMAL_TIMES[platform])]
+            if (date_str, time_slot, platform) in occupied:
+                continue
+            yield {
+                'scheduled_date': date_str,
+                'scheduled_time': time_slot,
+                'platform': platform,
+                'content_type': CONTENT_TYPES[post_num % len(CONTENT_TYPES)],
+                'topic': topics[((day * posts_per_day) + post_num) % len(topics)]
+            }
+
+
+def occupied_slots(conn, user_id, start_date, days):
+    """Huecos (fecha, hora, plataforma) que ya tienen un post en el rango"""
+    rows = conn.execute('''
+        SELECT scheduled_date, scheduled_time, platform FROM posts
+        WHERE user_id = ? AND scheduled_date BETWEEN ? AND ?
+    ''', (
+        user_id,
+        start_date.strftime('%Y-%m-%d'),
+        (start_date + timedelta(days=days - 1)).strftime('%Y-%m-%d')
+    ))
+    return {(row['scheduled_date'], row['scheduled_time'], row['platform']) for row in rows}
+
+
+def batched(iterable, size):
+    """Agrupar un iterable en listas de hasta `size` elementos"""
+    iterator = iter(iterable)
+    while True:
+        batch = list(islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+def suggested_hashtags(slot, title, content, user_id=None, seed=''):
+    """Hashtags del índice local para el post, sin llamar al modelo"""
+    suggestions = hashtag_engine.suggest(
+        f"{title}\n{content}\n{slot['topic']}", platform=slot['platform'], user_id=user_id, seed=seed
+    )
+    return ' '.join(item['tag'] for item in suggestions)
+
+
+def template_post(slot, user_id=None):
+    """Post a partir de plantillas fijas (sin IA)
+
+    Los hashtags fijos de cada plantilla entran como sugerencia junto con los
+    que el índice local asocia al tema.
+    """
+    topic = slot['topic']
+    if slot['platform'] == 'instagram':
+        if 'marketing' in topic.lower():
+            title = f"💡 {topic}: Tips para PyMEs"
+            content = f"🚀 ¿Sabías que el {topic.lower()} puede transformar tu negocio?\n\n✅ Estrategias probadas para empresas como la tuya\n✅ Resultados medibles en 30 días\n✅ Sin complicaciones técnicas\n\n¿Cuál es tu mayor desafío en marketing digital? 👇"
+            seed = '#pymes #marketing #emprendimiento'
+        else:
+            title = f"🎯 {topic} para tu empresa"
+            content = f"📈 {topic} es clave para el crecimiento de tu PyME\n\n💪 Implementa estos cambios HOY:\n• Automatiza procesos repetitivos\n• Analiza tus métricas\n• Optimiza tu tiempo\n\n¿Qué herramienta usas para ser más productivo? 🤔"
+            seed = '#productividad #negocios #pymes'
+    else:  # LinkedIn
+        title = f"{topic}: Estrategias para el crecimiento empresarial"
+        content = f"En el panorama empresarial actual, {topic.lower()} se ha convertido en un factor diferenciador para las PyMEs que buscan escalar.\n\nBasado en nuestra experiencia:\n\n🔹 Las empresas que implementan estas estrategias ven un crecimiento promedio del 40%\n🔹 El ROI se evidencia en los primeros 3 meses\n🔹 La implementación no requiere grandes inversiones\n\n¿Qué estrategias está implementando tu empresa?\n\n#Emprendimiento #Marketing #PyMEs"
+        seed = '#emprendimiento #marketing #pymes'
+
+    hashtags = suggested_hashtags(slot, title, content, user_id, seed=seed)
+    return {'title': title, 'content': content, 'hashtags': hashtags}
+
+
+def build_batch_prompt(slots, client_profile):
+    """Prompt para generar varios posts en una sola llamada con salida JSON"""
+    slot_lines = '\n'.join(
+        f"{index}. {slot['scheduled_date']} {slot['scheduled_time']} | {slot['platform']} | "
+        f"{slot['content_type']} | Tema: {slot['topic']}"
+        for index, slot in enumerate(slots)
+    )
+    return f"""
+    Genera {len(slots)} posts para redes sociales de esta marca.
+
+    PERFIL DE MARCA:
+    - Negocio: {client_profile['business_type']}
+    - Industria: {client_profile['industry']}
+    - Audiencia: {client_profile['target_audience']}
+    - Tono: {client_profile['tone']}
+    - Valores: {client_profile['brand_values']}
+    - Estilo visual: {client_profile['visual_style']}
+
+    POSTS (índice. fecha hora | plataforma | tipo | tema):
+    {slot_lines}
+
+    INSTRUCCIONES:
+    - Instagram: máximo 120 palabras, emojis estratégicos, una pregunta final, 6-8 hashtags
+    - LinkedIn: máximo 150 palabras, tono profesional, pocos emojis, 3-5 hashtags
+    - Cada post debe ser distinto; no repitas aperturas ni estructuras
+
+    Responde SOLO con JSON con esta forma:
+    {{"posts": [{{"index": 0, "title": "...", "content": "...", "hashtags": "#uno #dos"}}]}}
+    """
+
+
+def ai_posts(slots, client_profile, user_id=None):
+    """Generar el contenido de un lote de huecos con una sola llamada al modelo
+
+    Los posts que el modelo no devuelva (o todo el lote si la llamada falla)
+    se completan con plantillas, y los que vengan sin hashtags con los del
+    índice local.
+    """
+    posts = [None] * len(slots)
+    try:
+        response = complete(
+            messages=[
+                {"role": "system", "content": "Eres un experto en marketing digital especializado en crear contenido para PyMEs."},
+                {"role": "user", "content": build_batch_prompt(slots, client_profile)}
+            ],
+            max_tokens=350 * len(slots),
+            temperature=0.8,
+            response_format={"type": "json_object"}
+        )
+        for item in json.loads(response).get('posts', []):
+            index = item.get('index')
+            if isinstance(index, int) and 0 <= index < len(slots) and item.get('content'):
+                title = item.get('title') or slots[index]['topic']
+                posts[index] = {
+                    'title': title,
+                    'content': item['content'],
+                    'hashtags': item.get('hashtags') or suggested_hashtags(slots[index], title, item['content'], user_id)
+                }
+    except Exception as e:
+        print(f"Error generando lote de calendario con IA: {str(e)}")
+
+    return [post or template_post(slot, user_id) for slot, post in zip(slots, posts)]
+
+
+def generate_calendar_posts(user_id, start_date, days, posts_per_day, client_profile, topics,
+                            use_ai=True, progress=None, incremental=False):
+    """Generar e insertar el calendario del usuario por lotes
+
+    Cada lote se genera con una llamada al modelo. En modo incremental no se
+    borra nada: cada lote se inserta en su propia transacción llenando solo
+    los huecos que sigan libres en ese momento, y se devuelven las filas creadas.
+
+    En modo completo las filas generadas se juntan y el calendario anterior
+    se reemplaza al final en una sola transacción: si el trabajo falla o se
+    interrumpe, el usuario conserva sus posts.
+
+    Devuelve (cantidad creada, filas creadas o None en modo completo).
+    """
+    if incremental:
+        with connection() as conn:
+            occupied = occupied_slots(conn, user_id, start_date, days)
+    else:
+        occupied = frozenset()
+        replacement = []
+
+    total = sum(1 for _ in plan_slots(start_date, days, posts_per_day, client_profile, topics, occupied))
+    created = processed = 0
+    created_rows = [] if incremental else None
+
+    slots_iter = plan_slots(start_date, days, posts_per_day, client_profile, topics, occupied)
+    for slots in batched(slots_iter, CALENDAR_BATCH_SIZE):
+        if use_ai:
+            posts = ai_posts(slots, client_profile, user_id)
+        else:
+            posts = [template_post(slot, user_id) for slot in slots]
+
+        rows = [
+            (user_id, post['title'], post['content'], slot['platform'], slot['content_type'],
+             slot['scheduled_date'], slot['scheduled_time'], post['hashtags'], slot['platform'], 'draft')
+            for slot, post in zip(slots, posts)
+        ]
+        if incremental:
+            with connection() as conn:
+                # Tomar el lock de escritura antes de leer el último id para
+                # identificar exactamente las filas que inserta este lote
+                conn.execute('BEGIN IMMEDIATE')
+                last_id = conn.execute('SELECT COALESCE(MAX(id), 0) FROM posts').fetchone()[0]
+                conn.executemany(INSERT_FREE_SLOT_SQL, [row + (row[0], row[5], row[6], row[3]) for row in rows])
+                batch_rows = [dict(row) for row in conn.execute(
+                    'SELECT * FROM posts WHERE user_id = ? AND id > ? ORDER BY id', (user_id, last_id)
+                )]
+                conn.commit()
+            created_rows.extend(batch_rows)
+            created += len(batch_rows)
+        else:
+            replacement.extend(rows)
+            created += len(rows)
+
+        # El avance cuenta huecos procesados: en incremental algunos pueden haberse ocupado
+        processed += len(slots)
+        if progress:
+            progress(processed, total)
+
+    if not incremental:
+        # Borrar el calendario anterior e insertar el nuevo en la misma transacción
+        with connection() as conn:
+            conn.execute('BEGIN IMMEDIATE')
+            conn.execute('DELETE FROM posts WHERE user_id = ?', (user_id,))
+            conn.executemany(INSERT_POST_SQL, replacement)
+            conn.commit()
+
+    return created, created_rows
@@ -0,0 +1,110 @@
+"""
+Caché persistente de respuestas de OpenAI direccionada por contenido
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+
+from db import connection
+
+COMPLETION_CACHE_TTL = int(os.getenv('POSTIA_COMPLETION_CACHE_TTL', str(24 * 60 * 60)))
+COMPLETION_CACHE_MAX_ENTRIES = int(os.getenv('POSTIA_COMPLETION_CACHE_MAX_ENTRIES', '5000'))
+
+
+def init_completion_cache_table(conn):
+    """Crear tabla de respuestas cacheadas"""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS completion_cache (
+            key TEXT PRIMARY KEY,
+            model TEXT,
+            response TEXT,
+            created_at REAL,
+            last_used_at REAL,
+            hits INTEGER DEFAULT 0
+        )
+    ''')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_completion_cache_last_used ON completion_cache (last_used_at)')
+
+
+def cache_key(model, messages, **params):
+    """Hash estable del modelo, los mensajes y los parámetros de muestreo"""
+    payload = json.dumps(
+        {"model": model, "messages": messages, "params": params},
+        sort_keys=True, ensure_ascii=False
+    )
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class CompletionCache:
+    """Respuestas guardadas en SQLite con vencimiento por TTL y tope de entradas"""
+
+    def __init__(self, ttl=COMPLETION_CACHE_TTL, max_entries=COMPLETION_CACHE_MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def _count(self, hit):
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def get(self, key):
+        now = time.time()
+        with connection() as conn:
+            row = conn.execute(
+                'SELECT response, created_at FROM completion_cache WHERE key = ?', (key,)
+            ).fetchone()
+
+            if row and row['created_at'] + self.ttl > now:
+                conn.execute(
+                    'UPDATE completion_cache SET last_used_at = ?, hits = hits + 1 WHERE key = ?',
+                    (now, key)
+                )
+                conn.commit()
+                self._count(True)
+                return row['response']
+
+            if row:
+                conn.execute('DELETE FROM completion_cache WHERE key = ?', (key,))
+                conn.commit()
+
+        self._count(False)
+        return None
+
+    def set(self, key, model, response):
+        now = time.time()
+        with connection() as conn:
+            conn.execute('''
+                INSERT OR REPLACE INTO completion_cache (key, model, response, created_at, last_used_at, hits)
+                VALUES (?, ?, ?, ?, ?, 0)
+            ''', (key, model, response, now, now))
+
+            # Desalojar las entradas menos usadas por encima del tope
+            conn.execute('''
+                DELETE FROM completion_cache WHERE key IN (
+                    SELECT key FROM completion_cache ORDER BY last_used_at DESC LIMIT -1 OFFSET ?
+                )
+            ''', (self.max_entries,))
+            conn.commit()
+
+    def stats(self):
+        with connection() as conn:
+            size = conn.execute('SELECT COUNT(*) FROM completion_cache').fetchone()[0]
+
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": size,
+                "max_entries": self.max_entries,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0
+            }
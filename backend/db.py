@@ -0,0 +1,134 @@
+"""
+Capa de conexiones SQLite compartida por todas las rutas
+"""
+
+import os
+import queue
+import sqlite3
+import time
+from contextlib import contextmanager
+
+from flask import g
+
+from metrics import observe_query
+
+DATABASE_PATH = os.getenv('POSTIA_DATABASE_PATH', 'postia_simple.db')
+
+# Conexiones ociosas que se conservan abiertas (0 = conexión nueva por request)
+POOL_SIZE = int(os.getenv('POSTIA_DB_POOL_SIZE', '8'))
+
+# Sentencias preparadas que sqlite3 reutiliza por conexión
+STATEMENT_CACHE_SIZE = int(os.getenv('POSTIA_DB_STATEMENT_CACHE', '256'))
+
+BUSY_TIMEOUT_MS = int(os.getenv('POSTIA_DB_BUSY_TIMEOUT_MS', '5000'))
+
+PRAGMAS = (
+    ('journal_mode', 'WAL'),
+    ('synchronous', 'NORMAL'),
+    ('cache_size', '-16000'),      # ~16 MB de page cache
+    ('mmap_size', '134217728'),    # 128 MB mapeados en memoria
+    ('busy_timeout', str(BUSY_TIMEOUT_MS)),
+    ('temp_store', 'MEMORY'),
+)
+
+
+class TimedConnection(sqlite3.Connection):
+    """Conexión que registra la duración de cada sentencia en /metrics"""
+
+    def execute(self, sql, *args):
+        started = time.perf_counter()
+        try:
+            return super().execute(sql, *args)
+        finally:
+            observe_query(sql, time.perf_counter() - started)
+
+    def executemany(self, sql, *args):
+        started = time.perf_counter()
+        try:
+            return super().executemany(sql, *args)
+        finally:
+            observe_query(sql, time.perf_counter() - started)
+
+
+def connect(path=None):
+    """Abrir una conexión configurada con WAL y pragmas de rendimiento"""
+    conn = sqlite3.connect(
+        path or DATABASE_PATH,
+        timeout=BUSY_TIMEOUT_MS / 1000,
+        check_same_thread=False,
+        cached_statements=STATEMENT_CACHE_SIZE,
+        factory=TimedConnection
+    )
+    conn.row_factory = sqlite3.Row
+    for name, value in PRAGMAS:
+        conn.execute(f'PRAGMA {name} = {value}')
+    return conn
+
+
+class ConnectionPool:
+    """Pool de conexiones reutilizables entre requests y threads"""
+
+    def __init__(self, path, size):
+        self.path = path
+        self.size = size
+        self._idle = queue.LifoQueue(maxsize=max(size, 1))
+
+    def acquire(self):
+        if self.size > 0:
+            try:
+                return self._idle.get_nowait()
+            except queue.Empty:
+                pass
+        return connect(self.path)
+
+    def release(self, conn):
+        # Nunca devolver al pool una conexión con una transacción abierta
+        if conn.in_transaction:
+            conn.rollback()
+
+        if self.size <= 0:
+            conn.close()
+            return
+
+        try:
+            self._idle.put_nowait(conn)
+        except queue.Full:
+            conn.close()
+
+    def close_all(self):
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                return
+
+
+pool = ConnectionPool(DATABASE_PATH, POOL_SIZE)
+
+
+def get_db():
+    """Conexión del request actual, tomada del pool una sola vez por request"""
+    if 'db' not in g:
+        g.db = pool.acquire()
+    return g.db
+
+
+def close_db(exception=None):
+    """Devolver la conexión del request al pool"""
+    conn = g.pop('db', None)
+    if conn is not None:
+        pool.release(conn)
+
+
+@contextmanager
+def connection():
+    """Conexión del pool para código fuera de un request (threads, scripts)"""
+    conn = pool.acquire()
+    try:
+        yield conn
+    finally:
+        pool.release(conn)
+
+
+def init_app(app):
+    app.teardown_appcontext(close_db)
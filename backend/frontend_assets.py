@@ -0,0 +1,150 @@
+"""
+Páginas del frontend precargadas y precomprimidas en memoria
+
+Cada HTML se lee una vez al arrancar, se comprime con gzip (y brotli si el
+paquete está instalado) y se sirve desde memoria según Accept-Encoding, con
+ETag por variante y 304 condicional.
+
+Si existe el build (frontend/dist, ver frontend/build.py) y no es más viejo
+que el HTML fuente, se sirven sus páginas y sus assets con hash de contenido,
+usando las variantes .gz/.br ya generadas; los assets se cachean como
+inmutables.
+"""
+
+import gzip
+import hashlib
+import os
+import threading
+
+from flask import Response, request
+
+try:
+    import brotli
+except ImportError:  # brotli es opcional: sin él solo se sirve gzip
+    brotli = None
+
+SOURCE_DIR = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'frontend'))
+BUILD_DIR = os.path.join(SOURCE_DIR, 'dist')
+
+# Páginas que genera frontend/build.py
+PAGES = ('dashboard.html', 'login.html')
+
+# Releer los archivos si cambian en disco (para desarrollo)
+FRONTEND_RELOAD = os.getenv('POSTIA_FRONTEND_RELOAD', '0') == '1'
+
+
+def build_is_current():
+    """Si el build tiene todas las páginas y ninguna es más vieja que su fuente"""
+    for page in PAGES:
+        built, source = os.path.join(BUILD_DIR, page), os.path.join(SOURCE_DIR, page)
+        if not os.path.isfile(built):
+            return False
+        if os.path.isfile(source) and os.path.getmtime(source) > os.path.getmtime(built):
+            return False
+    return True
+
+
+def default_frontend_dir():
+    """El build si está al día; si no (o al desarrollar con recarga), el HTML fuente"""
+    if FRONTEND_RELOAD or not os.path.isdir(BUILD_DIR):
+        return SOURCE_DIR
+    if not build_is_current():
+        print("⚠️ frontend/dist es más viejo que el HTML fuente: se sirve frontend/ (correr frontend/build.py)")
+        return SOURCE_DIR
+    return BUILD_DIR
+
+
+FRONTEND_DIR = os.path.abspath(os.getenv('POSTIA_FRONTEND_DIR') or default_frontend_dir())
+ASSETS_DIR = os.path.join(FRONTEND_DIR, 'assets')
+
+# Los assets llevan el hash en el nombre: un cambio siempre es una URL nueva
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+
+ASSET_MIMETYPES = {'.css': 'text/css', '.js': 'text/javascript'}
+
+# Preferencia del servidor ante calidades iguales en Accept-Encoding
+ENCODINGS = ('br', 'gzip', 'identity')
+
+
+def compress_variants(body):
+    """Cuerpo en cada codificación disponible"""
+    variants = {'identity': body, 'gzip': gzip.compress(body, compresslevel=9, mtime=0)}
+    if brotli is not None:
+        variants['br'] = brotli.compress(body, quality=11)
+    return variants
+
+
+def _read_precompressed(path, mtime):
+    """Variantes .gz/.br generadas por el build, si no son más viejas que el archivo"""
+    variants = {}
+    for encoding, extension in (('gzip', '.gz'), ('br', '.br')):
+        variant_path = path + extension
+        if os.path.isfile(variant_path) and os.path.getmtime(variant_path) >= mtime:
+            with open(variant_path, 'rb') as f:
+                variants[encoding] = f.read()
+    return variants
+
+
+class StaticPage:
+    """Un archivo del frontend en memoria con sus variantes comprimidas"""
+
+    def __init__(self, path, mimetype='text/html'):
+        self.path = path
+        self.mimetype = mimetype
+        self._lock = threading.Lock()
+        self._load()
+
+    def _load(self):
+        with open(self.path, 'rb') as f:
+            body = f.read()
+        self.mtime = os.path.getmtime(self.path)
+        self.digest = hashlib.sha256(body).hexdigest()[:32]
+        precompressed = _read_precompressed(self.path, self.mtime)
+        if 'gzip' in precompressed:
+            self.variants = {'identity': body, **precompressed}
+        else:
+            self.variants = compress_variants(body)
+
+    def _reload_if_changed(self):
+        if os.path.getmtime(self.path) != self.mtime:
+            with self._lock:
+                if os.path.getmtime(self.path) != self.mtime:
+                    self._load()
+
+    def response(self, cache_control='no-cache'):
+        """Respuesta para el request actual: codificación negociada, ETag y 304"""
+        if FRONTEND_RELOAD:
+            self._reload_if_changed()
+
+        encoding = request.accept_encodings.best_match(
+            [encoding for encoding in ENCODINGS if encoding in self.variants], default='identity'
+        )
+        etag = f"{self.digest}-{encoding}"
+
+        if request.if_none_match.contains(etag):
+            response = Response(status=304)
+        else:
+            response = Response(self.variants[encoding], mimetype=self.mimetype)
+            if encoding != 'identity':
+                response.headers['Content-Encoding'] = encoding
+
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = cache_control
+        response.vary.add('Accept-Encoding')
+        return response
+
+
+def load_page(filename, mimetype='text/html'):
+    return StaticPage(os.path.join(FRONTEND_DIR, filename), mimetype)
+
+
+def load_assets():
+    """Assets del build por nombre de archivo (vacío si se sirve el HTML fuente)"""
+    if not os.path.isdir(ASSETS_DIR):
+        return {}
+    assets = {}
+    for filename in os.listdir(ASSETS_DIR):
+        mimetype = ASSET_MIMETYPES.get(os.path.splitext(filename)[1])
+        if mimetype:
+            assets[filename] = StaticPage(os.path.join(ASSETS_DIR, filename), mimetype)
+    return assets
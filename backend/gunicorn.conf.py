@@ -0,0 +1,89 @@
+"""
+Configuración de producción de gunicorn
+
+Uso (desde backend/):
+    gunicorn -c gunicorn.conf.py app:app
+
+Workers gthread: cada request largo (OpenAI, streaming SSE) ocupa un thread
+esperando la red, no un proceso entero. La app se precarga en el master para
+migrar la base una sola vez; los threads de fondo (cola de trabajos, pools de
+OpenAI e imágenes) se crean recién en cada worker.
+"""
+
+import multiprocessing
+import os
+import tempfile
+
+# La app no recupera trabajos al importarse: lo hacen los hooks de abajo
+os.environ['POSTIA_GUNICORN'] = '1'
+
+bind = os.getenv('POSTIA_BIND', f"0.0.0.0:{os.getenv('PORT', '5001')}")
+
+worker_class = 'gthread'
+workers = int(os.getenv('POSTIA_WEB_WORKERS', str(min(multiprocessing.cpu_count(), 4))))
+threads = int(os.getenv('POSTIA_WEB_THREADS', '16'))
+
+# Con varios workers (se fija antes de que se importe la app):
+# - las métricas se suman entre procesos a través de archivos (ver metrics.py)
+# - una sesión cerrada en un worker deja de valer en los demás en segundos
+if workers > 1:
+    os.environ.setdefault(
+        'POSTIA_METRICS_DIR', os.path.join(tempfile.gettempdir(), f"postia-metrics-{bind.rsplit(':', 1)[-1]}")
+    )
+    os.environ.setdefault('POSTIA_SESSION_CACHE_TTL', '5')
+
+preload_app = True
+
+# Las generaciones con OpenAI pueden tardar; los streams SSE mantienen la conexión abierta
+timeout = int(os.getenv('POSTIA_WEB_TIMEOUT', '180'))
+graceful_timeout = 60
+keepalive = 5
+
+# Sin max_requests: reciclar un worker cortaría los trabajos en segundo plano que está ejecutando
+max_requests = 0
+
+accesslog = os.getenv('POSTIA_ACCESS_LOG', '-')
+errorlog = '-'
+
+
+def on_starting(server):
+    """Una vez por arranque, en el master: lo que corría antes quedó interrumpido"""
+    from db import connect
+    from jobs import fail_interrupted_jobs
+    from metrics import clear_metrics_dir
+    from publishing import fail_interrupted_publications
+
+    clear_metrics_dir()
+
+    conn = connect()
+    try:
+        fail_interrupted_jobs(conn)
+        fail_interrupted_publications(conn)
+    finally:
+        conn.close()
+
+
+def post_worker_init(worker):
+    """En cada worker: reencolar los trabajos pendientes, arrancar el dispatcher, armar el
+    índice de hashtags y volcar las métricas
+
+    Trabajos y posts se reclaman de forma atómica, así que varios workers no
+    ejecutan ni publican dos veces lo mismo. El dispatcher además falla los
+    posts que un worker muerto dejó en publishing (ver publishing.py).
+    """
+    from app import hashtag_engine, job_queue, publish_dispatcher
+    from metrics import reset_metrics, start_metrics_sync
+
+    # Lo medido en el master antes del fork no es de este worker
+    reset_metrics()
+    job_queue.recover(fail_running=False)
+    publish_dispatcher.start()
+    hashtag_engine.warm()
+    start_metrics_sync()
+
+
+def worker_exit(server, worker):
+    """Último volcado de métricas del worker, para no perder lo contado desde el anterior"""
+    from metrics import write_snapshot
+
+    write_snapshot()
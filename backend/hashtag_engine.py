@@ -0,0 +1,388 @@
+"""
+Sugerencia local de hashtags a partir de los posts existentes
+
+Un índice invertido en memoria, armado con el texto y los hashtags de los
+posts, asocia cada palabra con los hashtags que aparecen junto a ella. Para
+un post nuevo se puntúa cada hashtag candidato sumando el TF-IDF de las
+palabras del texto por su co-ocurrencia con el hashtag, más un extra si el
+hashtag es una palabra (o dos juntas) del texto, y se responde en
+milisegundos sin llamar al modelo.
+
+Los posts de un cliente no se muestran a otro: cada usuario tiene su propio
+índice, armado solo con sus posts. Se le suma un índice compartido que solo
+usa posts ya publicados (públicos) y solo conserva los hashtags que usan al
+menos POSTIA_HASHTAG_SHARED_MIN_USERS clientes distintos, y DEFAULT_HASHTAGS
+cuando no alcanza.
+
+Los índices se reconstruyen en segundo plano cuando cambian los posts (según
+post_versions para cada usuario, según los publicados para el compartido) y
+pasó el intervalo mínimo; mientras tanto se sigue usando el anterior.
+"""
+
+import math
+import os
+import re
+import threading
+import time
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+from cache import TTLCache
+from db import connection
+from text_utils import normalize_text
+
+# Segundos mínimos entre reconstrucciones de cada índice
+HASHTAG_INDEX_TTL = int(os.getenv('POSTIA_HASHTAG_INDEX_TTL', '300'))
+
+# Índices de usuario en memoria (se desalojan los menos usados)
+HASHTAG_INDEX_USERS = int(os.getenv('POSTIA_HASHTAG_INDEX_USERS', '256'))
+
+# Clientes distintos que tienen que haber publicado un hashtag para sugerirlo a otros
+SHARED_MIN_USERS = int(os.getenv('POSTIA_HASHTAG_SHARED_MIN_USERS', '3'))
+
+# Si /api/generate-hashtags además pide hashtags y análisis al modelo cuando el request no lo indica
+HASHTAG_ENRICH = os.getenv('POSTIA_HASHTAG_ENRICH', '0') == '1'
+
+# Hashtags sugeridos por plataforma
+HASHTAG_LIMITS = {'instagram': 10, 'linkedin': 5}
+DEFAULT_HASHTAG_LIMIT = 8
+
+# Hashtags genéricos para completar cuando los índices no alcanzan
+DEFAULT_HASHTAGS = {
+    'instagram': '#pymes #emprendimiento #marketingdigital #emprendedores #negocios',
+    'linkedin': '#pymes #negocios #transformaciondigital #liderazgo',
+}
+
+# Pesos del puntaje además de la co-ocurrencia: índice compartido frente al propio,
+# hashtag presente en el texto, sugerido por quien llama, palabra del texto que
+# nadie usó como hashtag y genérico
+SHARED_WEIGHT = 0.5
+DIRECT_MATCH_WEIGHT = 2.0
+SEED_WEIGHT = 0.5
+KEYWORD_WEIGHT = 0.3
+DEFAULT_WEIGHT = 0.15
+
+# Palabras del texto que se proponen como hashtags nuevos, y puntaje mínimo relativo al mejor
+MAX_KEYWORD_TAGS = 3
+MIN_RELATIVE_SCORE = 0.1
+
+# Pares palabra-hashtag vistos menos veces que esto no cuentan (evita que un hashtag raro domine)
+MIN_COOCCURRENCE = 2
+
+MIN_WORD_LENGTH = 3
+MAX_TAG_LENGTH = 40
+
+HASHTAG_PATTERN = re.compile(r'#(\w+)')
+
+STOPWORDS = frozenset('''
+    a al algo ante antes aqui asi aun cada como con contra cual cuales cuando de del desde donde
+    durante e el ella ellas ellos en entre era es esa esas ese eso esos esta estas este esto estos
+    fue ha hace hacer han hasta hay la las le les lo los mas me mi mis mucho muy nada ni no nos
+    nuestra nuestro nuestros o otra otro para pero poco por porque puede que quien se sea segun ser
+    si sin sobre son su sus tambien tan te tiene tienen todo todos tu tus un una uno unos vez y ya yo
+    and are but for from have how not that the this what when with you your
+'''.split())
+
+POSTS_QUERY = 'SELECT user_id, platform, title, content, hashtags FROM posts'
+
+
+def hashtag_key(tag):
+    """Forma canónica de un hashtag: minúsculas y sin acentos ni '#'"""
+    return normalize_text(tag).replace(' ', '').lstrip('#')
+
+
+def extract_hashtags(text):
+    return [key for key in (hashtag_key(tag) for tag in HASHTAG_PATTERN.findall(text or '')) if key]
+
+
+def text_words(text):
+    """Palabras significativas del texto, sin hashtags ni stopwords"""
+    return [
+        word for word in normalize_text(HASHTAG_PATTERN.sub(' ', text or '')).split()
+        if len(word) >= MIN_WORD_LENGTH and word not in STOPWORDS and not word.isdigit()
+    ]
+
+
+class HashtagIndex:
+    """Índice invertido palabra → hashtags y estadísticas por hashtag"""
+
+    def __init__(self):
+        self.documents = 0
+        self.word_docs = Counter()
+        self.word_tags = defaultdict(Counter)
+        self.tag_posts = Counter()
+        self.tag_users = defaultdict(set)
+        self.tag_platforms = defaultdict(Counter)
+
+    def add(self, user_id, platform, text, hashtags):
+        tags = set(extract_hashtags(hashtags)) | set(extract_hashtags(text))
+        words = set(text_words(text))
+        if not words and not tags:
+            return
+
+        self.documents += 1
+        self.word_docs.update(words)
+        for tag in tags:
+            self.tag_posts[tag] += 1
+            self.tag_users[tag].add(user_id)
+            self.tag_platforms[tag][platform] += 1
+        for word in words:
+            self.word_tags[word].update(tags)
+
+    def idf(self, word):
+        return math.log((self.documents + 1) / (self.word_docs.get(word, 0) + 1)) + 1
+
+    def prune(self, min_users):
+        """Quitar los hashtags que usan menos de `min_users` usuarios distintos"""
+        rare = {tag for tag, users in self.tag_users.items() if len(users) < min_users}
+        for tag in rare:
+            del self.tag_posts[tag], self.tag_users[tag], self.tag_platforms[tag]
+        for tags in self.word_tags.values():
+            for tag in rare & tags.keys():
+                del tags[tag]
+        return self
+
+    def score(self, words, term_counts):
+        """Puntaje de cada hashtag del índice para las palabras de un texto"""
+        scores = Counter()
+        for word, count in term_counts.items():
+            weight = (1 + math.log(count)) * self.idf(word)
+            tags = self.word_tags.get(word)
+            if tags:
+                # P(hashtag | palabra) por cuánto supera a P(hashtag): las palabras que
+                # aparecen con cualquier hashtag no suman
+                docs = self.word_docs[word]
+                for tag, together in tags.items():
+                    if together < MIN_COOCCURRENCE:
+                        continue
+                    share = together / docs
+                    lift = share * self.documents / self.tag_posts[tag]
+                    if lift > 1:
+                        scores[tag] += weight * share * math.log(lift)
+            # El hashtag es la palabra misma (pesa más cuanto más se usa)
+            if self.tag_posts.get(word):
+                scores[word] += DIRECT_MATCH_WEIGHT * (1 + math.log(count)) * math.log1p(self.tag_posts[word])
+
+        # ... o dos palabras seguidas (#marketingdigital)
+        for first, second in zip(words, words[1:]):
+            joined = first + second
+            if self.tag_posts.get(joined):
+                scores[joined] += DIRECT_MATCH_WEIGHT * math.log1p(self.tag_posts[joined])
+        return scores
+
+    @classmethod
+    def build(cls, rows):
+        index = cls()
+        for row in rows:
+            index.add(row['user_id'], row['platform'], f"{row['title'] or ''}\n{row['content'] or ''}", row['hashtags'])
+        return index
+
+
+class _IndexEntry:
+    """Un índice con la firma de los posts con que se armó"""
+
+    def __init__(self, index, signature):
+        self.index = index
+        self.signature = signature
+        self.checked_at = time.monotonic()
+
+
+class HashtagEngine:
+    """Sugerencias y análisis de hashtags sobre los índices vigentes"""
+
+    def __init__(self, ttl=HASHTAG_INDEX_TTL, max_users=HASHTAG_INDEX_USERS, shared_min_users=SHARED_MIN_USERS):
+        self.ttl = ttl
+        self.shared_min_users = shared_min_users
+        self._users = TTLCache(maxsize=max_users, ttl=24 * 60 * 60)
+        self._shared = None
+        self._build_ms = {}
+        self._lock = threading.Lock()
+        self._first_build = threading.Lock()
+        self._rebuilding = set()
+        self._rebuilder = ThreadPoolExecutor(max_workers=1, thread_name_prefix='postia-hashtag-index')
+
+    # Índice de un usuario: solo sus posts, versionado por post_versions (post_changes.py)
+
+    @staticmethod
+    def _user_signature(conn, user_id):
+        row = conn.execute('SELECT version FROM post_versions WHERE user_id = ?', (user_id,)).fetchone()
+        return row['version'] if row else 0
+
+    @staticmethod
+    def _build_user(conn, user_id):
+        return HashtagIndex.build(conn.execute(f'{POSTS_QUERY} WHERE user_id = ?', (user_id,)))
+
+    # Índice compartido: solo posts publicados y hashtags de varios clientes
+
+    @staticmethod
+    def _shared_signature(conn):
+        row = conn.execute("SELECT COUNT(*), MAX(published_at) FROM posts WHERE status = 'published'").fetchone()
+        return tuple(row)
+
+    def _build_shared(self, conn):
+        rows = conn.execute(f"{POSTS_QUERY} WHERE status = 'published'")
+        return HashtagIndex.build(rows).prune(self.shared_min_users)
+
+    def _load(self, key):
+        """Armar el índice de `key` ('shared' o un user_id) con su firma"""
+        started = time.perf_counter()
+        with connection() as conn:
+            if key == 'shared':
+                signature = self._shared_signature(conn)
+                index = self._build_shared(conn)
+            else:
+                signature = self._user_signature(conn, key)
+                index = self._build_user(conn, key)
+        self._build_ms[key if key == 'shared' else 'user'] = round((time.perf_counter() - started) * 1000, 1)
+        return _IndexEntry(index, signature)
+
+    def _store(self, key, entry):
+        if key == 'shared':
+            self._shared = entry
+        else:
+            self._users.set(key, entry)
+
+    def _cached(self, key):
+        return self._shared if key == 'shared' else self._users.get(key)
+
+    def _rebuild(self, key):
+        try:
+            self._store(key, self._load(key))
+        except Exception as e:
+            print(f"Error reconstruyendo el índice de hashtags {key}: {str(e)}")
+        finally:
+            with self._lock:
+                self._rebuilding.discard(key)
+
+    def _index(self, key):
+        """Índice vigente; la primera vez se arma en el momento, después en segundo plano"""
+        entry = self._cached(key)
+        if entry is None:
+            with self._first_build:
+                entry = self._cached(key)
+                if entry is None:
+                    entry = self._load(key)
+                    self._store(key, entry)
+            return entry.index
+
+        if time.monotonic() - entry.checked_at >= self.ttl:
+            with connection() as conn:
+                if key == 'shared':
+                    changed = self._shared_signature(conn) != entry.signature
+                else:
+                    changed = self._user_signature(conn, key) != entry.signature
+            with self._lock:
+                if not changed:
+                    entry.checked_at = time.monotonic()
+                elif key not in self._rebuilding:
+                    self._rebuilding.add(key)
+                    self._rebuilder.submit(self._rebuild, key)
+        return entry.index
+
+    def warm(self):
+        """Armar el índice compartido en segundo plano (al arrancar cada proceso)"""
+        threading.Thread(target=self._index, args=('shared',), name='postia-hashtag-index', daemon=True).start()
+
+    def suggest(self, text, platform=None, user_id=None, limit=None, seed=''):
+        """Hashtags para el texto, del más al menos relevante
+
+        Devuelve dicts con `tag`, `score` (0 a 1, relativo al mejor) y `posts`
+        (posts propios más publicados que lo usan). Los hashtags del texto
+        `seed` entran como candidatos aunque los índices no los conozcan.
+        """
+        own = self._index(user_id) if user_id is not None else HashtagIndex()
+        shared = self._index('shared')
+        limit = limit or HASHTAG_LIMITS.get(platform, DEFAULT_HASHTAG_LIMIT)
+
+        words = text_words(text)
+        term_counts = Counter(words)
+        scores = own.score(words, term_counts)
+        for tag, score in shared.score(words, term_counts).items():
+            scores[tag] += SHARED_WEIGHT * score
+
+        if platform:
+            for tag in list(scores):
+                platforms = own.tag_platforms.get(tag) or shared.tag_platforms.get(tag)
+                if platforms:
+                    scores[tag] *= 0.5 + platforms[platform] / sum(platforms.values())
+
+        # Sugeridos, genéricos y palabras clave puntúan relativo al mejor candidato de los índices
+        reference = max(scores.values(), default=1)
+        for tag in extract_hashtags(seed):
+            scores[tag] += SEED_WEIGHT * reference
+
+        # Si faltan candidatos: palabras del propio texto y, al final, los genéricos de la plataforma
+        keywords = Counter({
+            word: (1 + math.log(count)) * own.idf(word) for word, count in term_counts.items()
+            if len(word) > MIN_WORD_LENGTH and word not in scores
+        })
+        top_keyword = max(keywords.values(), default=1)
+        for word, weight in keywords.most_common(min(MAX_KEYWORD_TAGS, max(0, limit - len(scores)))):
+            scores[word] += KEYWORD_WEIGHT * reference * weight / top_keyword
+
+        defaults = [tag for tag in extract_hashtags(DEFAULT_HASHTAGS.get(platform, '')) if tag not in scores]
+        for tag in defaults[:max(0, limit - len(scores))]:
+            scores[tag] += DEFAULT_WEIGHT * reference
+
+        best = max(scores.values(), default=0)
+        ranked = [
+            (tag, score) for tag, score in scores.most_common()
+            if len(tag) <= MAX_TAG_LENGTH and score >= best * MIN_RELATIVE_SCORE
+        ][:limit]
+        return [
+            {"tag": f"#{tag}", "score": round(score / best, 3), "posts": own.tag_posts.get(tag, 0) + shared.tag_posts.get(tag, 0)}
+            for tag, score in ranked
+        ]
+
+    def analyze(self, suggestions):
+        """Alcance, competencia y relevancia estimados con los datos de los índices
+
+        Mismo formato que el análisis que antes se pedía al modelo. El alcance
+        sale de los posts que usan cada hashtag y la competencia de cuántos
+        clientes lo publicaron (solo el índice compartido, sin datos de otros).
+        """
+        shared = self._shared.index if self._shared else None
+        if not suggestions or shared is None or not shared.tag_posts:
+            return {
+                "reach_potential": "Medio",
+                "competition_level": "Medio",
+                "relevance": "Alta",
+                "recommendation": "Hashtags optimizados para tu audiencia objetivo"
+            }
+
+        tags = [hashtag_key(item['tag']) for item in suggestions]
+        max_posts = max(max(shared.tag_posts.values()), max(item['posts'] for item in suggestions))
+        max_users = max(len(users) for users in shared.tag_users.values())
+        reach = sum(math.log1p(item['posts']) / math.log1p(max_posts) for item in suggestions) / len(suggestions)
+        competition = sum(len(shared.tag_users.get(tag, ())) / max_users for tag in tags) / len(tags)
+        relevance = sum(item['score'] for item in suggestions) / len(suggestions)
+
+        def level(value, high='Alto', medium='Medio', low='Bajo'):
+            return high if value >= 0.66 else medium if value >= 0.33 else low
+
+        if reach < 0.33:
+            recommendation = "Combiná estos hashtags de nicho con algunos más populares para ganar alcance"
+        elif competition >= 0.66:
+            recommendation = "Hashtags muy usados: sumá algunos específicos de tu marca para destacarte"
+        else:
+            recommendation = "Buena mezcla de alcance y especificidad para tu audiencia"
+
+        return {
+            "reach_potential": level(reach),
+            "competition_level": level(competition),
+            "relevance": level(relevance, 'Alta', 'Media', 'Baja'),
+            "recommendation": recommendation
+        }
+
+    def stats(self):
+        shared = self._shared.index if self._shared else None
+        return {
+            "shared_documents": shared.documents if shared else 0,
+            "shared_hashtags": len(shared.tag_posts) if shared else 0,
+            "user_indexes": self._users.stats()['size'],
+            "build_ms": dict(self._build_ms),
+            "rebuilding": len(self._rebuilding)
+        }
+
+
+hashtag_engine = HashtagEngine()
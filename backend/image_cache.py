@@ -0,0 +1,193 @@
+"""
+Caché de imágenes generadas por prompt normalizado y estilo de marca
+
+Además del acierto exacto, cada entrada guarda una firma MinHash de los
+shingles del texto del post para encontrar imágenes generadas para posts casi
+iguales y ofrecer reutilizarlas. Las entradas se desalojan por LRU cuando las
+imágenes cacheadas superan el presupuesto de disco; el archivo no se borra
+acá (pudo entregarse hace instantes sin estar aún en un post) sino que queda
+para el GC de media_store.py, con el margen contado desde su último uso.
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+
+from db import connection
+from text_utils import normalize_text
+
+# Espacio en disco que pueden ocupar las imágenes cacheadas
+IMAGE_CACHE_MAX_BYTES = int(os.getenv('POSTIA_IMAGE_CACHE_MAX_MB', '500')) * 1024 * 1024
+
+# Similitud (Jaccard estimada) a partir de la cual se ofrece reutilizar una imagen; 0 = solo exactas
+IMAGE_SIMILARITY_THRESHOLD = float(os.getenv('POSTIA_IMAGE_SIMILARITY', '0.75'))
+
+# Entradas más recientes del mismo usuario y estilo que se comparan por similitud
+SIMILARITY_CANDIDATES = 500
+
+SHINGLE_SIZE = 5
+MINHASH_PERMUTATIONS = 64
+_MERSENNE_PRIME = (1 << 61) - 1
+_PERMUTATIONS = [
+    (
+        int.from_bytes(hashlib.sha256(f"a{i}".encode()).digest()[:8], 'big') % _MERSENNE_PRIME | 1,
+        int.from_bytes(hashlib.sha256(f"b{i}".encode()).digest()[:8], 'big') % _MERSENNE_PRIME
+    )
+    for i in range(MINHASH_PERMUTATIONS)
+]
+
+
+def init_image_cache_table(conn):
+    """Crear tabla de imágenes cacheadas"""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS image_cache (
+            key TEXT PRIMARY KEY,
+            user_id INTEGER,
+            style TEXT,
+            signature TEXT,
+            filename TEXT,
+            size INTEGER,
+            created_at REAL,
+            last_used_at REAL,
+            hits INTEGER DEFAULT 0
+        )
+    ''')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_image_cache_user_style ON image_cache (user_id, style, last_used_at)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_image_cache_last_used ON image_cache (last_used_at)')
+
+
+def image_cache_key(user_id, style, prompt):
+    payload = json.dumps([user_id, normalize_text(style), normalize_text(prompt)], ensure_ascii=False)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def minhash_signature(text):
+    """Firma MinHash de los shingles de caracteres del texto normalizado"""
+    text = normalize_text(text)
+    shingles = {text[i:i + SHINGLE_SIZE] for i in range(max(len(text) - SHINGLE_SIZE + 1, 1))}
+    hashes = [int.from_bytes(hashlib.blake2b(s.encode('utf-8'), digest_size=8).digest(), 'big') for s in shingles]
+    return [min((a * h + b) % _MERSENNE_PRIME for h in hashes) for a, b in _PERMUTATIONS]
+
+
+def signature_similarity(first, second):
+    """Jaccard estimada: fracción de mínimos que coinciden"""
+    return sum(1 for x, y in zip(first, second) if x == y) / MINHASH_PERMUTATIONS
+
+
+class ImageCache:
+    """Imágenes generadas en uploads/images indexadas en SQLite"""
+
+    def __init__(self, upload_dir, max_bytes=IMAGE_CACHE_MAX_BYTES, threshold=IMAGE_SIMILARITY_THRESHOLD):
+        self.upload_dir = upload_dir
+        self.max_bytes = max_bytes
+        self.threshold = threshold
+        self.hits = 0
+        self.similar_hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def _count(self, kind):
+        with self._lock:
+            setattr(self, kind, getattr(self, kind) + 1)
+
+    def lookup(self, user_id, style, prompt, subject, similar=True):
+        """Imagen para el mismo prompt o, si no hay, para un post parecido
+
+        Devuelve {"filename", "similarity", "exact"} o None. `subject` es el
+        texto propio del post (título y contenido) sobre el que se mide la
+        similitud, sin las instrucciones fijas del prompt. Con `similar=False`
+        solo se aceptan prompts idénticos.
+        """
+        key = image_cache_key(user_id, style, prompt)
+        with connection() as conn:
+            row = conn.execute('SELECT key, filename FROM image_cache WHERE key = ?', (key,)).fetchone()
+            match = {"filename": row['filename'], "similarity": 1.0, "exact": True} if row else None
+
+            if not match and similar and self.threshold > 0:
+                signature = minhash_signature(subject)
+                candidates = conn.execute('''
+                    SELECT key, filename, signature FROM image_cache
+                    WHERE user_id = ? AND style = ?
+                    ORDER BY last_used_at DESC LIMIT ?
+                ''', (user_id, normalize_text(style), SIMILARITY_CANDIDATES)).fetchall()
+
+                best = max(
+                    ((signature_similarity(signature, json.loads(candidate['signature'])), candidate)
+                     for candidate in candidates),
+                    key=lambda scored: scored[0],
+                    default=(0.0, None)
+                )
+                if best[0] >= self.threshold:
+                    row = best[1]
+                    match = {"filename": row['filename'], "similarity": round(best[0], 3), "exact": False}
+
+            # La imagen pudo borrarse a mano: la entrada ya no sirve
+            if match and not os.path.exists(os.path.join(self.upload_dir, match['filename'])):
+                conn.execute('DELETE FROM image_cache WHERE key = ?', (row['key'],))
+                conn.commit()
+                match = None
+
+            if match:
+                conn.execute(
+                    'UPDATE image_cache SET last_used_at = ?, hits = hits + 1 WHERE key = ?',
+                    (time.time(), row['key'])
+                )
+                conn.commit()
+
+        self._count('misses' if not match else 'hits' if match['exact'] else 'similar_hits')
+        return match
+
+    def set(self, user_id, style, prompt, subject, filename):
+        now = time.time()
+        size = os.path.getsize(os.path.join(self.upload_dir, filename))
+        with connection() as conn:
+            conn.execute('''
+                INSERT OR REPLACE INTO image_cache (key, user_id, style, signature, filename, size,
+                                                    created_at, last_used_at, hits)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, 0)
+            ''', (
+                image_cache_key(user_id, style, prompt), user_id, normalize_text(style),
+                json.dumps(minhash_signature(subject)), filename, size, now, now
+            ))
+            self._evict(conn)
+            conn.commit()
+
+    def _evict(self, conn):
+        """Desalojar las entradas menos usadas hasta entrar en el presupuesto de disco
+
+        Solo se borra la entrada: el archivo se registra (o se renueva) en
+        media_files con created_at = last_used_at y lo borra el GC de media si
+        después del margen ningún post lo referencia.
+        """
+        total = conn.execute('SELECT COALESCE(SUM(size), 0) FROM image_cache').fetchone()[0]
+        if total <= self.max_bytes:
+            return
+
+        for row in conn.execute('SELECT key, filename, size, user_id, last_used_at FROM image_cache ORDER BY last_used_at').fetchall():
+            if total <= self.max_bytes:
+                break
+            conn.execute('DELETE FROM image_cache WHERE key = ?', (row['key'],))
+            total -= row['size'] or 0
+            conn.execute('''
+                INSERT INTO media_files (filename, size, user_id, created_at) VALUES (?, ?, ?, ?)
+                ON CONFLICT (filename) DO UPDATE SET created_at = MAX(created_at, excluded.created_at)
+            ''', (row['filename'], row['size'], row['user_id'], row['last_used_at']))
+
+    def stats(self):
+        with connection() as conn:
+            size, total_bytes = conn.execute('SELECT COUNT(*), COALESCE(SUM(size), 0) FROM image_cache').fetchone()
+
+        with self._lock:
+            lookups = self.hits + self.similar_hits + self.misses
+            return {
+                "size": size,
+                "bytes": total_bytes,
+                "max_bytes": self.max_bytes,
+                "similarity_threshold": self.threshold,
+                "hits": self.hits,
+                "similar_hits": self.similar_hits,
+                "misses": self.misses,
+                "hit_rate": round((self.hits + self.similar_hits) / lookups, 4) if lookups else 0.0
+            }
@@ -0,0 +1,135 @@
+"""
+Miniaturas y variantes WebP/AVIF de las imágenes en uploads/images
+"""
+
+import os
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from PIL import Image, features
+
+# Anchos de miniatura que se generan al escribir cada imagen
+DERIVATIVE_WIDTHS = tuple(sorted(
+    int(width) for width in os.getenv('POSTIA_IMAGE_WIDTHS', '160,320,640').split(',') if width.strip()
+))
+
+# Las variantes se guardan junto a los originales, en un subdirectorio
+DERIVATIVES_DIRNAME = 'derivatives'
+
+SOURCE_EXTENSIONS = {'png', 'jpg', 'jpeg', 'webp'}
+
+QUALITY = {'webp': 80, 'avif': 60, 'jpeg': 85}
+
+MIMETYPES = {
+    'avif': 'image/avif',
+    'webp': 'image/webp',
+    'png': 'image/png',
+    'jpeg': 'image/jpeg'
+}
+
+
+def _avif_supported():
+    try:
+        return features.check('avif')
+    except Exception:
+        return False
+
+
+AVIF_SUPPORTED = _avif_supported()
+
+derivative_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='postia-images')
+
+
+def is_derivable(filename):
+    """Solo las imágenes estáticas tienen variantes (no GIF ni video)"""
+    return '.' in filename and filename.rsplit('.', 1)[1].lower() in SOURCE_EXTENSIONS
+
+
+def source_format(filename):
+    extension = filename.rsplit('.', 1)[1].lower()
+    return 'jpeg' if extension in ('jpg', 'jpeg') else extension
+
+
+def pick_width(requested):
+    """Menor ancho pregenerado que cubre el pedido (None = tamaño original)"""
+    for width in DERIVATIVE_WIDTHS:
+        if width >= requested:
+            return width
+    return None
+
+
+def pick_format(filename, accept, requested=None):
+    """Formato a servir según ?format= o, si no viene, el header Accept"""
+    original = source_format(filename)
+    if requested == 'original':
+        return original
+    if requested in ('webp', 'avif', original):
+        return requested if requested != 'avif' or AVIF_SUPPORTED else 'webp'
+
+    if AVIF_SUPPORTED and 'image/avif' in accept:
+        return 'avif'
+    if 'image/webp' in accept:
+        return 'webp'
+    return original
+
+
+def derivative_path(upload_dir, filename, width, fmt):
+    stem = filename.rsplit('.', 1)[0]
+    suffix = f"_w{width}" if width else ""
+    return os.path.join(upload_dir, DERIVATIVES_DIRNAME, f"{stem}{suffix}.{fmt}")
+
+
+def ensure_derivative(upload_dir, filename, width, fmt):
+    """Ruta de la variante pedida, generándola y cacheándola en disco si falta"""
+    source_path = os.path.join(upload_dir, filename)
+    if width is None and fmt == source_format(filename):
+        return source_path
+
+    path = derivative_path(upload_dir, filename, width, fmt)
+    if os.path.exists(path):
+        return path
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with Image.open(source_path) as image:
+        image.load()
+        if image.mode not in ('RGB', 'RGBA'):
+            image = image.convert('RGBA' if 'A' in image.getbands() or image.mode == 'P' else 'RGB')
+        if fmt == 'jpeg' and image.mode != 'RGB':
+            image = image.convert('RGB')
+        if width and image.width > width:
+            image.thumbnail((width, image.height), Image.LANCZOS)
+
+        # Escribir a un temporal y renombrar para que nunca se sirva un archivo a medias
+        tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        save_options = {'quality': QUALITY[fmt]} if fmt in QUALITY else {'optimize': True}
+        image.save(tmp_path, format=fmt.upper(), **save_options)
+        os.replace(tmp_path, path)
+
+    return path
+
+
+def generate_derivatives(upload_dir, filename):
+    """Generar todas las variantes de una imagen recién escrita"""
+    if not is_derivable(filename):
+        return
+
+    formats = ['webp', source_format(filename)]
+    if AVIF_SUPPORTED:
+        formats.insert(0, 'avif')
+
+    for width in DERIVATIVE_WIDTHS + (None,):
+        for fmt in dict.fromkeys(formats):
+            ensure_derivative(upload_dir, filename, width, fmt)
+
+
+def _generate_safely(upload_dir, filename):
+    try:
+        generate_derivatives(upload_dir, filename)
+    except Exception as e:
+        print(f"Error generando variantes de {filename}: {str(e)}")
+
+
+def schedule_derivatives(upload_dir, filename):
+    """Generar las variantes en segundo plano sin demorar la respuesta"""
+    if is_derivable(filename):
+        derivative_executor.submit(_generate_safely, upload_dir, filename)
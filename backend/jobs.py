@@ -0,0 +1,196 @@
+"""
+Cola de trabajos en segundo plano con persistencia en SQLite
+"""
+
+import json
+import os
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from db import connection
+from metrics import current_user
+
+# Trabajos que pueden ejecutarse a la vez (cada uno ocupa un thread)
+JOB_WORKERS = int(os.getenv('POSTIA_JOB_WORKERS', '2'))
+
+# Condición de submit(exclusive=True): ningún trabajo del mismo tipo activo para el usuario
+ACTIVE_JOB_GUARD_SQL = '''
+    WHERE NOT EXISTS (
+        SELECT 1 FROM jobs WHERE user_id = ? AND kind = ? AND status IN ('queued', 'running')
+    )
+'''
+
+
+def init_jobs_table(conn):
+    """Crear tabla de trabajos"""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS jobs (
+            id TEXT PRIMARY KEY,
+            user_id INTEGER,
+            kind TEXT,
+            status TEXT DEFAULT 'queued',
+            payload TEXT,
+            result TEXT,
+            error TEXT,
+            progress TEXT,
+            created_at TEXT DEFAULT CURRENT_TIMESTAMP,
+            started_at TEXT,
+            finished_at TEXT
+        )
+    ''')
+
+    # Columnas agregadas después de crear la tabla
+    job_columns = {row['name'] for row in conn.execute('PRAGMA table_info(jobs)')}
+    if 'progress' not in job_columns:
+        conn.execute('ALTER TABLE jobs ADD COLUMN progress TEXT')
+
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs (status)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_jobs_user_kind ON jobs (user_id, kind, status)')
+
+
+def fail_interrupted_jobs(conn):
+    """Marcar como fallidos los trabajos que corrían cuando se detuvo el servidor"""
+    conn.execute('''
+        UPDATE jobs SET status = 'failed', error = 'Interrumpido por reinicio del servidor',
+            finished_at = CURRENT_TIMESTAMP
+        WHERE status = 'running'
+    ''')
+    conn.commit()
+
+
+class JobQueue:
+    """Ejecuta handlers registrados por tipo en un pool de threads acotado"""
+
+    def __init__(self, workers=JOB_WORKERS):
+        self.workers = workers
+        self._handlers = {}
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='postia-job')
+        self._executors = {}
+
+    def register(self, kind, handler, workers=None):
+        """Asociar un tipo de trabajo a una función handler(payload, progress) -> dict
+
+        `progress(done, total)` guarda el avance para que lo vea /api/jobs/<id>.
+        Con `workers` el tipo corre en su propio pool y no ocupa los threads
+        del resto de los trabajos.
+        """
+        self._handlers[kind] = handler
+        if workers:
+            self._executors[kind] = ThreadPoolExecutor(max_workers=workers, thread_name_prefix=f'postia-job-{kind}')
+
+    def _executor_for(self, kind):
+        return self._executors.get(kind, self._executor)
+
+    def submit(self, kind, user_id, payload, exclusive=False):
+        """Encolar un trabajo y devolver su id sin esperar a que termine
+
+        Con `exclusive` no se encola (y se devuelve None) si el usuario ya
+        tiene un trabajo de ese tipo pendiente o corriendo; la verificación y
+        el INSERT son una sola sentencia, así dos requests simultáneos no
+        encolan dos trabajos.
+        """
+        if kind not in self._handlers:
+            raise ValueError(f"Tipo de trabajo desconocido: {kind}")
+
+        job_id = uuid.uuid4().hex
+        query = 'INSERT INTO jobs (id, user_id, kind, status, payload) SELECT ?, ?, ?, ?, ?'
+        params = [job_id, user_id, kind, 'queued', json.dumps(payload)]
+        if exclusive:
+            query += ACTIVE_JOB_GUARD_SQL
+            params += [user_id, kind]
+
+        with connection() as conn:
+            inserted = conn.execute(query, params).rowcount
+            conn.commit()
+        if not inserted:
+            return None
+
+        self._executor_for(kind).submit(self._run, job_id, kind, payload)
+        return job_id
+
+    def active(self, kind, user_id):
+        """Id del trabajo de ese tipo pendiente o corriendo del usuario, o None"""
+        with connection() as conn:
+            row = conn.execute(
+                "SELECT id FROM jobs WHERE user_id = ? AND kind = ? AND status IN ('queued', 'running')",
+                (user_id, kind)
+            ).fetchone()
+        return row['id'] if row else None
+
+    def get(self, job_id, user_id=None):
+        """Estado de un trabajo (opcionalmente restringido a un usuario)"""
+        with connection() as conn:
+            row = conn.execute('SELECT * FROM jobs WHERE id = ?', (job_id,)).fetchone()
+
+        if not row or (user_id is not None and row['user_id'] != user_id):
+            return None
+
+        return {
+            "id": row['id'],
+            "kind": row['kind'],
+            "status": row['status'],
+            "result": json.loads(row['result']) if row['result'] else None,
+            "error": row['error'],
+            "progress": json.loads(row['progress']) if row['progress'] else None,
+            "created_at": row['created_at'],
+            "started_at": row['started_at'],
+            "finished_at": row['finished_at']
+        }
+
+    def recover(self, fail_running=True):
+        """Reencolar trabajos pendientes de una ejecución anterior del servidor
+
+        Con varios procesos (gunicorn) cada worker reencola los pendientes y el
+        reclamo atómico de _run evita ejecutarlos dos veces; los que estaban
+        corriendo se marcan fallidos una sola vez, en el master, con
+        `fail_running=False` en los workers.
+        """
+        with connection() as conn:
+            # Los que estaban corriendo murieron con el proceso anterior
+            if fail_running:
+                fail_interrupted_jobs(conn)
+            pending = conn.execute(
+                "SELECT id, kind, payload FROM jobs WHERE status = 'queued' ORDER BY created_at"
+            ).fetchall()
+
+        for row in pending:
+            if row['kind'] in self._handlers:
+                self._executor_for(row['kind']).submit(self._run, row['id'], row['kind'], json.loads(row['payload']))
+
+    def _run(self, job_id, kind, payload):
+        with connection() as conn:
+            # Reclamar el trabajo de forma atómica para no ejecutarlo dos veces
+            claimed = conn.execute('''
+                UPDATE jobs SET status = 'running', started_at = CURRENT_TIMESTAMP
+                WHERE id = ? AND status = 'queued'
+            ''', (job_id,)).rowcount
+            conn.commit()
+            if not claimed:
+                return
+            owner = conn.execute('SELECT user_id FROM jobs WHERE id = ?', (job_id,)).fetchone()
+
+        # El uso de OpenAI del trabajo se atribuye a quien lo encoló
+        current_user.set(owner['user_id'])
+
+        def progress(done, total):
+            with connection() as conn:
+                conn.execute(
+                    'UPDATE jobs SET progress = ? WHERE id = ?',
+                    (json.dumps({"done": done, "total": total}), job_id)
+                )
+                conn.commit()
+
+        try:
+            result = self._handlers[kind](payload, progress)
+        except Exception as e:
+            print(f"Error en trabajo {kind} {job_id}: {str(e)}")
+            status, result_json, error = 'failed', None, str(e)
+        else:
+            status, result_json, error = 'done', json.dumps(result), None
+
+        with connection() as conn:
+            conn.execute('''
+                UPDATE jobs SET status = ?, result = ?, error = ?, finished_at = CURRENT_TIMESTAMP
+                WHERE id = ?
+            ''', (status, result_json, error, job_id))
+            conn.commit()
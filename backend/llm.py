@@ -0,0 +1,139 @@
+"""
+Llamadas a modelos de lenguaje compartidas por las rutas de IA
+"""
+
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from openai import OpenAI
+
+from completion_cache import CompletionCache, cache_key
+from metrics import openai_span, submit_with_context
+from prompts import count_tokens
+
+DEFAULT_MODEL = 'gpt-4.1-mini'
+
+# Llamadas a OpenAI que pueden estar en vuelo a la vez entre todos los requests
+LLM_WORKERS = int(os.getenv('POSTIA_LLM_WORKERS', '8'))
+
+# Configurar OpenAI con cliente moderno
+openai_client = OpenAI(
+    api_key=os.getenv('OPENAI_API_KEY')
+)
+
+llm_executor = ThreadPoolExecutor(max_workers=LLM_WORKERS, thread_name_prefix='postia-llm')
+
+completion_cache = CompletionCache()
+
+
+def _report_tokens(tokens, messages, text, usage=None):
+    """Completar el dict `tokens` del llamador con el uso de la llamada
+
+    Sin `usage` (respuesta desde la caché) los tokens se cuentan localmente.
+    """
+    if tokens is None:
+        return
+    if usage is not None:
+        tokens.update(prompt_tokens=usage.prompt_tokens, completion_tokens=usage.completion_tokens, cached=False)
+    else:
+        tokens.update(
+            prompt_tokens=sum(count_tokens(str(message.get('content', ''))) for message in messages),
+            completion_tokens=count_tokens(text),
+            cached=True
+        )
+
+
+def complete(messages, max_tokens, temperature, model=DEFAULT_MODEL, use_cache=True, response_format=None,
+             tokens=None):
+    """Completar un chat y devolver solo el texto generado
+
+    Con `use_cache` una petición idéntica (modelo, mensajes y parámetros)
+    se responde desde la caché persistente sin llamar a OpenAI.
+    `response_format` se pasa tal cual a OpenAI (p. ej. {"type": "json_object"}).
+    Si se pasa un dict en `tokens` se completa con los tokens de entrada y
+    salida de la llamada.
+    """
+    params = {"max_tokens": max_tokens, "temperature": temperature}
+    if response_format:
+        params["response_format"] = response_format
+
+    key = cache_key(model, messages, **params)
+    if use_cache:
+        cached = completion_cache.get(key)
+        if cached is not None:
+            _report_tokens(tokens, messages, cached)
+            return cached
+
+    with openai_span('chat', model) as span:
+        response = openai_client.chat.completions.create(
+            model=model,
+            messages=messages,
+            **params
+        )
+        span['usage'] = response.usage
+    text = response.choices[0].message.content.strip()
+    _report_tokens(tokens, messages, text, response.usage)
+
+    completion_cache.set(key, model, text)
+    return text
+
+
+def stream_complete(messages, max_tokens, temperature, model=DEFAULT_MODEL, use_cache=True, tokens=None):
+    """Igual que complete() pero entrega el texto por fragmentos a medida que llega
+
+    `tokens` se completa recién cuando termina el stream.
+    """
+    key = cache_key(model, messages, max_tokens=max_tokens, temperature=temperature)
+    if use_cache:
+        cached = completion_cache.get(key)
+        if cached is not None:
+            _report_tokens(tokens, messages, cached)
+            yield cached
+            return
+
+    parts = []
+    with openai_span('chat_stream', model) as span:
+        stream = openai_client.chat.completions.create(
+            model=model,
+            messages=messages,
+            max_tokens=max_tokens,
+            temperature=temperature,
+            stream=True,
+            stream_options={"include_usage": True}
+        )
+
+        for chunk in stream:
+            # El último fragmento trae solo el uso de tokens
+            if chunk.usage:
+                span['usage'] = chunk.usage
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta.content
+            if delta:
+                parts.append(delta)
+                yield delta
+
+    text = ''.join(parts).strip()
+    _report_tokens(tokens, messages, text, span['usage'])
+    completion_cache.set(key, model, text)
+
+
+def _timed(fn):
+    started = time.perf_counter()
+    result = fn()
+    return result, round((time.perf_counter() - started) * 1000, 1)
+
+
+def run_stages(**stages):
+    """Ejecutar etapas independientes en paralelo y medir cada una
+
+    Cada etapa es una función sin argumentos. Devuelve (resultados, tiempos)
+    donde tiempos tiene una clave `<etapa>_ms` por etapa.
+    """
+    futures = {name: submit_with_context(llm_executor, _timed, fn) for name, fn in stages.items()}
+
+    results, timings = {}, {}
+    for name, future in futures.items():
+        results[name], timings[f'{name}_ms'] = future.result()
+    return results, timings
@@ -1,27 +1,86 @@
+import base64
 import os
+import uuid
+
 import requests
-from openai import OpenAI
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from dotenv import load_dotenv
 
 load_dotenv()
 
+from llm import openai_client
+from metrics import openai_span
+
+# 'url' descarga la imagen en un segundo request; 'b64_json' la recibe en la respuesta
+IMAGE_RESPONSE_FORMAT = os.getenv('POSTIA_IMAGE_RESPONSE_FORMAT', 'url')
+
+# Generar una imagen tarda bastante más que un chat: timeout y reintentos propios
+IMAGE_TIMEOUT = float(os.getenv('POSTIA_IMAGE_TIMEOUT', '120'))
+IMAGE_RETRIES = int(os.getenv('POSTIA_IMAGE_RETRIES', '2'))
+
+# (conexión, lectura) de la descarga desde la URL que devuelve OpenAI
+DOWNLOAD_TIMEOUT = (5, float(os.getenv('POSTIA_IMAGE_DOWNLOAD_TIMEOUT', '30')))
+DOWNLOAD_CHUNK_SIZE = 64 * 1024
+
+# Mismo pool de conexiones HTTP que llm.py, con los límites de imágenes
+image_client = openai_client.with_options(timeout=IMAGE_TIMEOUT, max_retries=IMAGE_RETRIES)
+
+
+def _download_session():
+    """Sesión con keep-alive y reintentos con backoff exponencial ante errores transitorios"""
+    retry = Retry(
+        total=3,
+        backoff_factor=0.5,
+        status_forcelist=(429, 500, 502, 503, 504),
+        allowed_methods=('GET',)
+    )
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=8, max_retries=retry)
+    session = requests.Session()
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+
+download_session = _download_session()
+
+
+def _write_atomically(output_path, chunks):
+    """Escribir por partes a un temporal y renombrar: nunca queda un archivo a medias"""
+    tmp_path = f"{output_path}.{uuid.uuid4().hex}.tmp"
+    try:
+        with open(tmp_path, 'wb') as f:
+            for chunk in chunks:
+                f.write(chunk)
+        os.replace(tmp_path, output_path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+
+
 def generate_image_with_ai(prompt, output_path):
     try:
-        client = OpenAI(api_key=os.getenv('OPENAI_API_KEY'))
-        response = client.images.generate(
-            model="dall-e-3",
-            prompt=prompt,
-            size="1024x1024",
-            quality="standard",
-            n=1
-        )
-        image_url = response.data[0].url
-        image_response = requests.get(image_url)
-        if image_response.status_code == 200:
-            with open(output_path, 'wb') as f:
-                f.write(image_response.content)
+        with openai_span('images', 'dall-e-3') as span:
+            response = image_client.images.generate(
+                model="dall-e-3",
+                prompt=prompt,
+                size="1024x1024",
+                quality="standard",
+                n=1,
+                response_format=IMAGE_RESPONSE_FORMAT
+            )
+            span['images'] = len(response.data)
+        image = response.data[0]
+
+        if image.b64_json:
+            _write_atomically(output_path, [base64.b64decode(image.b64_json)])
             return True
-        return False
+
+        with download_session.get(image.url, stream=True, timeout=DOWNLOAD_TIMEOUT) as image_response:
+            if image_response.status_code != 200:
+                return False
+            _write_atomically(output_path, image_response.iter_content(chunk_size=DOWNLOAD_CHUNK_SIZE))
+        return True
     except Exception as e:
         print(f"Error en generate_image_with_ai: {e}")
         return False
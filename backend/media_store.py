@@ -0,0 +1,205 @@
+"""
+Almacenamiento de archivos subidos direccionado por contenido
+
+Los archivos se escriben por partes a un temporal mientras se calcula su
+SHA-256, se guardan como `<sha256>.<ext>` (subir dos veces el mismo archivo
+no lo duplica) y sus referencias desde posts.media_files se registran en
+media_refs para poder borrar los que quedan huérfanos.
+"""
+
+import glob
+import hashlib
+import os
+import tempfile
+import time
+
+from flask import Request
+from werkzeug.exceptions import RequestEntityTooLarge
+
+from image_derivatives import DERIVATIVES_DIRNAME
+
+MAX_UPLOAD_BYTES = int(os.getenv('POSTIA_MAX_UPLOAD_MB', '100')) * 1024 * 1024
+
+# Tiempo que un archivo sin referencias se conserva (se sube antes de guardar el post)
+MEDIA_GC_GRACE_SECONDS = int(os.getenv('POSTIA_MEDIA_GC_GRACE_HOURS', '24')) * 60 * 60
+
+INCOMING_DIRNAME = '.incoming'
+
+
+def init_media_schema(conn):
+    """Crear tablas de archivos y referencias desde posts"""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS media_files (
+            filename TEXT PRIMARY KEY,
+            sha256 TEXT,
+            size INTEGER,
+            user_id INTEGER,
+            created_at REAL
+        )
+    ''')
+
+    refs_exist = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'media_refs'"
+    ).fetchone()
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS media_refs (
+            post_id INTEGER,
+            filename TEXT,
+            PRIMARY KEY (post_id, filename)
+        )
+    ''')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_media_refs_filename ON media_refs (filename)')
+
+    # Al borrar un post se liberan sus referencias, venga de la ruta que venga
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS posts_media_refs_delete AFTER DELETE ON posts
+        BEGIN
+            DELETE FROM media_refs WHERE post_id = OLD.id;
+        END
+    ''')
+
+    # Primera vez: registrar las referencias de los posts existentes
+    if not refs_exist:
+        for row in conn.execute("SELECT id, media_files FROM posts WHERE media_files IS NOT NULL AND media_files != ''").fetchall():
+            sync_post_media(conn, row['id'], row['media_files'].split(','))
+
+
+def media_filename(url):
+    """Nombre de archivo a partir de una URL de /uploads/images o un nombre suelto"""
+    return url.strip().split('?', 1)[0].rsplit('/', 1)[-1]
+
+
+class HashingUploadFile:
+    """Destino de un archivo del multipart: escribe a disco y hashea por partes"""
+
+    def __init__(self, directory, max_bytes=MAX_UPLOAD_BYTES):
+        os.makedirs(directory, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.committed = False
+        self._sha256 = hashlib.sha256()
+        self._file = tempfile.NamedTemporaryFile(dir=directory, suffix='.part', delete=False)
+        self.path = self._file.name
+
+    def write(self, data):
+        self.size += len(data)
+        if self.size > self.max_bytes:
+            raise RequestEntityTooLarge()
+        self._sha256.update(data)
+        return self._file.write(data)
+
+    def hexdigest(self):
+        return self._sha256.hexdigest()
+
+    def close(self):
+        self._file.close()
+        # Si no se llegó a guardar (archivo rechazado), no dejar el temporal
+        if not self.committed and os.path.exists(self.path):
+            os.unlink(self.path)
+
+    def __getattr__(self, name):
+        return getattr(self._file, name)
+
+
+def upload_request_class(upload_dir):
+    """Clase de request que vuelca los archivos subidos directo a `upload_dir`"""
+    incoming_dir = os.path.join(upload_dir, INCOMING_DIRNAME)
+
+    class UploadRequest(Request):
+        max_content_length = MAX_UPLOAD_BYTES
+
+        def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+            return HashingUploadFile(incoming_dir)
+
+    return UploadRequest
+
+
+def register_media(conn, filename, sha256, size, user_id):
+    """Registrar un archivo entregado al cliente
+
+    Si ya estaba registrado (subida deduplicada) se renueva created_at: el
+    margen del GC vuelve a correr desde ahora, hasta que un post lo referencie.
+    """
+    conn.execute('''
+        INSERT INTO media_files (filename, sha256, size, user_id, created_at)
+        VALUES (?, ?, ?, ?, ?)
+        ON CONFLICT (filename) DO UPDATE SET created_at = excluded.created_at
+    ''', (filename, sha256, size, user_id, time.time()))
+
+
+def ingest_upload(conn, upload_dir, file_storage, extension, user_id):
+    """Guardar un archivo subido por su hash; devuelve (nombre, deduplicado)"""
+    stream = file_storage.stream
+    if isinstance(stream, HashingUploadFile):
+        stream.flush()
+        sha256, size, source_path = stream.hexdigest(), stream.size, stream.path
+    else:
+        # Request sin la clase de subida: copiar a un temporal hasheando igual
+        target = HashingUploadFile(os.path.join(upload_dir, INCOMING_DIRNAME))
+        for chunk in iter(lambda: stream.read(1024 * 1024), b''):
+            target.write(chunk)
+        target.flush()
+        stream, sha256, size, source_path = target, target.hexdigest(), target.size, target.path
+
+    filename = f"{sha256}.{extension}"
+    final_path = os.path.join(upload_dir, filename)
+    deduplicated = os.path.exists(final_path)
+
+    if deduplicated:
+        stream.close()
+    else:
+        stream.committed = True
+        stream.close()
+        os.replace(source_path, final_path)
+
+    register_media(conn, filename, sha256, size, user_id)
+    return filename, deduplicated
+
+
+def sync_post_media(conn, post_id, media_files):
+    """Reemplazar las referencias de un post por las de su media_files actual"""
+    conn.execute('DELETE FROM media_refs WHERE post_id = ?', (post_id,))
+    conn.executemany(
+        'INSERT OR IGNORE INTO media_refs (post_id, filename) VALUES (?, ?)',
+        [(post_id, media_filename(url)) for url in media_files if url.strip()]
+    )
+
+
+def delete_media_file(conn, upload_dir, filename):
+    """Borrar un archivo, sus variantes y su registro"""
+    stem = filename.rsplit('.', 1)[0]
+    paths = [os.path.join(upload_dir, filename)]
+    paths += glob.glob(os.path.join(upload_dir, DERIVATIVES_DIRNAME, f"{glob.escape(stem)}*"))
+    for path in paths:
+        if os.path.exists(path):
+            os.unlink(path)
+    conn.execute('DELETE FROM media_files WHERE filename = ?', (filename,))
+
+
+def collect_garbage(conn, upload_dir, grace_seconds=MEDIA_GC_GRACE_SECONDS, dry_run=False):
+    """Borrar los archivos registrados sin referencias más viejos que el margen
+
+    Las imágenes que conserva la caché de imágenes no se borran: al desalojarlas
+    la caché las deja registradas con created_at = su último uso.
+    """
+    orphans = conn.execute('''
+        SELECT m.filename, m.size FROM media_files m
+        WHERE m.created_at < ?
+          AND NOT EXISTS (SELECT 1 FROM media_refs r WHERE r.filename = m.filename)
+          AND NOT EXISTS (SELECT 1 FROM image_cache c WHERE c.filename = m.filename)
+    ''', (time.time() - grace_seconds,)).fetchall()
+
+    freed = 0
+    for row in orphans:
+        freed += row['size'] or 0
+        if not dry_run:
+            delete_media_file(conn, upload_dir, row['filename'])
+
+    if not dry_run:
+        conn.commit()
+
+    return {
+        "orphans": [row['filename'] for row in orphans],
+        "freed_bytes": freed,
+        "dry_run": dry_run
+    }
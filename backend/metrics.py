@@ -0,0 +1,299 @@
+"""
+Métricas de latencia y uso de OpenAI en formato de exposición de Prometheus
+
+Sin dependencias: contadores e histogramas en memoria del proceso, que
+/metrics devuelve en texto plano para que Prometheus los recolecte.
+
+Con varios workers (gunicorn) cada proceso vuelca sus valores cada
+POSTIA_METRICS_SYNC_SECONDS a un archivo propio en POSTIA_METRICS_DIR y
+/metrics suma los de todos, así cualquier worker que atienda la recolección
+devuelve los totales del servidor. Los archivos de workers que murieron se
+conservan para que los contadores no retrocedan; el master vacía el
+directorio al arrancar.
+"""
+
+import contextvars
+import glob
+import json
+import os
+import re
+import threading
+import time
+from contextlib import contextmanager
+from functools import lru_cache
+
+# Usuario del request o trabajo en curso, para atribuir el uso de OpenAI
+current_user = contextvars.ContextVar('postia_current_user', default=None)
+
+HTTP_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+OPENAI_BUCKETS = (0.1, 0.25, 0.5, 1, 2, 5, 10, 20, 30, 60, 120)
+SQLITE_BUCKETS = (0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1)
+
+REGISTRY = []
+
+# Directorio compartido entre workers ('' = métricas solo del proceso)
+METRICS_DIR = os.getenv('POSTIA_METRICS_DIR', '')
+METRICS_SYNC_SECONDS = float(os.getenv('POSTIA_METRICS_SYNC_SECONDS', '5'))
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in labels) + '}'
+
+
+class Counter:
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels[name] for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self._values)
+
+    def reset(self):
+        with self._lock:
+            self._values.clear()
+
+    @staticmethod
+    def merge(values, other):
+        for key, value in other.items():
+            values[key] = values.get(key, 0) + value
+
+    def render(self, values=None):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} counter']
+        for key, value in sorted((self.snapshot() if values is None else values).items()):
+            lines.append(f'{self.name}{_format_labels(zip(self.labelnames, key))} {value}')
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, documentation, labelnames=(), buckets=HTTP_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def observe(self, value, **labels):
+        key = tuple(labels[name] for name in self.labelnames)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * len(self.buckets), 0.0, 0]
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[0][index] += 1
+                    break
+            series[1] += value
+            series[2] += 1
+
+    def snapshot(self):
+        with self._lock:
+            return {key: [list(counts), total, count] for key, (counts, total, count) in self._series.items()}
+
+    def reset(self):
+        with self._lock:
+            self._series.clear()
+
+    @staticmethod
+    def merge(values, other):
+        for key, (counts, total, count) in other.items():
+            series = values.get(key)
+            if series is None:
+                values[key] = [list(counts), total, count]
+            else:
+                series[0] = [mine + theirs for mine, theirs in zip(series[0], counts)]
+                series[1] += total
+                series[2] += count
+
+    def render(self, values=None):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} histogram']
+        for key, (counts, total, count) in sorted((self.snapshot() if values is None else values).items()):
+            labels = list(zip(self.labelnames, key))
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                lines.append(f'{self.name}_bucket{_format_labels(labels + [("le", bound)])} {cumulative}')
+            lines.append(f'{self.name}_bucket{_format_labels(labels + [("le", "+Inf")])} {count}')
+            lines.append(f'{self.name}_sum{_format_labels(labels)} {total}')
+            lines.append(f'{self.name}_count{_format_labels(labels)} {count}')
+        return lines
+
+
+HTTP_REQUEST_DURATION = Histogram(
+    'postia_http_request_duration_seconds', 'Duración de los requests HTTP por ruta',
+    ('method', 'endpoint', 'status'), HTTP_BUCKETS
+)
+OPENAI_REQUEST_DURATION = Histogram(
+    'postia_openai_request_duration_seconds', 'Duración de las llamadas a OpenAI',
+    ('operation', 'model', 'outcome'), OPENAI_BUCKETS
+)
+OPENAI_TOKENS = Counter(
+    'postia_openai_tokens_total', 'Tokens consumidos en OpenAI por usuario',
+    ('model', 'type', 'user')
+)
+OPENAI_IMAGES = Counter(
+    'postia_openai_images_total', 'Imágenes generadas en OpenAI por usuario',
+    ('model', 'user')
+)
+POSTS_PUBLISHED = Counter(
+    'postia_posts_published_total', 'Posts programados despachados a las plataformas',
+    ('platform', 'outcome')
+)
+SQLITE_QUERY_DURATION = Histogram(
+    'postia_sqlite_query_duration_seconds', 'Duración de las sentencias SQLite hasta la primera fila',
+    ('statement', 'table'), SQLITE_BUCKETS
+)
+
+
+def submit_with_context(executor, fn, *args):
+    """executor.submit conservando el usuario actual en el thread del pool"""
+    return executor.submit(contextvars.copy_context().run, fn, *args)
+
+
+@contextmanager
+def openai_span(operation, model):
+    """Medir una llamada a OpenAI; el bloque puede completar `usage` e `images`
+
+    Un streaming que se corta porque el cliente se desconectó (GeneratorExit)
+    cuenta como 'cancelled', no como 'ok' ni 'error'.
+    """
+    span = {'usage': None, 'images': 0}
+    outcome = 'ok'
+    started = time.perf_counter()
+    try:
+        yield span
+    except GeneratorExit:
+        outcome = 'cancelled'
+        raise
+    except Exception:
+        outcome = 'error'
+        raise
+    finally:
+        OPENAI_REQUEST_DURATION.observe(
+            time.perf_counter() - started, operation=operation, model=model, outcome=outcome
+        )
+        user = str(current_user.get() or 'anonymous')
+        usage = span['usage']
+        if usage is not None:
+            OPENAI_TOKENS.inc(usage.prompt_tokens or 0, model=model, type='prompt', user=user)
+            OPENAI_TOKENS.inc(usage.completion_tokens or 0, model=model, type='completion', user=user)
+        if span['images']:
+            OPENAI_IMAGES.inc(span['images'], model=model, user=user)
+
+
+_SQL_TABLE = re.compile(r'\b(?:FROM|INTO|UPDATE|TABLE(?: IF NOT EXISTS)?|ON)\s+(\w+)', re.IGNORECASE)
+
+
+@lru_cache(maxsize=1024)
+def sql_labels(sql):
+    """(sentencia, tabla) de una consulta, p. ej. ('SELECT', 'posts')"""
+    words = sql.split(None, 1)
+    match = _SQL_TABLE.search(sql)
+    return (words[0].upper() if words else ''), (match.group(1) if match else '')
+
+
+def observe_query(sql, seconds):
+    statement, table = sql_labels(sql)
+    SQLITE_QUERY_DURATION.observe(seconds, statement=statement, table=table)
+
+
+# Archivo de este proceso; incluye el momento de arranque para que un pid reutilizado
+# no pise el volcado de un worker muerto
+_snapshot_path = None
+
+
+def write_snapshot():
+    """Volcar los valores de este proceso a su archivo (reemplazo atómico)"""
+    if _snapshot_path is None:
+        return
+    data = {
+        metric.name: [[list(key), value] for key, value in metric.snapshot().items()]
+        for metric in REGISTRY
+    }
+    path = _snapshot_path
+    with open(f'{path}.tmp', 'w') as snapshot:
+        json.dump(data, snapshot)
+    os.replace(f'{path}.tmp', path)
+
+
+def _read_snapshots():
+    """Valores volcados por los demás procesos, por nombre de métrica"""
+    for path in glob.glob(os.path.join(METRICS_DIR, 'metrics-*.json')):
+        if path == _snapshot_path:
+            continue
+        try:
+            with open(path) as snapshot:
+                data = json.load(snapshot)
+        except (OSError, ValueError):
+            continue
+        yield {name: {tuple(key): value for key, value in series} for name, series in data.items()}
+
+
+def reset_metrics():
+    """Vaciar los valores del proceso
+
+    Cada worker lo llama al arrancar: con preload_app hereda del master lo que
+    midió al importar la app (p. ej. las consultas de init_db), y como /metrics
+    suma los volcados de todos los workers se contaría una vez por worker.
+    """
+    for metric in REGISTRY:
+        metric.reset()
+
+
+def start_metrics_sync():
+    """Volcar periódicamente las métricas del proceso (una vez por worker, después del fork)"""
+    global _snapshot_path
+    if not METRICS_DIR or _snapshot_path is not None:
+        return
+    os.makedirs(METRICS_DIR, exist_ok=True)
+    _snapshot_path = os.path.join(METRICS_DIR, f'metrics-{os.getpid()}-{time.time_ns()}.json')
+
+    def sync():
+        while True:
+            try:
+                write_snapshot()
+            except OSError as e:
+                print(f"Error guardando métricas en {METRICS_DIR}: {str(e)}")
+            time.sleep(METRICS_SYNC_SECONDS)
+
+    threading.Thread(target=sync, name='postia-metrics-sync', daemon=True).start()
+
+
+def clear_metrics_dir():
+    """Borrar los volcados de una ejecución anterior (en el master, antes de crear workers)"""
+    if not METRICS_DIR:
+        return
+    os.makedirs(METRICS_DIR, exist_ok=True)
+    for path in glob.glob(os.path.join(METRICS_DIR, 'metrics-*.json*')):
+        os.remove(path)
+
+
+def render_metrics():
+    """Exposición de Prometheus: valores propios más los del resto de los workers"""
+    values = {metric.name: metric.snapshot() for metric in REGISTRY}
+    if METRICS_DIR:
+        for snapshot in _read_snapshots():
+            for metric in REGISTRY:
+                metric.merge(values[metric.name], snapshot.get(metric.name, {}))
+
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render(values[metric.name]))
+    return '\n'.join(lines) + '\n'
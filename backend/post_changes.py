@@ -0,0 +1,148 @@
+"""
+Versionado y registro de cambios de los posts de cada usuario
+
+Triggers de SQLite incrementan un contador por usuario ante cualquier
+INSERT/UPDATE/DELETE en posts, sin importar qué ruta o trabajo lo haga.
+Cada post guarda la versión en la que se creó y la de su último cambio, y
+los borrados dejan una marca en post_tombstones para la sincronización
+incremental del dashboard.
+
+Las marcas de borrado se conservan POSTIA_TOMBSTONE_RETENTION_DAYS días; al
+descartarlas se anota en post_versions.pruned_version la última versión
+descartada, y un cliente con una versión anterior tiene que recargar todo.
+"""
+
+import os
+
+# Días que se guardan las marcas de borrado para la sincronización incremental
+TOMBSTONE_RETENTION_DAYS = int(os.getenv('POSTIA_TOMBSTONE_RETENTION_DAYS', '30'))
+
+BUMP_VERSION_SQL = '''
+    INSERT INTO post_versions (user_id, version) VALUES ({row}.user_id, 1)
+    ON CONFLICT (user_id) DO UPDATE SET version = version + 1;
+'''
+
+CURRENT_VERSION_SQL = '(SELECT version FROM post_versions WHERE user_id = {row}.user_id)'
+
+TOMBSTONE_CUTOFF_SQL = f"datetime('now', '-{TOMBSTONE_RETENTION_DAYS} days')"
+
+# Descartar las marcas vencidas de los usuarios que cumplan `scope`, anotando antes hasta qué versión
+PRUNE_VERSION_SQL = f'''
+    UPDATE post_versions SET pruned_version = MAX(pruned_version, (
+        SELECT MAX(version) FROM post_tombstones
+        WHERE user_id = post_versions.user_id AND deleted_at < {TOMBSTONE_CUTOFF_SQL}
+    ))
+    WHERE user_id IN (
+        SELECT user_id FROM post_tombstones WHERE {{scope}} AND deleted_at < {TOMBSTONE_CUTOFF_SQL}
+    );
+'''
+PRUNE_TOMBSTONES_SQL = f'''
+    DELETE FROM post_tombstones WHERE {{scope}} AND deleted_at < {TOMBSTONE_CUTOFF_SQL};
+'''
+
+
+def init_post_changes_schema(conn):
+    """Crear tablas de versiones y los triggers que las mantienen"""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS post_versions (
+            user_id INTEGER PRIMARY KEY,
+            version INTEGER NOT NULL DEFAULT 0
+        )
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS post_tombstones (
+            user_id INTEGER,
+            post_id INTEGER,
+            version INTEGER
+        )
+    ''')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_post_tombstones_user_version ON post_tombstones (user_id, version)')
+
+    if 'pruned_version' not in {row['name'] for row in conn.execute('PRAGMA table_info(post_versions)')}:
+        conn.execute('ALTER TABLE post_versions ADD COLUMN pruned_version INTEGER NOT NULL DEFAULT 0')
+    # Las marcas anteriores a deleted_at empiezan a contar su retención desde ahora
+    if 'deleted_at' not in {row['name'] for row in conn.execute('PRAGMA table_info(post_tombstones)')}:
+        conn.execute('ALTER TABLE post_tombstones ADD COLUMN deleted_at TEXT')
+        conn.execute('UPDATE post_tombstones SET deleted_at = CURRENT_TIMESTAMP')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_post_tombstones_user_deleted ON post_tombstones (user_id, deleted_at)')
+
+    # Los triggers se recrean siempre para que bases existentes tomen la última definición (y retención)
+    for trigger in ('posts_version_insert', 'posts_version_update', 'posts_version_delete'):
+        conn.execute(f'DROP TRIGGER IF EXISTS {trigger}')
+
+    post_columns = {row['name'] for row in conn.execute('PRAGMA table_info(posts)')}
+    for column in ('version', 'created_version'):
+        if column not in post_columns:
+            conn.execute(f'ALTER TABLE posts ADD COLUMN {column} INTEGER')
+            conn.execute(f'UPDATE posts SET {column} = 0 WHERE {column} IS NULL')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_posts_user_version ON posts (user_id, version)')
+
+    conn.execute(f'''
+        CREATE TRIGGER posts_version_insert AFTER INSERT ON posts
+        BEGIN
+            {BUMP_VERSION_SQL.format(row='NEW')}
+            UPDATE posts SET
+                version = {CURRENT_VERSION_SQL.format(row='NEW')},
+                created_version = {CURRENT_VERSION_SQL.format(row='NEW')}
+            WHERE id = NEW.id;
+        END
+    ''')
+    # El UPDATE que hacen los propios triggers cambia la versión y no vuelve a disparar
+    conn.execute(f'''
+        CREATE TRIGGER posts_version_update AFTER UPDATE ON posts
+        WHEN NEW.version IS OLD.version
+        BEGIN
+            {BUMP_VERSION_SQL.format(row='NEW')}
+            UPDATE posts SET version = {CURRENT_VERSION_SQL.format(row='NEW')}
+            WHERE id = NEW.id;
+        END
+    ''')
+    conn.execute(f'''
+        CREATE TRIGGER posts_version_delete AFTER DELETE ON posts
+        BEGIN
+            {BUMP_VERSION_SQL.format(row='OLD')}
+            INSERT INTO post_tombstones (user_id, post_id, version, deleted_at)
+            VALUES (OLD.user_id, OLD.id, {CURRENT_VERSION_SQL.format(row='OLD')}, CURRENT_TIMESTAMP);
+            {PRUNE_VERSION_SQL.format(scope='user_id = OLD.user_id')}
+            {PRUNE_TOMBSTONES_SQL.format(scope='user_id = OLD.user_id')}
+        END
+    ''')
+
+    # Cada borrado descarta las marcas vencidas de su usuario; al arrancar, las de todos
+    prune_tombstones(conn)
+
+
+def prune_tombstones(conn):
+    """Descartar las marcas de borrado más viejas que la retención"""
+    conn.execute(PRUNE_VERSION_SQL.format(scope='1'))
+    conn.execute(PRUNE_TOMBSTONES_SQL.format(scope='1'))
+
+
+def get_posts_version(conn, user_id):
+    """Versión actual del calendario del usuario (0 si nunca cambió)"""
+    row = conn.execute('SELECT version FROM post_versions WHERE user_id = ?', (user_id,)).fetchone()
+    return row['version'] if row else 0
+
+
+def get_oldest_version(conn, user_id):
+    """Versión más vieja desde la que todavía se pueden pedir cambios"""
+    row = conn.execute('SELECT pruned_version FROM post_versions WHERE user_id = ?', (user_id,)).fetchone()
+    return row['pruned_version'] if row else 0
+
+
+def get_post_changes(conn, user_id, since):
+    """Ids creados, modificados y borrados después de la versión `since`"""
+    changed = conn.execute(
+        'SELECT id, created_version FROM posts WHERE user_id = ? AND version > ? ORDER BY id',
+        (user_id, since)
+    ).fetchall()
+    deleted = conn.execute(
+        'SELECT DISTINCT post_id FROM post_tombstones WHERE user_id = ? AND version > ? ORDER BY post_id',
+        (user_id, since)
+    ).fetchall()
+
+    return {
+        "inserted": [row['id'] for row in changed if row['created_version'] > since],
+        "updated": [row['id'] for row in changed if row['created_version'] <= since],
+        "deleted": [row['post_id'] for row in deleted]
+    }
@@ -0,0 +1,128 @@
+"""
+Cambios de estado de posts en bloque, para uno o varios usuarios
+
+Cada lote es un único UPDATE ... RETURNING sobre el conjunto filtrado (usuarios,
+rango de fechas, plataforma, ids de post) y todos los lotes van en la misma
+transacción. Solo se aplican las transiciones permitidas: los posts que se
+están publicando o ya se publicaron no cambian.
+"""
+
+from datetime import datetime
+
+# Estado destino -> estados desde los que se puede llegar
+TRANSITIONS = {
+    'approved': ('draft', 'failed'),
+    'draft': ('approved', 'failed'),
+}
+
+# Ids por sentencia, lejos del límite de variables de SQLite
+BATCH_SIZE = 500
+
+
+def _parse_ids(values, name):
+    if values is None:
+        return []
+    if not isinstance(values, list):
+        raise ValueError(f"{name} debe ser una lista")
+    try:
+        return sorted({int(value) for value in values})
+    except (TypeError, ValueError):
+        raise ValueError(f"{name} debe contener ids numéricos")
+
+
+def _parse_date(value, name):
+    if not value:
+        return None
+    try:
+        return datetime.strptime(value, '%Y-%m-%d').strftime('%Y-%m-%d')
+    except (TypeError, ValueError):
+        raise ValueError(f"{name} debe tener formato YYYY-MM-DD")
+
+
+def parse_status_filters(data):
+    """Validar el cuerpo del request; devuelve (estado destino, estados origen, filtros)"""
+    status = data.get('status')
+    if status not in TRANSITIONS:
+        raise ValueError(f"status debe ser uno de: {', '.join(TRANSITIONS)}")
+
+    from_statuses = data.get('from_status') or list(TRANSITIONS[status])
+    if isinstance(from_statuses, str):
+        from_statuses = [from_statuses]
+    invalid = [value for value in from_statuses if value not in TRANSITIONS[status]]
+    if invalid:
+        raise ValueError(f"No se puede pasar de {', '.join(invalid)} a {status}")
+
+    filters = {
+        'user_ids': _parse_ids(data.get('user_ids'), 'user_ids'),
+        'post_ids': _parse_ids(data.get('post_ids'), 'post_ids'),
+        'date_from': _parse_date(data.get('from'), 'from'),
+        'date_to': _parse_date(data.get('to'), 'to'),
+        'platform': data.get('platform') or None,
+    }
+    if not any(filters.values()):
+        raise ValueError("Indicá al menos un filtro: user_ids, post_ids, from/to o platform")
+
+    return status, list(from_statuses), filters
+
+
+def _where(from_statuses, filters, post_ids):
+    conditions = [f"status IN ({', '.join('?' * len(from_statuses))})"]
+    params = list(from_statuses)
+
+    if filters['user_ids']:
+        conditions.append(f"user_id IN ({', '.join('?' * len(filters['user_ids']))})")
+        params.extend(filters['user_ids'])
+    if post_ids:
+        conditions.append(f"id IN ({', '.join('?' * len(post_ids))})")
+        params.extend(post_ids)
+    if filters['date_from']:
+        conditions.append('scheduled_date >= ?')
+        params.append(filters['date_from'])
+    if filters['date_to']:
+        conditions.append('scheduled_date <= ?')
+        params.append(filters['date_to'])
+    if filters['platform']:
+        conditions.append('platform = ?')
+        params.append(filters['platform'])
+
+    return ' AND '.join(conditions), params
+
+
+def _batches(filters):
+    """Ids de post de a BATCH_SIZE; sin ids, un único lote con el resto de los filtros"""
+    post_ids = filters['post_ids']
+    if not post_ids:
+        return [None]
+    return [post_ids[start:start + BATCH_SIZE] for start in range(0, len(post_ids), BATCH_SIZE)]
+
+
+def bulk_update_status(conn, status, from_statuses, filters, dry_run=False):
+    """Aplicar la transición y devolver (conteo por usuario, posts cambiados)
+
+    Los posts cambiados son tuplas (id, user_id, scheduled_date, scheduled_time)
+    para que quien llama reprograme la publicación; con `dry_run` solo se
+    cuentan y la lista queda vacía. Quien llama hace el commit.
+    """
+    counts = {}
+    changed = []
+
+    for post_ids in _batches(filters):
+        where, params = _where(from_statuses, filters, post_ids)
+
+        if dry_run:
+            rows = conn.execute(
+                f'SELECT user_id, COUNT(*) AS total FROM posts WHERE {where} GROUP BY user_id', params
+            ).fetchall()
+            for row in rows:
+                counts[row['user_id']] = counts.get(row['user_id'], 0) + row['total']
+            continue
+
+        rows = conn.execute(
+            f'UPDATE posts SET status = ? WHERE {where} RETURNING id, user_id, scheduled_date, scheduled_time',
+            [status] + params
+        ).fetchall()
+        for row in rows:
+            counts[row['user_id']] = counts.get(row['user_id'], 0) + 1
+            changed.append((row['id'], row['user_id'], row['scheduled_date'], row['scheduled_time']))
+
+    return counts, changed
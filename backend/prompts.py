@@ -0,0 +1,338 @@
+"""
+Plantillas de prompts de copy, hashtags e imágenes con presupuesto de tokens
+
+Cada plantilla se parsea una vez en partes literales y campos {nombre}.
+bind() fija los campos que dependen solo de la marca (el perfil de
+brand_profile.py los precalcula por usuario) y render() completa los del
+request (título, contenido, plataforma) con una concatenación.
+
+fit() además cuenta los tokens localmente (con tiktoken si está instalado, si
+no con una estimación) y recorta los campos largos hasta entrar en el
+presupuesto del endpoint, para que un post enorme no dispare el costo ni la
+latencia de la llamada.
+"""
+
+import math
+import os
+import re
+import threading
+from collections import Counter
+from functools import cached_property
+from string import Formatter
+
+try:
+    import tiktoken
+except ImportError:  # sin tiktoken los tokens se estiman (ver _estimate_tokens)
+    tiktoken = None
+
+TOKEN_ENCODING = os.getenv('POSTIA_TOKEN_ENCODING', 'o200k_base')
+
+# Presupuesto de tokens del prompt (mensaje de usuario) por endpoint
+PROMPT_BUDGETS = {
+    'copy': int(os.getenv('POSTIA_COPY_PROMPT_TOKENS', '1200')),
+    'hashtags': int(os.getenv('POSTIA_HASHTAG_PROMPT_TOKENS', '800')),
+    'image': int(os.getenv('POSTIA_IMAGE_PROMPT_TOKENS', '700'))
+}
+
+# Tope por campo de marca (valores, temas, audiencia...) al enlazar las plantillas
+BRAND_FIELD_TOKENS = int(os.getenv('POSTIA_BRAND_FIELD_TOKENS', '80'))
+
+TRUNCATION_MARK = ' […]'
+
+# Pre-tokenización al estilo de los BPE de OpenAI: palabras con su espacio, números y signos
+_PRETOKEN = re.compile(r"\s?[^\W\d_]+|\s?\d{1,3}|\s?[^\s\w]+|\s+")
+
+_encoding = None
+_encoding_lock = threading.Lock()
+
+
+def _get_encoding():
+    """Codificación de tiktoken, o None si no está instalado o no se pudo cargar"""
+    global _encoding, tiktoken
+    if tiktoken is None or _encoding is not None:
+        return _encoding
+    with _encoding_lock:
+        if _encoding is None and tiktoken is not None:
+            try:
+                _encoding = tiktoken.get_encoding(TOKEN_ENCODING)
+            except Exception as e:
+                # p. ej. sin red para bajar el vocabulario: se sigue con la estimación
+                print(f"No se pudo cargar la codificación {TOKEN_ENCODING} de tiktoken: {str(e)}")
+                tiktoken = None
+    return _encoding
+
+
+def _estimate_tokens(chunk):
+    # Palabras: ~4 caracteres por token; signos y emojis: uno por carácter
+    word = chunk.strip()
+    if not word:
+        return 1
+    if word[0].isalnum():
+        return math.ceil(len(word) / 4)
+    return len(word)
+
+
+def count_tokens(text):
+    """Tokens de un texto según el tokenizador del modelo (o su estimación)"""
+    if not text:
+        return 0
+    encoding = _get_encoding()
+    if encoding is not None:
+        return len(encoding.encode(text, disallowed_special=()))
+    return sum(_estimate_tokens(chunk) for chunk in _PRETOKEN.findall(text))
+
+
+def truncate_tokens(text, max_tokens):
+    """Recortar el texto en un límite de palabra para que no pase de `max_tokens`"""
+    if count_tokens(text) <= max_tokens:
+        return text
+    budget = max_tokens - count_tokens(TRUNCATION_MARK)
+    if budget <= 0:
+        return ''
+
+    kept, used = [], 0
+    for chunk in _PRETOKEN.findall(text):
+        cost = count_tokens(chunk)
+        if used + cost > budget:
+            break
+        kept.append(chunk)
+        used += cost
+    return ''.join(kept).rstrip() + TRUNCATION_MARK
+
+
+class PromptTemplate:
+    """Texto con campos {nombre} que se pueden completar en etapas"""
+
+    def __init__(self, text=None, parts=None):
+        if parts is None:
+            parts = []
+            for literal, field, _, _ in Formatter().parse(text):
+                if literal:
+                    parts.append(literal)
+                if field is not None:
+                    parts.append((field,))
+        self.parts = self._merge(parts)
+
+    @staticmethod
+    def _merge(parts):
+        # Literales contiguos en uno solo para que render() concatene lo mínimo
+        merged = []
+        for part in parts:
+            if isinstance(part, str) and merged and isinstance(merged[-1], str):
+                merged[-1] += part
+            else:
+                merged.append(part)
+        return merged
+
+    @property
+    def fields(self):
+        return {part[0] for part in self.parts if isinstance(part, tuple)}
+
+    @cached_property
+    def static_tokens(self):
+        """Tokens del texto fijo, contados una sola vez por plantilla"""
+        return sum(count_tokens(part) for part in self.parts if isinstance(part, str))
+
+    def bind(self, **values):
+        """Nueva plantilla con esos campos ya reemplazados"""
+        return PromptTemplate(parts=[
+            str(values[part[0]]) if isinstance(part, tuple) and part[0] in values else part
+            for part in self.parts
+        ])
+
+    def render(self, **values):
+        """Texto final; los valores que la plantilla no usa se ignoran"""
+        return ''.join(part if isinstance(part, str) else str(values[part[0]]) for part in self.parts)
+
+    def fit(self, budget, truncate, **values):
+        """render() sin pasar de `budget` tokens, recortando los campos de `truncate` en orden
+
+        Devuelve (texto, info) con el presupuesto, los tokens estimados del
+        prompt y los campos que hubo que recortar.
+        """
+        values = {name: str(values[name]) for name in self.fields}
+        occurrences = Counter(part[0] for part in self.parts if isinstance(part, tuple))
+        field_tokens = {name: count_tokens(value) for name, value in values.items()}
+        total = self.static_tokens + sum(field_tokens[name] * occurrences[name] for name in values)
+
+        truncated = []
+        for name in truncate:
+            excess = total - budget
+            if excess <= 0:
+                break
+            if not field_tokens.get(name):
+                continue
+            keep = max(0, field_tokens[name] - math.ceil(excess / occurrences[name]))
+            values[name] = truncate_tokens(values[name], keep)
+            tokens = count_tokens(values[name])
+            total -= (field_tokens[name] - tokens) * occurrences[name]
+            field_tokens[name] = tokens
+            truncated.append(name)
+
+        return self.render(**values), {"budget": budget, "estimated_tokens": total, "truncated": truncated}
+
+
+COPY_PROMPTS = {
+    'instagram': PromptTemplate("""
+        Eres un experto en marketing digital especializado en {industry}. Genera un post para Instagram que:
+
+        PERFIL DE MARCA:
+        - Negocio: {business_type}
+        - Industria: {industry}
+        - Audiencia: {target_audience}
+        - Tono: {tone}
+        - Valores: {brand_values}
+        - Temas preferidos: {content_themes}
+        - Estilo visual: {visual_style}
+
+        TÍTULO DEL POST: {title}
+        CONTENIDO ACTUAL: {content}
+
+        INSTRUCCIONES:
+        - Mejora el contenido manteniendo el tema del título
+        - Usa emojis estratégicamente (máximo 5)
+        - Incluye una pregunta para generar engagement
+        - Máximo 150 palabras
+        - Tono profesional pero cercano
+        - Enfócate en valor para PyMEs
+        - Mantén coherencia con el título proporcionado
+
+        Genera SOLO el texto del post, sin hashtags ni explicaciones adicionales.
+        """),
+    'linkedin': PromptTemplate("""
+        Eres un consultor en marketing digital para PyMEs. Genera un post profesional para LinkedIn que:
+
+        PERFIL DEL CLIENTE:
+        - Negocio: {business_type}
+        - Audiencia: {target_audience}
+        - Tono: {tone}
+
+        TÍTULO DEL POST: {title}
+        CONTENIDO ACTUAL: {content}
+
+        INSTRUCCIONES:
+        - Mejora el contenido con un enfoque más profesional
+        - Mantén coherencia con el título proporcionado
+        - Incluye insights o estadísticas relevantes
+        - Termina con una pregunta para fomentar networking
+        - Máximo 200 palabras
+        - Sin emojis o muy pocos
+        - Enfócate en crecimiento empresarial
+
+        Genera SOLO el texto del post, sin hashtags ni explicaciones adicionales.
+        """),
+}
+
+HASHTAG_PROMPTS = {
+    'instagram': PromptTemplate("""
+        Eres un experto en marketing digital especializado en hashtags para Instagram.
+
+        PERFIL DEL CLIENTE:
+        - Negocio: {business_type}
+        - Audiencia: {target_audience}
+        - Industria: {industry}
+
+        CONTENIDO DEL POST:
+        Título: {title}
+        Contenido: {content}
+
+        INSTRUCCIONES:
+        - Genera 10-12 hashtags estratégicos para Instagram
+        - Mezcla hashtags populares (100K-1M posts) con hashtags nicho (10K-100K posts)
+        - Incluye hashtags específicos de la industria
+        - Incluye hashtags de ubicación si es relevante (Argentina/LATAM)
+        - Incluye hashtags de comunidad (#pymes #emprendedores)
+        - Evita hashtags demasiado genéricos (#love #instagood)
+        - Prioriza hashtags que generen engagement real
+
+        CATEGORÍAS A INCLUIR:
+        - 3-4 hashtags de industria específica
+        - 2-3 hashtags de audiencia objetivo
+        - 2-3 hashtags de contenido/tema
+        - 2-3 hashtags de comunidad/networking
+
+        Responde SOLO con los hashtags separados por espacios, cada uno empezando con #
+        """),
+    'linkedin': PromptTemplate("""
+        Eres un consultor en marketing digital especializado en hashtags profesionales para LinkedIn.
+
+        PERFIL DEL CLIENTE:
+        - Negocio: {business_type}
+        - Audiencia: {target_audience}
+        - Industria: {industry}
+
+        CONTENIDO DEL POST:
+        Título: {title}
+        Contenido: {content}
+
+        INSTRUCCIONES:
+        - Genera 5-7 hashtags profesionales para LinkedIn
+        - Enfócate en hashtags de industria y profesionales
+        - Incluye hashtags de networking empresarial
+        - Evita hashtags demasiado casuales
+        - Prioriza hashtags que conecten con tomadores de decisión
+
+        CATEGORÍAS A INCLUIR:
+        - 2-3 hashtags de industria específica
+        - 2-3 hashtags profesionales/empresariales
+        - 1-2 hashtags de networking/comunidad
+
+        Responde SOLO con los hashtags separados por espacios, cada uno empezando con #
+        """),
+}
+
+COPY_HASHTAG_PROMPT = PromptTemplate("""
+        Basándote en este contenido para {platform}: "{content}"
+
+        Genera hashtags relevantes para una empresa de marketing digital que atiende PyMEs:
+        - Para Instagram: 8-10 hashtags mezclando populares y nicho
+        - Para LinkedIn: 3-5 hashtags profesionales
+
+        Responde SOLO con los hashtags separados por espacios, empezando cada uno con #
+        """)
+
+_HASHTAG_ANALYSIS_INSTRUCTIONS = """
+
+        Proporciona un breve análisis de:
+        1. Potencial de alcance (Alto/Medio/Bajo)
+        2. Nivel de competencia (Alto/Medio/Bajo)
+        3. Relevancia para PyMEs (Alta/Media/Baja)
+
+        Responde en formato JSON:
+        {{
+            "reach_potential": "Alto/Medio/Bajo",
+            "competition_level": "Alto/Medio/Bajo",
+            "relevance": "Alta/Media/Baja",
+            "recommendation": "Breve recomendación de uso"
+        }}
+        """
+
+# Análisis del post (en paralelo a la generación) o de los hashtags ya generados
+HASHTAG_ANALYSIS_PROMPTS = {
+    'post': PromptTemplate("""
+        Analiza el potencial de los hashtags de este post para {platform}:
+        Título: {title}
+        Contenido: {content}""" + _HASHTAG_ANALYSIS_INSTRUCTIONS),
+    'hashtags': PromptTemplate("""
+        Analiza estos hashtags para {platform}: {hashtags}""" + _HASHTAG_ANALYSIS_INSTRUCTIONS),
+}
+
+IMAGE_PROMPT = PromptTemplate("""Crear una imagen para redes sociales con el siguiente contexto:
+
+    Título: {title}
+    Contenido: {content}
+
+    Estilo visual: {brand_style}, {visual_style}
+    Industria: {industry}
+    Plataforma: {platform}
+
+    La imagen debe ser:
+    - Profesional y atractiva para redes sociales
+    - Coherente con el mensaje del post
+    - Estilo {visual_style} y {brand_style}
+    - Optimizada para {platform}
+    - Sin texto superpuesto
+    - Alta calidad y resolución
+
+    Evitar: texto en la imagen, elementos genéricos, baja calidad""")
+
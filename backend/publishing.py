@@ -0,0 +1,321 @@
+"""
+Publicación de los posts aprobados en su fecha y hora programadas
+
+El dispatcher carga una sola vez los posts aprobados (índice sobre status,
+scheduled_date, scheduled_time) en un min-heap en memoria y duerme hasta que
+vence el próximo; las rutas que aprueban o reprograman posts le avisan con
+schedule(). No consulta la tabla periódicamente.
+
+Cada post se reclama con un UPDATE condicionado a que siga aprobado y con la
+misma fecha y hora (approved → publishing → published/failed): una entrada
+vieja del heap, un post editado o varios procesos con su propio dispatcher
+nunca publican dos veces. Los publicadores por plataforma son enchufables;
+FakePublisher sirve para desarrollo y pruebas.
+
+Cada reclamo guarda publishing_started_at: los que siguen en publishing más
+de POSTIA_PUBLISH_CLAIM_TIMEOUT_MINUTES (el worker que los tomó murió) pasan a
+failed al arrancar cada worker y periódicamente mientras corre.
+"""
+
+import heapq
+import json
+import os
+import random
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from zoneinfo import ZoneInfo
+
+from db import connection
+from metrics import POSTS_PUBLISHED, current_user
+
+# Publicador por defecto: '' desactiva el dispatcher, 'fake' usa FakePublisher
+PUBLISHER = os.getenv('POSTIA_PUBLISHER', '')
+
+# Publicaciones simultáneas (cada una ocupa un thread esperando a la plataforma)
+PUBLISH_CONCURRENCY = int(os.getenv('POSTIA_PUBLISH_CONCURRENCY', '4'))
+
+# Hora para posts sin scheduled_time y zona horaria de las fechas programadas
+PUBLISH_DEFAULT_TIME = os.getenv('POSTIA_PUBLISH_DEFAULT_TIME', '09:00')
+PUBLISH_TIMEZONE = os.getenv('POSTIA_PUBLISH_TIMEZONE', '')
+
+# Posts vencidos hace más que esto (p. ej. con el servidor apagado) no se publican solos
+PUBLISH_MAX_DELAY_SECONDS = float(os.getenv('POSTIA_PUBLISH_MAX_DELAY_HOURS', '6')) * 60 * 60
+
+# Reclamos en publishing más viejos que esto se dan por interrumpidos
+PUBLISH_CLAIM_TIMEOUT_SECONDS = float(os.getenv('POSTIA_PUBLISH_CLAIM_TIMEOUT_MINUTES', '10')) * 60
+
+# Tope de espera del loop, para tolerar cambios del reloj del sistema
+MAX_SLEEP_SECONDS = 3600
+
+
+def init_publishing_schema(conn):
+    """Columnas del resultado de la publicación e índice de posts por vencimiento"""
+    post_columns = {row['name'] for row in conn.execute('PRAGMA table_info(posts)')}
+    for column in ('published_at', 'publish_result', 'publish_error', 'publishing_started_at'):
+        if column not in post_columns:
+            conn.execute(f'ALTER TABLE posts ADD COLUMN {column} TEXT')
+
+    conn.execute(
+        'CREATE INDEX IF NOT EXISTS idx_posts_status_schedule ON posts (status, scheduled_date, scheduled_time)'
+    )
+
+
+def fail_interrupted_publications(conn):
+    """Marcar como fallidos los posts que se estaban publicando al detenerse el servidor
+
+    No se reintentan solos: la plataforma pudo haberlos recibido.
+    """
+    conn.execute('''
+        UPDATE posts SET status = 'failed', publish_error = 'Interrumpido por reinicio del servidor'
+        WHERE status = 'publishing'
+    ''')
+    conn.commit()
+
+
+def fail_stale_publications(conn, timeout=PUBLISH_CLAIM_TIMEOUT_SECONDS):
+    """Marcar como fallidos los reclamos en publishing de hace más de `timeout` segundos
+
+    Con varios workers no se puede fallar todo lo que está en publishing: otro
+    worker vivo puede estar publicándolo. Devuelve cuántos posts se marcaron.
+    """
+    failed = conn.execute('''
+        UPDATE posts SET status = 'failed', publish_error = 'Publicación interrumpida (el proceso no respondió)'
+        WHERE status = 'publishing'
+            AND (publishing_started_at IS NULL OR publishing_started_at < datetime('now', ?))
+    ''', (f'-{int(timeout)} seconds',)).rowcount
+    conn.commit()
+    return failed
+
+
+class Publisher(ABC):
+    """Publica un post (dict con las columnas de posts) en una plataforma
+
+    publish() devuelve un dict con el resultado (p. ej. el id externo) que se
+    guarda en posts.publish_result; cualquier excepción marca el post como
+    fallido con su mensaje.
+    """
+
+    @abstractmethod
+    def publish(self, post):
+        pass
+
+
+class FakePublisher(Publisher):
+    """Publicador local que simula latencia y fallos y recuerda lo publicado"""
+
+    def __init__(self, latency_ms=200, failure_rate=0.0, history=1000):
+        self.latency = latency_ms / 1000
+        self.failure_rate = failure_rate
+        self.published = deque(maxlen=history)
+
+    def publish(self, post):
+        time.sleep(self.latency)
+        if random.random() < self.failure_rate:
+            raise RuntimeError(f"Fallo simulado al publicar en {post['platform']}")
+
+        external_id = f"fake-{post['platform']}-{post['id']}"
+        self.published.append({"post_id": post['id'], "platform": post['platform'], "at": time.time()})
+        print(f"📤 [fake] Publicado post {post['id']} en {post['platform']}: {post['title']}")
+        return {"external_id": external_id}
+
+
+class PublishDispatcher:
+    """Min-heap de posts aprobados por vencimiento y un pool acotado que los publica"""
+
+    def __init__(self, concurrency=PUBLISH_CONCURRENCY, timezone=PUBLISH_TIMEZONE,
+                 max_delay=PUBLISH_MAX_DELAY_SECONDS, claim_timeout=PUBLISH_CLAIM_TIMEOUT_SECONDS):
+        self.timezone = ZoneInfo(timezone) if timezone else None
+        self.max_delay = max_delay
+        self.claim_timeout = claim_timeout
+        self.publishers = {}
+        self.default_publisher = None
+        self.counts = {'published': 0, 'failed': 0, 'expired': 0, 'stale': 0}
+
+        # Entradas (vencimiento, post_id, fecha, hora); _scheduled guarda la vigente
+        # de cada post y las reemplazadas se descartan al llegar al tope del heap
+        self._heap = []
+        self._scheduled = {}
+        self._condition = threading.Condition()
+        self._slots = threading.BoundedSemaphore(concurrency)
+        self._executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='postia-publish')
+        self._thread = None
+
+    def register(self, platform, publisher):
+        """Publicador para una plataforma ('instagram', 'linkedin', ...)"""
+        self.publishers[platform] = publisher
+
+    def set_default(self, publisher):
+        """Publicador para las plataformas sin uno propio"""
+        self.default_publisher = publisher
+
+    @property
+    def enabled(self):
+        return bool(self.publishers) or self.default_publisher is not None
+
+    def due_at(self, scheduled_date, scheduled_time):
+        """Timestamp de publicación, o None si la fecha no es válida"""
+        try:
+            moment = datetime.strptime(
+                f"{scheduled_date} {(scheduled_time or PUBLISH_DEFAULT_TIME)[:5]}", '%Y-%m-%d %H:%M'
+            )
+        except (TypeError, ValueError):
+            return None
+        return moment.replace(tzinfo=self.timezone).timestamp()
+
+    def schedule(self, post_id, scheduled_date, scheduled_time):
+        """Programar (o reprogramar) un post aprobado"""
+        self.schedule_many([(post_id, scheduled_date, scheduled_time)])
+
+    def schedule_many(self, posts):
+        """Programar varios (post_id, fecha, hora) despertando al loop una sola vez"""
+        if not self.enabled:
+            return
+        with self._condition:
+            for post_id, scheduled_date, scheduled_time in posts:
+                key = (scheduled_date, scheduled_time or '')
+                due = self.due_at(*key)
+                if due is None or self._scheduled.get(post_id) == key:
+                    continue
+                self._scheduled[post_id] = key
+                heapq.heappush(self._heap, (due, post_id) + key)
+            self._condition.notify()
+
+    def load(self, conn, user_id=None):
+        """Programar los posts aprobados que todavía están a tiempo (todos o de un usuario)"""
+        if not self.enabled:
+            return 0
+        cutoff = (datetime.now(self.timezone) - timedelta(seconds=self.max_delay)).strftime('%Y-%m-%d')
+        query = "SELECT id, scheduled_date, scheduled_time FROM posts WHERE status = 'approved' AND scheduled_date >= ?"
+        params = [cutoff]
+        if user_id is not None:
+            query += ' AND user_id = ?'
+            params.append(user_id)
+
+        rows = conn.execute(query, params).fetchall()
+        self.schedule_many((row['id'], row['scheduled_date'], row['scheduled_time']) for row in rows)
+        return len(rows)
+
+    def start(self):
+        """Cargar los posts aprobados y arrancar el loop (una vez por proceso)
+
+        También falla los reclamos vencidos, ahora y cada medio `claim_timeout`:
+        un worker que muere publicando suele reemplazarse antes de que venzan.
+        """
+        if not self.enabled or self._thread is not None:
+            return
+        with connection() as conn:
+            self.fail_stale(conn)
+            count = self.load(conn)
+        print(f"🗓️ Dispatcher de publicación: {count} posts aprobados programados")
+
+        self._thread = threading.Thread(target=self._loop, name='postia-publish-dispatcher', daemon=True)
+        self._thread.start()
+        threading.Thread(target=self._reap_stale, name='postia-publish-reaper', daemon=True).start()
+
+    def fail_stale(self, conn):
+        failed = fail_stale_publications(conn, self.claim_timeout)
+        if failed:
+            print(f"⚠️ {failed} publicaciones interrumpidas marcadas como fallidas")
+            with self._condition:
+                self.counts['stale'] += failed
+        return failed
+
+    def _reap_stale(self):
+        while True:
+            time.sleep(self.claim_timeout / 2)
+            try:
+                with connection() as conn:
+                    self.fail_stale(conn)
+            except Exception as e:
+                print(f"Error revisando publicaciones interrumpidas: {str(e)}")
+
+    def _next_due(self):
+        """Esperar (con el lock tomado) hasta que venza la próxima entrada vigente"""
+        while True:
+            while self._heap and self._scheduled.get(self._heap[0][1]) != self._heap[0][2:]:
+                heapq.heappop(self._heap)
+            if not self._heap:
+                self._condition.wait()
+                continue
+            delay = self._heap[0][0] - time.time()
+            if delay <= 0:
+                entry = heapq.heappop(self._heap)
+                del self._scheduled[entry[1]]
+                return entry
+            self._condition.wait(timeout=min(delay, MAX_SLEEP_SECONDS))
+
+    def _loop(self):
+        while True:
+            with self._condition:
+                due, post_id, scheduled_date, scheduled_time = self._next_due()
+
+            if time.time() - due > self.max_delay:
+                # Queda aprobado: no se publica de golpe algo que debió salir hace horas
+                with self._condition:
+                    self.counts['expired'] += 1
+                continue
+
+            # Con todos los slots ocupados el loop espera acá, no encola sin límite
+            self._slots.acquire()
+            self._executor.submit(self._dispatch, post_id, scheduled_date, scheduled_time)
+
+    def _dispatch(self, post_id, scheduled_date, scheduled_time):
+        try:
+            self._publish(post_id, scheduled_date, scheduled_time)
+        except Exception as e:
+            print(f"Error publicando post {post_id}: {str(e)}")
+        finally:
+            self._slots.release()
+
+    def _publish(self, post_id, scheduled_date, scheduled_time):
+        with connection() as conn:
+            # Reclamar el post solo si sigue aprobado y con la misma programación
+            claimed = conn.execute('''
+                UPDATE posts SET status = 'publishing', publishing_started_at = CURRENT_TIMESTAMP
+                WHERE id = ? AND status = 'approved' AND scheduled_date = ? AND COALESCE(scheduled_time, '') = ?
+            ''', (post_id, scheduled_date, scheduled_time)).rowcount
+            conn.commit()
+            if not claimed:
+                return
+            post = dict(conn.execute('SELECT * FROM posts WHERE id = ?', (post_id,)).fetchone())
+
+        current_user.set(post['user_id'])
+        platform = post['platform'] or 'instagram'
+        publisher = self.publishers.get(platform, self.default_publisher)
+
+        try:
+            if publisher is None:
+                raise LookupError(f"No hay publicador configurado para {platform}")
+            result = publisher.publish(post)
+        except Exception as e:
+            status, result_json, error = 'failed', None, str(e)
+        else:
+            status, result_json, error = 'published', json.dumps(result or {}), None
+
+        # Si el reclamo venció y se marcó como fallido, el resultado real igual se guarda
+        with connection() as conn:
+            conn.execute('''
+                UPDATE posts SET status = ?, publish_result = ?, publish_error = ?,
+                    published_at = CASE WHEN ? = 'published' THEN CURRENT_TIMESTAMP END
+                WHERE id = ? AND status IN ('publishing', 'failed') AND publishing_started_at = ?
+            ''', (status, result_json, error, status, post_id, post['publishing_started_at']))
+            conn.commit()
+
+        with self._condition:
+            self.counts[status] += 1
+        POSTS_PUBLISHED.inc(platform=platform, outcome=status)
+
+    def stats(self):
+        with self._condition:
+            next_due = min((entry[0] for entry in self._heap[:1]), default=None)
+            scheduled = len(self._scheduled)
+        return {
+            "enabled": self.enabled,
+            "scheduled": scheduled,
+            "next_due": datetime.fromtimestamp(next_due, self.timezone).isoformat() if next_due else None,
+            **self.counts
+        }
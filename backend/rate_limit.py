@@ -0,0 +1,30 @@
+"""
+Límite de tasa por usuario (token bucket)
+"""
+
+import threading
+import time
+
+
+class TokenBucketLimiter:
+    """Hasta `rate_per_minute` operaciones por minuto por clave, con ráfagas de `burst`"""
+
+    def __init__(self, rate_per_minute, burst=None):
+        if rate_per_minute <= 0:
+            raise ValueError(f"El límite de tasa debe ser mayor que 0 por minuto (se recibió {rate_per_minute})")
+        self.rate = rate_per_minute / 60.0
+        self.burst = burst or max(1, int(rate_per_minute))
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def take(self, key):
+        """Consumir un token sin bloquear; devuelve 0 o los segundos hasta que haya uno"""
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated_at = self._buckets.get(key, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - updated_at) * self.rate)
+            if tokens >= 1:
+                self._buckets[key] = (tokens - 1, now)
+                return 0
+            self._buckets[key] = (tokens, now)
+            return (1 - tokens) / self.rate
@@ -0,0 +1,13 @@
+"""
+Normalización de texto compartida (caché de imágenes, índice de hashtags)
+"""
+
+import re
+import unicodedata
+
+
+def normalize_text(text):
+    """Minúsculas, sin acentos, signos ni espacios repetidos (se conservan los '#')"""
+    text = unicodedata.normalize('NFKD', text.lower())
+    text = ''.join(char for char in text if not unicodedata.combining(char))
+    return ' '.join(re.sub(r'[^\w#]+', ' ', text).split())
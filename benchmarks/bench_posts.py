@@ -0,0 +1,116 @@
+"""
+Benchmark de /api/posts: requests/segundo con y sin pool de conexiones
+
+Levanta backend/app.py contra una base temporal en un servidor local con
+threads y mide el throughput de GET /api/posts. Cada modo corre en su propio
+proceso porque la configuración del pool se lee al importar la app.
+
+Uso:
+    python benchmarks/bench_posts.py --requests 2000 --concurrency 8
+"""
+
+import argparse
+import json
+import logging
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'backend')
+
+
+def run_single(args):
+    """Medir un modo (se ejecuta en un proceso hijo)"""
+    sys.path.insert(0, BACKEND_DIR)
+    from werkzeug.serving import make_server
+    import app as postia
+
+    # Sembrar posts para el usuario admin
+    from db import connect
+    conn = connect()
+    user_id = conn.execute('SELECT id FROM users WHERE email = ?', ('admin@maddalenamarketing.com',)).fetchone()['id']
+    conn.execute('UPDATE users SET session_token = ? WHERE id = ?', ('bench-token', user_id))
+    conn.executemany(
+        'INSERT INTO posts (user_id, title, content, platform, scheduled_date, status) VALUES (?, ?, ?, ?, ?, ?)',
+        [(user_id, f'Post {i}', 'Contenido de prueba ' * 20, 'instagram', f'2025-01-{i % 28 + 1:02d}', 'draft')
+         for i in range(args.posts)]
+    )
+    conn.commit()
+    conn.close()
+
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+    server = make_server('127.0.0.1', 0, postia.app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f'http://127.0.0.1:{server.server_port}/api/posts'
+
+    def hit(_):
+        req = urllib.request.Request(url, headers={'Cookie': 'session_token=bench-token'})
+        with urllib.request.urlopen(req) as response:
+            response.read()
+            return response.status
+
+    # Calentamiento
+    for _ in range(20):
+        hit(None)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+        statuses = list(executor.map(hit, range(args.requests)))
+    elapsed = time.perf_counter() - started
+    server.shutdown()
+
+    print(json.dumps({
+        'requests': args.requests,
+        'errors': sum(1 for status in statuses if status != 200),
+        'seconds': round(elapsed, 3),
+        'rps': round(args.requests / elapsed, 1)
+    }))
+
+
+def run_mode(args, pool_size):
+    with tempfile.TemporaryDirectory() as tmp:
+        env = dict(os.environ)
+        env.update({
+            'POSTIA_DATABASE_PATH': os.path.join(tmp, 'bench.db'),
+            'POSTIA_DB_POOL_SIZE': str(pool_size),
+            'OPENAI_API_KEY': env.get('OPENAI_API_KEY', 'sk-bench')
+        })
+        output = subprocess.check_output(
+            [sys.executable, __file__, '--single',
+             '--requests', str(args.requests),
+             '--concurrency', str(args.concurrency),
+             '--posts', str(args.posts)],
+            env=env, cwd=tmp
+        )
+        return json.loads(output.decode().strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--posts', type=int, default=90)
+    parser.add_argument('--pool-size', type=int, default=8)
+    parser.add_argument('--single', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.single:
+        run_single(args)
+        return
+
+    before = run_mode(args, 0)
+    after = run_mode(args, args.pool_size)
+
+    print(f"{'modo':<28}{'req/s':>10}{'errores':>10}")
+    print(f"{'sin pool (conexión/request)':<28}{before['rps']:>10}{before['errors']:>10}")
+    print(f"{f'pool ({args.pool_size} conexiones)':<28}{after['rps']:>10}{after['errors']:>10}")
+    print(f"mejora: x{after['rps'] / before['rps']:.2f}")
+
+
+if __name__ == '__main__':
+    main()
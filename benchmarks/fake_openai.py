@@ -0,0 +1,200 @@
+"""
+Servidor local que imita la API de OpenAI para benchmarks
+
+Responde /v1/chat/completions (normal, JSON y streaming) y
+/v1/images/generations con latencias configurables, sin red ni costo. La app
+lo usa apuntando OPENAI_BASE_URL a http://127.0.0.1:<puerto>/v1.
+
+Uso:
+    python benchmarks/fake_openai.py --port 8099 --chat-latency-ms 800
+"""
+
+import argparse
+import base64
+import io
+import json
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from PIL import Image
+
+SAMPLE_TEXT = (
+    "🚀 Cada semana es una oportunidad para acercarte a tus clientes. "
+    "Compartí lo que hacés, mostrá resultados reales y pedí opinión.\n\n"
+    "¿Qué te gustaría mejorar este mes? 👇 #pymes #marketing #crecimiento"
+)
+
+
+def _png_bytes(size=256):
+    buffer = io.BytesIO()
+    Image.new('RGB', (size, size), (59, 130, 246)).save(buffer, format='PNG')
+    return buffer.getvalue()
+
+
+class FakeOpenAI:
+    """Configuración y contadores compartidos por los handlers"""
+
+    def __init__(self, chat_latency_ms=500, image_latency_ms=2000, token_delay_ms=15):
+        self.chat_latency = chat_latency_ms / 1000
+        self.image_latency = image_latency_ms / 1000
+        self.token_delay = token_delay_ms / 1000
+        self.image_png = _png_bytes()
+        self.calls = {'chat': 0, 'chat_stream': 0, 'images': 0}
+        self._lock = threading.Lock()
+
+    def count(self, kind):
+        with self._lock:
+            self.calls[kind] += 1
+
+
+def _usage(messages, text):
+    prompt_tokens = sum(len(str(message.get('content', ''))) for message in messages) // 4
+    completion_tokens = len(text) // 4
+    return {
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": completion_tokens,
+        "total_tokens": prompt_tokens + completion_tokens
+    }
+
+
+def _calendar_json(prompt):
+    """Respuesta JSON para los lotes de calendario: un post por índice pedido"""
+    indices = [int(index) for index in re.findall(r'^\s*(\d+)\. \d{4}-\d{2}-\d{2}', prompt, re.MULTILINE)]
+    return json.dumps({"posts": [
+        {"index": index, "title": f"Post {index}", "content": SAMPLE_TEXT, "hashtags": "#pymes #marketing"}
+        for index in indices
+    ]}, ensure_ascii=False)
+
+
+def make_handler(fake):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def log_message(self, format, *args):
+            pass
+
+        def _json(self, payload, status=200):
+            body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            if self.path.startswith('/files/'):
+                self.send_response(200)
+                self.send_header('Content-Type', 'image/png')
+                self.send_header('Content-Length', str(len(fake.image_png)))
+                self.end_headers()
+                self.wfile.write(fake.image_png)
+                return
+            self._json({"error": {"message": "not found"}}, 404)
+
+        def do_POST(self):
+            length = int(self.headers.get('Content-Length') or 0)
+            request = json.loads(self.rfile.read(length) or b'{}')
+
+            if self.path.endswith('/chat/completions'):
+                self._chat(request)
+            elif self.path.endswith('/images/generations'):
+                self._images(request)
+            else:
+                self._json({"error": {"message": "not found"}}, 404)
+
+        def _chat(self, request):
+            messages = request.get('messages', [])
+            prompt = str(messages[-1].get('content', '')) if messages else ''
+            is_json = (request.get('response_format') or {}).get('type') == 'json_object'
+            text = _calendar_json(prompt) if is_json else SAMPLE_TEXT
+            model = request.get('model', 'gpt-4.1-mini')
+
+            if request.get('stream'):
+                fake.count('chat_stream')
+                self._stream(model, messages, text)
+                return
+
+            fake.count('chat')
+            time.sleep(fake.chat_latency)
+            self._json({
+                "id": "chatcmpl-fake",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": text},
+                    "finish_reason": "stop"
+                }],
+                "usage": _usage(messages, text)
+            })
+
+        def _stream(self, model, messages, text):
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/event-stream')
+            self.send_header('Connection', 'close')
+            self.end_headers()
+
+            def send(chunk):
+                self.wfile.write(f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n".encode('utf-8'))
+                self.wfile.flush()
+
+            base = {"id": "chatcmpl-fake", "object": "chat.completion.chunk", "created": int(time.time()), "model": model}
+            # La latencia hasta el primer token es la mitad de la de una respuesta completa
+            time.sleep(fake.chat_latency / 2)
+            for word in re.findall(r'\S+\s*', text):
+                send({**base, "choices": [{"index": 0, "delta": {"content": word}, "finish_reason": None}]})
+                time.sleep(fake.token_delay)
+            send({**base, "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]})
+            send({**base, "choices": [], "usage": _usage(messages, text)})
+            self.wfile.write(b"data: [DONE]\n\n")
+            self.wfile.flush()
+            self.close_connection = True
+
+        def _images(self, request):
+            fake.count('images')
+            time.sleep(fake.image_latency)
+            if request.get('response_format') == 'b64_json':
+                image = {"b64_json": base64.b64encode(fake.image_png).decode('ascii')}
+            else:
+                host, port = self.server.server_address[:2]
+                image = {"url": f"http://{host}:{port}/files/image.png"}
+            self._json({"created": int(time.time()), "data": [image]})
+
+    return Handler
+
+
+def start_server(port=0, **options):
+    """Levantar el servidor en un thread; devuelve (servidor, FakeOpenAI)"""
+    fake = FakeOpenAI(**options)
+    server = ThreadingHTTPServer(('127.0.0.1', port), make_handler(fake))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, fake
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--port', type=int, default=8099)
+    parser.add_argument('--chat-latency-ms', type=int, default=500)
+    parser.add_argument('--image-latency-ms', type=int, default=2000)
+    parser.add_argument('--token-delay-ms', type=int, default=15)
+    args = parser.parse_args()
+
+    server, _ = start_server(
+        args.port,
+        chat_latency_ms=args.chat_latency_ms,
+        image_latency_ms=args.image_latency_ms,
+        token_delay_ms=args.token_delay_ms
+    )
+    print(f"OpenAI falso en http://127.0.0.1:{server.server_port}/v1")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
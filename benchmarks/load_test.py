@@ -0,0 +1,357 @@
+"""
+Prueba de carga de la app completa con OpenAI simulado
+
+Levanta backend/app.py en un proceso aparte contra una base temporal,
+reemplaza OpenAI por benchmarks/fake_openai.py (latencia configurable) y
+ejecuta una mezcla de operaciones del dashboard (login, /api/posts,
+generate-calendar, regenerate-copy, upload-image) a concurrencia creciente.
+Informa throughput y percentiles de latencia por operación.
+
+Con --save se guarda el resultado; con --baseline se compara contra uno
+guardado y el proceso termina con código 1 si el throughput cae o el p99 sube
+más de --max-regression, para frenar regresiones antes de un deploy.
+
+Uso:
+    python benchmarks/load_test.py --concurrency 1,4,16 --duration 10
+    python benchmarks/load_test.py --save baseline.json
+    python benchmarks/load_test.py --baseline baseline.json --max-regression 0.2
+"""
+
+import argparse
+import hashlib
+import io
+import json
+import logging
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from fake_openai import start_server  # noqa: E402
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'backend')
+
+# Peso de cada operación en la mezcla (aprox. el uso real del dashboard)
+DEFAULT_MIX = 'posts=55,regenerate_copy=15,upload_image=10,login=10,generate_calendar=10'
+
+BENCH_PASSWORD = 'bench123'
+
+# Por debajo de esta diferencia un p99 más alto se considera ruido
+MIN_P99_DELTA_MS = 10
+
+
+def bench_email(index):
+    return f'bench{index}@postia.test'
+
+
+def serve(args):
+    """Proceso hijo: sembrar usuarios y posts y servir la app hasta que cierren stdin"""
+    sys.path.insert(0, BACKEND_DIR)
+    from werkzeug.serving import make_server
+    import app as postia
+    from db import connect
+
+    password_hash = hashlib.sha256(BENCH_PASSWORD.encode()).hexdigest()
+    conn = connect()
+    for index in range(args.users):
+        user_id = conn.execute(
+            'INSERT INTO users (email, password_hash, full_name, role) VALUES (?, ?, ?, ?)',
+            (bench_email(index), password_hash, f'Bench {index}', 'client')
+        ).lastrowid
+        conn.executemany(
+            'INSERT INTO posts (user_id, title, content, platform, scheduled_date, status) VALUES (?, ?, ?, ?, ?, ?)',
+            [(user_id, f'Post {i}', 'Contenido de prueba ' * 20, 'instagram', f'2025-01-{i % 28 + 1:02d}', 'draft')
+             for i in range(args.posts)]
+        )
+    conn.commit()
+    conn.close()
+
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+    server = make_server('127.0.0.1', 0, postia.app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    print(f'PORT {server.server_port}', flush=True)
+
+    sys.stdin.read()
+    server.shutdown()
+
+
+class Client:
+    """Usuario virtual con su propia cookie de sesión"""
+
+    def __init__(self, base_url, index, rng, args, images):
+        self.base_url = base_url
+        self.email = bench_email(index)
+        self.rng = rng
+        self.args = args
+        self.images = images
+        self.cookie = None
+        self.job_ids = []
+
+    def request(self, method, path, body=None, content_type='application/json'):
+        if content_type == 'application/json' and body is not None:
+            body = json.dumps(body).encode('utf-8')
+        req = urllib.request.Request(self.base_url + path, data=body, method=method)
+        if body is not None:
+            req.add_header('Content-Type', content_type)
+        if self.cookie:
+            req.add_header('Cookie', self.cookie)
+        try:
+            with urllib.request.urlopen(req, timeout=120) as response:
+                payload = response.read()
+                cookie = response.headers.get('Set-Cookie')
+                status = response.status
+        except urllib.error.HTTPError as e:
+            e.read()
+            return e.code, None
+        if cookie:
+            self.cookie = cookie.split(';', 1)[0]
+        return status, payload
+
+    def login(self):
+        return self.request('POST', '/api/login', {'email': self.email, 'password': BENCH_PASSWORD})[0]
+
+    def posts(self):
+        return self.request('GET', '/api/posts')[0]
+
+    def regenerate_copy(self):
+        topic = self.rng.randrange(50)
+        return self.request('POST', '/api/regenerate-copy', {
+            'platform': self.rng.choice(['instagram', 'linkedin']),
+            'current_title': f'Tema {topic}',
+            'current_content': f'Contenido sobre el tema {topic} para la prueba de carga',
+            'use_cache': self.args.llm_cache
+        })[0]
+
+    def generate_calendar(self):
+        start = f'2026-{self.rng.randrange(1, 13):02d}-01'
+        status, payload = self.request('POST', '/api/generate-calendar', {
+            'days': 7, 'posts_per_day': 2, 'mode': 'incremental', 'start_date': start
+        })
+        if payload and status == 202:
+            self.job_ids.append(json.loads(payload)['job_id'])
+        return status
+
+    def upload_image(self):
+        boundary = uuid.uuid4().hex
+        image = self.rng.choice(self.images)
+        body = (
+            f'--{boundary}\r\nContent-Disposition: form-data; name="file"; filename="bench.png"\r\n'
+            f'Content-Type: image/png\r\n\r\n'
+        ).encode() + image + f'\r\n--{boundary}--\r\n'.encode()
+        return self.request('POST', '/api/upload-image', body, f'multipart/form-data; boundary={boundary}')[0]
+
+
+def sample_images(count=20):
+    """PNGs distintos: algunas subidas son nuevas y otras se deduplican"""
+    from PIL import Image
+
+    images = []
+    for index in range(count):
+        buffer = io.BytesIO()
+        Image.new('RGB', (512, 512), (index * 12 % 256, 90, 160)).save(buffer, format='PNG')
+        images.append(buffer.getvalue())
+    return images
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, int(round(fraction * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[index]
+
+
+def run_level(base_url, concurrency, args, mix, images):
+    """Correr la mezcla con `concurrency` usuarios durante args.duration segundos"""
+    operations, weights = zip(*mix.items())
+    samples = {operation: [] for operation in operations}
+    errors = {operation: 0 for operation in operations}
+    lock = threading.Lock()
+    deadline = time.perf_counter() + args.duration
+    clients = []
+
+    def worker(index):
+        client = Client(base_url, index, random.Random(args.seed * 1000 + index), args, images)
+        clients.append(client)
+        client.login()
+        while time.perf_counter() < deadline:
+            operation = client.rng.choices(operations, weights)[0]
+            started = time.perf_counter()
+            try:
+                status = getattr(client, operation)()
+            except Exception:
+                status = 599
+            elapsed = time.perf_counter() - started
+            with lock:
+                samples[operation].append(elapsed)
+                if status >= 400:
+                    errors[operation] += 1
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(worker, range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    # Esperar a que terminen los calendarios encolados para no cargar el nivel siguiente
+    drain_started = time.perf_counter()
+    for client in clients:
+        for job_id in client.job_ids:
+            while time.perf_counter() - drain_started < 300:
+                status, payload = client.request('GET', f'/api/jobs/{job_id}')
+                if status != 200 or json.loads(payload)['job']['status'] in ('done', 'failed'):
+                    break
+                time.sleep(0.2)
+
+    result = {
+        'concurrency': concurrency,
+        'requests': sum(len(values) for values in samples.values()),
+        'errors': sum(errors.values()),
+        'rps': round(sum(len(values) for values in samples.values()) / elapsed, 1),
+        'jobs_drain_seconds': round(time.perf_counter() - drain_started, 2),
+        'operations': {}
+    }
+    for operation, values in samples.items():
+        values.sort()
+        result['operations'][operation] = {
+            'count': len(values),
+            'errors': errors[operation],
+            'rps': round(len(values) / elapsed, 1),
+            'p50_ms': round(percentile(values, 0.50) * 1000, 1),
+            'p90_ms': round(percentile(values, 0.90) * 1000, 1),
+            'p99_ms': round(percentile(values, 0.99) * 1000, 1),
+            'max_ms': round((values[-1] if values else 0) * 1000, 1)
+        }
+    return result
+
+
+def print_level(result):
+    print(f"\nconcurrencia {result['concurrency']}: {result['rps']} req/s, "
+          f"{result['requests']} requests, {result['errors']} errores, "
+          f"cola de trabajos vaciada en {result['jobs_drain_seconds']}s")
+    print(f"{'operación':<20}{'n':>7}{'err':>6}{'req/s':>8}{'p50 ms':>10}{'p90 ms':>10}{'p99 ms':>10}{'max ms':>10}")
+    for operation, stats in result['operations'].items():
+        print(f"{operation:<20}{stats['count']:>7}{stats['errors']:>6}{stats['rps']:>8}"
+              f"{stats['p50_ms']:>10}{stats['p90_ms']:>10}{stats['p99_ms']:>10}{stats['max_ms']:>10}")
+
+
+def compare(results, baseline, max_regression):
+    """Lista de regresiones contra un resultado guardado"""
+    regressions = []
+    previous_levels = {level['concurrency']: level for level in baseline['levels']}
+    for level in results['levels']:
+        previous = previous_levels.get(level['concurrency'])
+        if not previous:
+            continue
+        if level['rps'] < previous['rps'] * (1 - max_regression):
+            regressions.append(f"c={level['concurrency']}: {previous['rps']} -> {level['rps']} req/s")
+        for operation, stats in level['operations'].items():
+            before = previous['operations'].get(operation)
+            if before and stats['p99_ms'] > before['p99_ms'] * (1 + max_regression) \
+                    and stats['p99_ms'] - before['p99_ms'] > MIN_P99_DELTA_MS:
+                regressions.append(
+                    f"c={level['concurrency']} {operation}: p99 {before['p99_ms']} -> {stats['p99_ms']} ms"
+                )
+    return regressions
+
+
+def parse_mix(text):
+    mix = {}
+    for item in text.split(','):
+        operation, weight = item.split('=')
+        if not hasattr(Client, operation.strip()):
+            raise SystemExit(f"Operación desconocida en --mix: {operation}")
+        mix[operation.strip()] = float(weight)
+    return mix
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--concurrency', default='1,4,16', help='niveles de concurrencia separados por coma')
+    parser.add_argument('--duration', type=float, default=10, help='segundos por nivel')
+    parser.add_argument('--mix', default=DEFAULT_MIX)
+    parser.add_argument('--posts', type=int, default=90, help='posts sembrados por usuario')
+    parser.add_argument('--chat-latency-ms', type=int, default=500)
+    parser.add_argument('--image-latency-ms', type=int, default=2000)
+    parser.add_argument('--token-delay-ms', type=int, default=15)
+    parser.add_argument('--llm-cache', action='store_true', help='permitir respuestas de la caché de completions')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--save', help='guardar el resultado en este JSON')
+    parser.add_argument('--baseline', help='comparar contra un JSON guardado con --save')
+    parser.add_argument('--max-regression', type=float, default=0.2)
+    parser.add_argument('--serve', action='store_true', help=argparse.SUPPRESS)
+    parser.add_argument('--users', type=int, default=0, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        serve(args)
+        return
+
+    levels = [int(level) for level in args.concurrency.split(',')]
+    mix = parse_mix(args.mix)
+    fake_server, fake = start_server(
+        chat_latency_ms=args.chat_latency_ms,
+        image_latency_ms=args.image_latency_ms,
+        token_delay_ms=args.token_delay_ms
+    )
+
+    with tempfile.TemporaryDirectory() as tmp:
+        env = dict(os.environ)
+        env.update({
+            'POSTIA_DATABASE_PATH': os.path.join(tmp, 'bench.db'),
+            'OPENAI_API_KEY': 'sk-bench',
+            'OPENAI_BASE_URL': f'http://127.0.0.1:{fake_server.server_port}/v1',
+            'POSTIA_IMAGE_RESPONSE_FORMAT': 'b64_json'
+        })
+        server = subprocess.Popen(
+            [sys.executable, os.path.abspath(__file__), '--serve',
+             '--users', str(max(levels)), '--posts', str(args.posts)],
+            env=env, cwd=tmp, stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True
+        )
+        try:
+            line = server.stdout.readline()
+            if not line.startswith('PORT '):
+                raise SystemExit('No se pudo levantar la app')
+            base_url = f'http://127.0.0.1:{line.split()[1]}'
+
+            images = sample_images()
+            results = {
+                'config': {key: getattr(args, key) for key in (
+                    'duration', 'mix', 'posts', 'chat_latency_ms', 'image_latency_ms', 'token_delay_ms', 'llm_cache'
+                )},
+                'levels': []
+            }
+            for concurrency in levels:
+                result = run_level(base_url, concurrency, args, mix, images)
+                results['levels'].append(result)
+                print_level(result)
+        finally:
+            server.stdin.close()
+            server.wait(timeout=30)
+            fake_server.shutdown()
+
+    print(f"\nllamadas al OpenAI falso: {fake.calls}")
+
+    if args.save:
+        with open(args.save, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2, ensure_ascii=False)
+
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            regressions = compare(results, json.load(f), args.max_regression)
+        if regressions:
+            print('\nREGRESIONES:')
+            for regression in regressions:
+                print(f'  {regression}')
+            sys.exit(1)
+        print('\nsin regresiones contra la línea base')
+
+
+if __name__ == '__main__':
+    main()
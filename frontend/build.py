@@ -0,0 +1,244 @@
+"""
+Build del frontend: assets con hash de contenido y variantes precomprimidas
+
+Extrae los <style> y <script> inline de cada página a archivos minificados
+con el hash del contenido en el nombre (assets/dashboard.<hash>.js), reescribe
+el HTML para referenciarlos y genera .gz y .br de todo. El resultado queda en
+frontend/dist/, que el backend usa automáticamente si existe: las páginas se
+revalidan con ETag y los assets se cachean como inmutables.
+
+Uso:
+    python frontend/build.py
+"""
+
+import gzip
+import hashlib
+import os
+import re
+import shutil
+import sys
+
+try:
+    import brotli
+except ImportError:  # sin brotli solo se generan variantes .gz
+    brotli = None
+
+FRONTEND_DIR = os.path.dirname(os.path.abspath(__file__))
+DIST_DIR = os.path.join(FRONTEND_DIR, 'dist')
+ASSETS_URL = '/assets'
+
+PAGES = ('dashboard.html', 'login.html')
+
+INLINE_BLOCK = re.compile(r'<(style|script)>(.*?)</\1>', re.DOTALL)
+VERBATIM_HTML = re.compile(r'(<(pre|textarea)\b.*?</\2>)', re.DOTALL | re.IGNORECASE)
+
+# Después de estos caracteres o palabras, una "/" abre un regex y no es una división
+REGEX_PREFIX_CHARS = set('(,=:[!&|?{};+-*%<>~^')
+REGEX_PREFIX_WORDS = {'return', 'typeof', 'case', 'do', 'else', 'in', 'of', 'new', 'delete', 'void', 'throw', 'instanceof'}
+
+
+def _is_word(char):
+    return char.isalnum() or char in '_$'
+
+
+def _skip_quoted(source, i):
+    """Índice siguiente al string '...' o "..." que empieza en i"""
+    quote = source[i]
+    i += 1
+    while i < len(source) and source[i] != quote:
+        i += 2 if source[i] == '\\' else 1
+    return i + 1
+
+
+def _skip_template(source, i):
+    """Índice siguiente al template `...` que empieza en i (con ${} anidados)"""
+    i += 1
+    while i < len(source):
+        char = source[i]
+        if char == '\\':
+            i += 2
+        elif char == '`':
+            return i + 1
+        elif source.startswith('${', i):
+            i += 2
+            depth = 1
+            while i < len(source) and depth:
+                char = source[i]
+                if char in '\'"':
+                    i = _skip_quoted(source, i)
+                    continue
+                if char == '`':
+                    i = _skip_template(source, i)
+                    continue
+                depth += {'{': 1, '}': -1}.get(char, 0)
+                i += 1
+        else:
+            i += 1
+    return i
+
+
+def _skip_regex(source, i):
+    """Índice siguiente al regex /.../flags que empieza en i"""
+    i += 1
+    in_class = False
+    while i < len(source):
+        char = source[i]
+        if char == '\\':
+            i += 2
+            continue
+        if char == '[':
+            in_class = True
+        elif char == ']':
+            in_class = False
+        elif char == '/' and not in_class:
+            i += 1
+            break
+        i += 1
+    while i < len(source) and source[i].isalpha():
+        i += 1
+    return i
+
+
+def minify_js(source):
+    """Quitar comentarios, indentación y espacios sobrantes
+
+    Los saltos de línea se conservan (salvo donde no pueden cambiar el
+    significado) para no depender de la inserción automática de ";". Strings,
+    templates y regex se copian tal cual.
+    """
+    out = []
+    last = ''
+    last_word = ''
+    pending = ''
+    i = 0
+    while i < len(source):
+        char = source[i]
+
+        if char.isspace():
+            pending = '\n' if char == '\n' or pending == '\n' else ' '
+            i += 1
+            continue
+        if source.startswith('//', i):
+            end = source.find('\n', i)
+            i = len(source) if end == -1 else end
+            continue
+        if source.startswith('/*', i):
+            end = source.find('*/', i + 2)
+            comment = source[i:len(source) if end == -1 else end + 2]
+            pending = '\n' if '\n' in comment or pending == '\n' else (pending or ' ')
+            i += len(comment)
+            continue
+
+        if pending and last:
+            if pending == '\n' and last not in '{([,;' and char not in '})],;':
+                out.append('\n')
+            elif (_is_word(last) and _is_word(char)) or (last in '+-' and char in '+-'):
+                out.append(' ')
+        pending = ''
+
+        if char in '\'"':
+            end = _skip_quoted(source, i)
+        elif char == '`':
+            end = _skip_template(source, i)
+        elif char == '/' and (not last or last in REGEX_PREFIX_CHARS or last_word in REGEX_PREFIX_WORDS):
+            end = _skip_regex(source, i)
+        elif _is_word(char):
+            end = i
+            while end < len(source) and _is_word(source[end]):
+                end += 1
+        else:
+            end = i + 1
+
+        token = source[i:end]
+        out.append(token)
+        last = token[-1]
+        last_word = token if _is_word(token[0]) else ''
+        i = end
+
+    return ''.join(out).strip() + '\n'
+
+
+def minify_css(source):
+    """Quitar comentarios y espacios alrededor de llaves, ; y ,"""
+    source = re.sub(r'/\*.*?\*/', '', source, flags=re.DOTALL)
+    source = re.sub(r'\s+', ' ', source)
+    source = re.sub(r'\s*([{};,>])\s*', r'\1', source)
+    return source.replace(';}', '}').strip() + '\n'
+
+
+def minify_html(source):
+    """Quitar la indentación y las líneas vacías (salvo dentro de <pre>/<textarea>)"""
+    parts = VERBATIM_HTML.split(source)
+    result = []
+    # split con dos grupos intercala: texto, bloque completo, nombre del tag
+    for index, part in enumerate(parts):
+        if index % 3 == 0:
+            result.append('\n'.join(line.strip() for line in part.splitlines() if line.strip()))
+        elif index % 3 == 1:
+            result.append(part)
+    return ''.join(result) + '\n'
+
+
+def write_with_variants(path, body):
+    """Escribir el archivo y sus versiones .gz y .br"""
+    with open(path, 'wb') as f:
+        f.write(body)
+    with open(f'{path}.gz', 'wb') as f:
+        f.write(gzip.compress(body, compresslevel=9, mtime=0))
+    if brotli is not None:
+        with open(f'{path}.br', 'wb') as f:
+            f.write(brotli.compress(body, quality=11))
+
+
+def build_page(filename, assets_dir):
+    """Extraer los bloques inline de una página; devuelve (html, assets escritos)"""
+    with open(os.path.join(FRONTEND_DIR, filename), encoding='utf-8') as f:
+        html = f.read()
+
+    page = filename.rsplit('.', 1)[0]
+    counters = {'style': 0, 'script': 0}
+    written = []
+
+    def extract(match):
+        tag, content = match.group(1), match.group(2)
+        counters[tag] += 1
+        extension = 'css' if tag == 'style' else 'js'
+        body = (minify_css(content) if tag == 'style' else minify_js(content)).encode('utf-8')
+
+        digest = hashlib.sha256(body).hexdigest()[:12]
+        suffix = f'-{counters[tag]}' if counters[tag] > 1 else ''
+        asset_name = f'{page}{suffix}.{digest}.{extension}'
+        write_with_variants(os.path.join(assets_dir, asset_name), body)
+        written.append((asset_name, len(content.encode('utf-8')), len(body)))
+
+        # Cada bloque queda en su misma posición para no alterar la cascada ni el orden de ejecución
+        if tag == 'style':
+            return f'<link rel="stylesheet" href="{ASSETS_URL}/{asset_name}">'
+        return f'<script src="{ASSETS_URL}/{asset_name}"></script>'
+
+    html = minify_html(INLINE_BLOCK.sub(extract, html))
+    write_with_variants(os.path.join(DIST_DIR, filename), html.encode('utf-8'))
+    return html, written
+
+
+def main():
+    if os.path.isdir(DIST_DIR):
+        shutil.rmtree(DIST_DIR)
+    assets_dir = os.path.join(DIST_DIR, 'assets')
+    os.makedirs(assets_dir)
+
+    for filename in PAGES:
+        with open(os.path.join(FRONTEND_DIR, filename), 'rb') as f:
+            original = len(f.read())
+        html, assets = build_page(filename, assets_dir)
+        print(f"{filename}: {original} -> {len(html.encode('utf-8'))} bytes de HTML")
+        for asset_name, before, after in assets:
+            print(f"  {asset_name}: {before} -> {after} bytes")
+
+    if brotli is None:
+        print("Aviso: paquete brotli no instalado, solo se generaron variantes .gz", file=sys.stderr)
+    print(f"Build en {DIST_DIR}")
+
+
+if __name__ == '__main__':
+    main()